@@ -1,4 +1,5 @@
 import os
+import httpx
 from dotenv import load_dotenv
 from openai import AsyncOpenAI
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -8,9 +9,15 @@ import json
 import logging
 
 from security.anya_security import restrict_access, trading_key
+from market import anya_registry, anya_recorder
 
 load_dotenv()
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+openai_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    # full captures keep the model's answers too, so replays don't need OpenAI
+    http_client=httpx.AsyncClient(event_hooks={"response": [anya_recorder.capture_httpx]})
+    if anya_recorder.RECORD_ALL else None
+)
 
 logger = logging.getLogger(__name__)
 
@@ -162,13 +169,14 @@ async def handle_ai_buttons(update: Update, context: CallbackContext):
         await query.edit_message_text("🚫 Anya’s trade ideas ignored! Back to spying... 🧠")
         return
     if data.startswith("ai_trade_"):
-        from end_points_handlers.cvex_handler import list_contracts
-        contracts_data = list_contracts()
-        if "⚠️ Error" in contracts_data and "403" in contracts_data:
-            await query.edit_message_text("🚫 Anya can’t trade—403 error’s blocking the spy network! Try later!")
+        contract, side, order_type, quantity = data[len("ai_trade_"):].split('_')
+        info, error = anya_registry.validate_order(contract, float(quantity))
+        if error:
+            await query.edit_message_text(f"🚫 Anya can’t trade that idea: {error}")
             return
+        if info:
+            contract = info.symbol
 
-        _, contract, side, order_type, quantity = data.split('_')
         context.user_data['start_order'] = {
             'state': 'confirm_order',
             'data': {
@@ -178,7 +186,8 @@ async def handle_ai_buttons(update: Update, context: CallbackContext):
                 'quantity': float(quantity),
                 'price': None  # Market order for now
             },
-            'is_dummy': "⚠️ Error" in contracts_data
+            # No contract list yet means no market feed, same as the old list_contracts() failure
+            'is_dummy': not anya_registry.is_loaded()
         }
         from trade.anya_trader import confirm_order
         await confirm_order(update, context)
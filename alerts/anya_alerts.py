@@ -0,0 +1,191 @@
+import sqlite3
+import logging
+import time
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from alerts.threshold_book import ThresholdBook, ABOVE, BELOW
+from market import anya_poller, anya_registry
+from security.anya_security import restrict_access, DB_PATH
+
+logger = logging.getLogger(__name__)
+
+MAX_ALERTS_PER_USER = 50
+MAX_DELIVERY_ATTEMPTS = 5   # a crossed alert Telegram won't take is retried on later ticks this many times
+
+book = ThresholdBook()
+_delivery_failures = {}     # alert_id -> failed sends so far
+
+
+def init_alerts_db():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS alerts (alert_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, chat_id INTEGER, "
+        "symbol TEXT, direction TEXT, price REAL, created_at REAL)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_alerts_user ON alerts (user_id)")
+    conn.commit()
+    conn.close()
+
+
+def load_alerts():
+    """Rebuild the in-memory threshold book from SQLite"""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT alert_id, user_id, chat_id, symbol, direction, price FROM alerts")
+    rows = c.fetchall()
+    conn.close()
+
+    for alert_id, user_id, chat_id, symbol, direction, price in rows:
+        book.add(alert_id, symbol, direction, price, (user_id, chat_id))
+    logger.info(f"Loaded {len(rows)} price alerts")
+
+
+def store_alert(user_id: str, chat_id: int, symbol: str, direction: str, price: float):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("INSERT INTO alerts (user_id, chat_id, symbol, direction, price, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+              (user_id, chat_id, symbol, direction, price, time.time()))
+    alert_id = c.lastrowid
+    conn.commit()
+    conn.close()
+    book.add(alert_id, symbol, direction, price, (user_id, chat_id))
+    return alert_id
+
+
+def delete_alerts(alert_ids: list):
+    if not alert_ids:
+        return
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.executemany("DELETE FROM alerts WHERE alert_id = ?",
+                  [(alert_id,) for alert_id in alert_ids])
+    conn.commit()
+    conn.close()
+    for alert_id in alert_ids:
+        book.remove(alert_id)
+
+
+def user_alerts(user_id: str):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "SELECT alert_id, symbol, direction, price FROM alerts WHERE user_id = ? ORDER BY alert_id", (user_id,))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+
+async def on_market_poll(context: CallbackContext, changed: dict, received: float):
+    """Poller listener: only contracts whose mark price moved are checked"""
+    fired = []
+    for symbol in changed:
+        price = anya_poller.get_mark_price(symbol)
+        if price is None:
+            continue
+        for alert_id, _, direction, threshold, (user_id, chat_id) in book.crossed(symbol, price):
+            try:
+                await context.bot.send_message(
+                    chat_id=chat_id,
+                    text=(
+                        f"🚨 *Price Alert!*\n\n"
+                        f"• {symbol} is {direction} ${threshold:,.2f}\n"
+                        f"• Mark Price: ${price:,.2f}\n\n"
+                        f"Waku waku! Anya kept her promise!"
+                    ),
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            except Exception as e:
+                failures = _delivery_failures[alert_id] = _delivery_failures.get(alert_id, 0) + 1
+                logger.error(f"Alert {alert_id} delivery failed ({failures}/{MAX_DELIVERY_ATTEMPTS}): {e}")
+                if failures < MAX_DELIVERY_ATTEMPTS:
+                    # back in the book, it fires again on the next tick that still crosses
+                    book.add(alert_id, symbol, direction, threshold, (user_id, chat_id))
+                    continue
+            _delivery_failures.pop(alert_id, None)
+            fired.append(alert_id)
+    delete_alerts(fired)
+
+
+@restrict_access(need_trading=False)
+async def alert(update: Update, context: CallbackContext, user_id: str):
+    if len(context.args) < 3:
+        await update.message.reply_text(
+            "Usage: /alert <symbol> <above/below> <price>\n"
+            "Example: /alert BTC-PERP above 70000"
+        )
+        return
+
+    direction = context.args[1].lower()
+    if direction not in (ABOVE, BELOW):
+        await update.message.reply_text("❌ B-baka! Direction must be 'above' or 'below'!")
+        return
+    try:
+        price = float(context.args[2])
+        if price <= 0:
+            raise ValueError("Price must be positive!")
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Numbers only, silly! Error: {str(e)}")
+        return
+
+    symbol = await anya_registry.resolve_or_reply(update, context.args[0])
+    if not symbol:
+        return
+    if len(user_alerts(user_id)) >= MAX_ALERTS_PER_USER:
+        await update.message.reply_text(f"🙅 Max {MAX_ALERTS_PER_USER} alerts! Remove some with /unalert <id>")
+        return
+
+    mark = anya_poller.get_mark_price(symbol)
+    if mark is not None and ((direction == ABOVE and mark >= price) or (direction == BELOW and mark <= price)):
+        await update.message.reply_text(f"🤔 {symbol} is already {direction} ${price:,.2f} (mark ${mark:,.2f})!")
+        return
+
+    alert_id = store_alert(user_id, update.effective_chat.id, symbol, direction, price)
+    await update.message.reply_text(
+        f"🔔 *Alert #{alert_id} Set!*\n\n"
+        f"Anya will shout when {symbol} goes {direction} ${price:,.2f}",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+@restrict_access(need_trading=False)
+async def alerts(update: Update, context: CallbackContext, user_id: str):
+    entries = user_alerts(user_id)
+    if not entries:
+        await update.message.reply_text("📭 No active alerts. Try /alert <symbol> above|below <price>")
+        return
+
+    lines = ["🔔 *Your Alerts*", ""]
+    for alert_id, symbol, direction, threshold in entries:
+        lines.append(f"• #{alert_id} {symbol} {direction} ${threshold:,.2f}")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+
+@restrict_access(need_trading=False)
+async def unalert(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        await update.message.reply_text("Usage: /unalert <alert_id>")
+        return
+    try:
+        alert_id = int(context.args[0].lstrip('#'))
+    except ValueError:
+        await update.message.reply_text("❌ Alert IDs are numbers, b-baka!")
+        return
+
+    entry = book.get(alert_id)
+    if not entry or entry[3][0] != user_id:
+        await update.message.reply_text("🤔 Anya can’t find that alert!")
+        return
+
+    delete_alerts([alert_id])
+    await update.message.reply_text(f"🔕 Alert #{alert_id} removed!")
+
+
+def main(app):
+    init_alerts_db()
+    load_alerts()
+    anya_poller.add_listener(on_market_poll)
+    app.add_handler(CommandHandler("alert", alert))
+    app.add_handler(CommandHandler("alerts", alerts))
+    app.add_handler(CommandHandler("unalert", unalert))
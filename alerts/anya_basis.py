@@ -0,0 +1,304 @@
+import sqlite3
+import logging
+import time
+import numpy as np
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from market import anya_poller, anya_registry
+from security.anya_security import restrict_access, DB_PATH
+
+logger = logging.getLogger(__name__)
+
+"""
+Index-vs-mark basis for every contract.
+After each market poll the shared contract and index snapshots are joined
+and basis, basis % and annualized basis to settlement are computed for
+all contracts in one numpy pass; /basis and the basis alerts only read
+that table, so no user ever triggers an extra CVEX call.
+"""
+
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+MIN_YEARS = 1 / 365         # closer to settlement than a day, annualizing is just noise
+REARM_RATIO = 0.8           # a fired alert re-arms once |basis| drops below 80% of its threshold
+MAX_ALERTS_PER_USER = 20
+TOP_CONTRACTS = 10
+ALL = "*"
+
+# latest joined table, rebuilt once per poll
+table = {"symbols": [], "index": [], "mark": np.empty(0), "index_price": np.empty(0), "basis": np.empty(0),
+         "basis_pct": np.empty(0), "annualized_pct": np.empty(0), "days": np.empty(0), "computed_at": 0.0}
+basis_alerts = {}   # alert_id -> (user_id, chat_id, symbol or ALL, threshold %, annualized)
+_fired = set()      # (alert_id, symbol) currently over the threshold, silent until re-armed
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def compute_basis(contracts: dict, indices: dict, now: float = None):
+    """
+    Join contracts to their index and compute basis for all of them at once.
+    Perpetuals (no settlement) get NaN annualized basis and days.
+    """
+    now = now or time.time()
+    symbols, index_names, rows = [], [], []
+    for symbol, contract in contracts.items():
+        index_name = contract.get('index')
+        index_row = indices.get(index_name) if index_name else None
+        if index_row is None:
+            continue
+        info = anya_registry.lookup(symbol)
+        settlement = info.settlement_time if info and info.settlement_time else np.nan
+        symbols.append(symbol)
+        index_names.append(index_name)
+        rows.append((_float(contract.get('mark_price')), _float(index_row.get('price')), settlement))
+
+    values = np.array(rows, dtype=float).reshape(-1, 3)
+    mark, index_price, settlement = values[:, 0], values[:, 1], values[:, 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        basis = mark - index_price
+        basis_pct = np.where(index_price > 0, basis / index_price * 100, np.nan)
+        years = (settlement - now) / SECONDS_PER_YEAR
+        annualized = np.where(years > MIN_YEARS, basis_pct / years, np.nan)
+    return {"symbols": symbols, "index": index_names, "mark": mark, "index_price": index_price, "basis": basis,
+            "basis_pct": basis_pct, "annualized_pct": annualized, "days": years * 365, "computed_at": now}
+
+
+def refresh_table():
+    global table
+    table = compute_basis(anya_poller.contracts, anya_poller.indices)
+    return table
+
+
+def _row(i: int):
+    columns = ("mark", "index_price", "basis", "basis_pct", "annualized_pct", "days")
+    return {"symbol": table["symbols"][i], "index": table["index"][i],
+            **{key: float(table[key][i]) for key in columns}}
+
+
+def row(symbol: str):
+    if symbol not in table["symbols"]:
+        return None
+    return _row(table["symbols"].index(symbol))
+
+
+def init_basis_db():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS basis_alerts (alert_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, "
+        "chat_id INTEGER, symbol TEXT, threshold REAL, annualized INTEGER, created_at REAL)")
+    conn.commit()
+    conn.close()
+
+
+def load_basis_alerts():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT alert_id, user_id, chat_id, symbol, threshold, annualized FROM basis_alerts")
+    for alert_id, user_id, chat_id, symbol, threshold, annualized in c.fetchall():
+        basis_alerts[alert_id] = (user_id, chat_id, symbol, threshold, bool(annualized))
+    conn.close()
+    logger.info(f"Loaded {len(basis_alerts)} basis alerts")
+
+
+def store_basis_alert(user_id: str, chat_id: int, symbol: str, threshold: float, annualized: bool):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO basis_alerts (user_id, chat_id, symbol, threshold, annualized, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)", (user_id, chat_id, symbol, threshold, int(annualized), time.time()))
+    alert_id = c.lastrowid
+    conn.commit()
+    conn.close()
+    basis_alerts[alert_id] = (user_id, chat_id, symbol, threshold, annualized)
+    return alert_id
+
+
+def delete_basis_alert(alert_id: int):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("DELETE FROM basis_alerts WHERE alert_id = ?", (alert_id,))
+    conn.commit()
+    conn.close()
+    basis_alerts.pop(alert_id, None)
+    for fired in [fired for fired in _fired if fired[0] == alert_id]:
+        _fired.discard(fired)
+
+
+def breaches():
+    """(alert_id, symbol, value) for every alert newly over its threshold; re-arms the ones back under"""
+    hits = []
+    if not basis_alerts or not table["symbols"]:
+        return hits
+    position = {symbol: i for i, symbol in enumerate(table["symbols"])}
+    magnitudes = {True: np.abs(table["annualized_pct"]), False: np.abs(table["basis_pct"])}
+    for alert_id, (_, _, symbol, threshold, annualized) in basis_alerts.items():
+        values = magnitudes[annualized]
+        targets = table["symbols"] if symbol == ALL else [symbol] if symbol in position else []
+        for target in targets:
+            value = values[position[target]]
+            if np.isnan(value):
+                continue
+            key = (alert_id, target)
+            if value >= threshold and key not in _fired:
+                _fired.add(key)
+                hits.append((alert_id, target, float(value)))
+            elif value < threshold * REARM_RATIO:
+                _fired.discard(key)
+    return hits
+
+
+async def on_market_poll(context: CallbackContext, changed: dict, received: float):
+    """Poller listener: rebuild the table from the shared snapshot, then check alerts"""
+    refresh_table()
+    for alert_id, symbol, _ in breaches():
+        user_id, chat_id, _, threshold, annualized = basis_alerts[alert_id]
+        data = row(symbol)
+        try:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=(
+                    f"📏 *Basis Alert #{alert_id}*\n\n"
+                    f"• `{symbol}`: mark ${data['mark']:,.2f} vs index ${data['index_price']:,.2f}\n"
+                    f"• Basis: {data['basis_pct']:+.3f}%"
+                    + (f" ({data['annualized_pct']:+.1f}% annualized)" if not np.isnan(data['annualized_pct']) else "")
+                    + f"\n• Threshold: {threshold:g}%{' annualized' if annualized else ''}\n\n"
+                    f"Anya smells an arb!"
+                ),
+                parse_mode=ParseMode.MARKDOWN
+            )
+        except Exception as e:
+            logger.error(f"Basis alert {alert_id} delivery failed: {e}")
+
+
+def _format_row(data: dict):
+    annualized = data["annualized_pct"]
+    tail = f" | {annualized:+7.1f}%/y {data['days']:5.0f}d" if not np.isnan(annualized) else " | perp"
+    return f"`{data['symbol']:<14} {data['basis_pct']:+7.3f}%{tail}`"
+
+
+@restrict_access(need_trading=False)
+async def basis(update: Update, context: CallbackContext, user_id: str):
+    if not table["symbols"] or time.time() - table["computed_at"] > anya_poller.POLL_INTERVAL * 3:
+        refresh_table()
+    if not table["symbols"]:
+        await update.message.reply_text("⏳ Anya hasn’t seen contracts and indices yet, try again in a few seconds!")
+        return
+
+    if context.args:
+        symbol = await anya_registry.resolve_or_reply(update, context.args[0])
+        if not symbol:
+            return
+        data = row(symbol)
+        if data is None:
+            await update.message.reply_text(f"🤷 Anya can’t match {symbol} to an index price!")
+            return
+        lines = [
+            f"📏 *Basis*: `{symbol}` vs `{data['index']}`",
+            "",
+            f"• Mark: ${data['mark']:,.2f} | Index: ${data['index_price']:,.2f}",
+            f"• Basis: {data['basis']:+,.2f} ({data['basis_pct']:+.3f}%)",
+        ]
+        if not np.isnan(data["annualized_pct"]):
+            lines.append(f"• Annualized: {data['annualized_pct']:+.2f}% over {data['days']:.1f} days to settlement")
+        else:
+            lines.append("• Perpetual: no settlement, no annualized basis")
+        await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+        return
+
+    # dated contracts ranked by annualized basis, perps by raw basis after them
+    ranking = np.where(np.isnan(table["annualized_pct"]), -np.inf, np.abs(table["annualized_pct"]))
+    order = np.lexsort((-np.nan_to_num(np.abs(table["basis_pct"])), -ranking))[:TOP_CONTRACTS]
+    lines = [f"📏 *Basis* (mark vs index, {len(table['symbols'])} contracts)", ""]
+    lines += [_format_row(_row(i)) for i in order]
+    age = anya_poller.snapshot_age()
+    if age is not None:
+        lines.append(f"\n_Updated {age:.0f}s ago_")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+
+@restrict_access(need_trading=False)
+async def basis_alert(update: Update, context: CallbackContext, user_id: str):
+    if len(context.args) < 2:
+        await update.message.reply_text(
+            "Usage: /basis_alert <symbol|all> <percent> [ann]\n"
+            "Example: /basis_alert all 0.5 or /basis_alert BTC-27DEC24 15 ann"
+        )
+        return
+    try:
+        threshold = float(context.args[1].rstrip('%'))
+        if threshold <= 0:
+            raise ValueError("Threshold must be positive!")
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Numbers only, silly! Error: {str(e)}")
+        return
+    annualized = len(context.args) > 2 and context.args[2].lower().startswith("ann")
+
+    if context.args[0].lower() == "all":
+        symbol = ALL
+    else:
+        symbol = await anya_registry.resolve_or_reply(update, context.args[0])
+        if not symbol:
+            return
+        info = anya_registry.lookup(symbol)
+        if annualized and info and not info.settlement_time:
+            await update.message.reply_text(
+                f"🙅 {symbol} is a perpetual, it never settles so there’s no annualized basis. Drop the 'ann'!")
+            return
+    if sum(1 for entry in basis_alerts.values() if entry[0] == user_id) >= MAX_ALERTS_PER_USER:
+        await update.message.reply_text(f"🙅 Max {MAX_ALERTS_PER_USER} basis alerts! Remove some with /basis_unalert <id>")
+        return
+
+    alert_id = store_basis_alert(user_id, update.effective_chat.id, symbol, threshold, annualized)
+    target = "any contract" if symbol == ALL else f"`{symbol}`"
+    await update.message.reply_text(
+        f"🔔 *Basis Alert #{alert_id} Set!*\n\n"
+        f"Anya will shout when {target}’s basis passes ±{threshold:g}%{' annualized' if annualized else ''}",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+@restrict_access(need_trading=False)
+async def list_basis_alerts(update: Update, context: CallbackContext, user_id: str):
+    entries = [(alert_id, entry) for alert_id, entry in sorted(basis_alerts.items()) if entry[0] == user_id]
+    if not entries:
+        await update.message.reply_text("📭 No basis alerts. Try /basis_alert all 0.5")
+        return
+    lines = ["📏 *Your Basis Alerts*", ""]
+    for alert_id, (_, _, symbol, threshold, annualized) in entries:
+        lines.append(f"• #{alert_id} {'all' if symbol == ALL else f'`{symbol}`'} ±{threshold:g}%{' ann.' if annualized else ''}")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+
+@restrict_access(need_trading=False)
+async def basis_unalert(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        await update.message.reply_text("Usage: /basis_unalert <alert_id>")
+        return
+    try:
+        alert_id = int(context.args[0].lstrip('#'))
+    except ValueError:
+        await update.message.reply_text("❌ Alert IDs are numbers, b-baka!")
+        return
+    entry = basis_alerts.get(alert_id)
+    if not entry or entry[0] != user_id:
+        await update.message.reply_text("🤔 Anya can’t find that basis alert!")
+        return
+    delete_basis_alert(alert_id)
+    await update.message.reply_text(f"🔕 Basis alert #{alert_id} removed!")
+
+
+def main(app):
+    init_basis_db()
+    load_basis_alerts()
+    anya_poller.add_listener(on_market_poll)
+    app.add_handler(CommandHandler("basis", basis))
+    app.add_handler(CommandHandler("basis_alert", basis_alert))
+    app.add_handler(CommandHandler("basis_alerts", list_basis_alerts))
+    app.add_handler(CommandHandler("basis_unalert", basis_unalert))
@@ -0,0 +1,206 @@
+import asyncio
+import sqlite3
+import logging
+import time
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from end_points_handlers.cvex_handler import get_positions_data, get_portfolio_data
+from market import anya_poller, anya_warmup
+from security.anya_security import restrict_access, get_user_keys, DB_PATH
+
+logger = logging.getLogger(__name__)
+
+"""
+Liquidation radar.
+Portfolios are refreshed a few users at a time; distance to liquidation
+is re-checked locally on every market poll using the shared mark prices.
+"""
+
+DEFAULT_THRESHOLD_PCT = 5.0
+POLL_INTERVAL = 15       # seconds between portfolio batches
+BATCH_SIZE = 10          # users refreshed per batch
+REQUEST_PAUSE = 0.2      # seconds between users inside a batch
+WARN_COOLDOWN = 30 * 60  # seconds before repeating a warning for the same position
+
+# user_id -> {"chat_id", "threshold"}
+watchers = {}
+# user_id -> {"positions": [...], "risk": float, "updated_at": float}
+portfolios = {}
+# (user_id, symbol) -> last warning time
+_warned = {}
+_cursor = 0
+
+
+def init_liquidation_db():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS liquidation_watch (user_id TEXT PRIMARY KEY, chat_id INTEGER, threshold_pct REAL)")
+    conn.commit()
+    conn.close()
+
+
+def load_watchers():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT user_id, chat_id, threshold_pct FROM liquidation_watch")
+    for user_id, chat_id, threshold in c.fetchall():
+        watchers[user_id] = {"chat_id": chat_id, "threshold": threshold}
+    conn.close()
+
+
+def set_watcher(user_id: str, chat_id: int, threshold: float = None):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    if threshold is None:
+        c.execute("DELETE FROM liquidation_watch WHERE user_id = ?", (user_id,))
+        watchers.pop(user_id, None)
+        portfolios.pop(user_id, None)
+    else:
+        c.execute("INSERT OR REPLACE INTO liquidation_watch (user_id, chat_id, threshold_pct) VALUES (?, ?, ?)",
+                  (user_id, chat_id, threshold))
+        watchers[user_id] = {"chat_id": chat_id, "threshold": threshold}
+    conn.commit()
+    conn.close()
+
+
+def liquidation_distance(size: float, mark: float, liquidation: float):
+    """Percent the mark can move against the position before liquidation"""
+    if not mark or not liquidation:
+        return None
+    if size > 0:
+        return (mark - liquidation) / mark * 100
+    return (liquidation - mark) / mark * 100
+
+
+def _fetch_portfolio(api_key: str):
+    # Key passed explicitly (no global swap), so it can run in a worker thread
+    return get_positions_data(api_key=api_key), get_portfolio_data(api_key=api_key)
+
+
+async def _refresh_portfolio(user_id: str):
+    _, api_key = get_user_keys(user_id)
+    if not api_key:
+        logger.warning(f"Liquidation watch: no read-only key for {user_id}")
+        return
+    positions, overview = await asyncio.to_thread(_fetch_portfolio, api_key)
+
+    if "error" in positions:
+        logger.warning(f"Liquidation watch: positions for {user_id} failed: {positions['error']}")
+        return
+
+    rows = []
+    for position in positions.get("positions", []):
+        try:
+            size = float(position.get('size_contracts', 0))
+            liquidation = float(position.get('liquidation_price') or 0)
+        except (TypeError, ValueError):
+            continue
+        symbol = position.get('contract_info', {}).get('symbol') or position.get('contract')
+        if size and liquidation and symbol:
+            rows.append({"symbol": symbol, "size": size, "liquidation_price": liquidation})
+
+    risk = None
+    if "error" not in overview:
+        risk = overview.get("portfolio", {}).get("liquidation_risk_1d")
+    portfolios[user_id] = {"positions": rows, "risk": risk, "updated_at": time.time()}
+
+
+async def poll_portfolios(context: CallbackContext):
+    """Job queue callback: refresh the next batch of opted-in portfolios (round robin)"""
+    global _cursor
+
+    user_ids = sorted(watchers)
+    if not user_ids:
+        return
+    if _cursor >= len(user_ids):
+        _cursor = 0
+    batch = user_ids[_cursor:_cursor + BATCH_SIZE]
+    _cursor += BATCH_SIZE
+
+    for user_id in batch:
+        try:
+            await _refresh_portfolio(user_id)
+        except Exception as e:
+            logger.error(f"Liquidation watch refresh failed for {user_id}: {e}")
+        await asyncio.sleep(REQUEST_PAUSE)
+
+
+async def on_market_poll(context: CallbackContext, changed: dict, received: float):
+    """Poller listener: compare cached liquidation prices with fresh marks, no network"""
+    now = time.time()
+    for user_id, portfolio in list(portfolios.items()):
+        watcher = watchers.get(user_id)
+        if not watcher:
+            continue
+        for position in portfolio["positions"]:
+            symbol = position["symbol"]
+            if symbol not in changed:
+                continue
+            mark = anya_poller.get_mark_price(symbol)
+            distance = liquidation_distance(position["size"], mark, position["liquidation_price"])
+            if distance is None:
+                continue
+
+            key = (user_id, symbol)
+            if distance > watcher["threshold"]:
+                _warned.pop(key, None)
+                continue
+            if now - _warned.get(key, 0) < WARN_COOLDOWN:
+                continue
+            _warned[key] = now
+
+            risk = portfolio.get("risk")
+            try:
+                await context.bot.send_message(
+                    chat_id=watcher["chat_id"],
+                    text=(
+                        f"🆘 *Liquidation Danger!*\n\n"
+                        f"• {symbol} ({'LONG' if position['size'] > 0 else 'SHORT'} {abs(position['size']):g})\n"
+                        f"• Mark Price: ${mark:,.2f}\n"
+                        f"• Liq. Price: ${position['liquidation_price']:,.2f}\n"
+                        f"• Distance: {distance:.2f}% (alert at {watcher['threshold']:g}%)"
+                        + (f"\n• Liquidation Risk (24h): {risk}" if risk is not None else "")
+                        + "\n\nAnya is scared! Add margin or reduce, b-baka!"
+                    ),
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            except Exception as e:
+                logger.error(f"Liquidation warning to {user_id} failed: {e}")
+
+
+@restrict_access(need_trading=False)
+async def liq_watch(update: Update, context: CallbackContext, user_id: str):
+    if context.args and context.args[0].lower() == "off":
+        set_watcher(user_id, update.effective_chat.id, None)
+        await update.message.reply_text("😌 Liquidation watch off. Anya hopes you know what you’re doing!")
+        return
+
+    try:
+        threshold = float(context.args[0].rstrip('%')) if context.args else DEFAULT_THRESHOLD_PCT
+        if not 0 < threshold < 100:
+            raise ValueError("Threshold must be between 0 and 100%")
+    except ValueError as e:
+        await update.message.reply_text(
+            f"❌ Usage: /liq_watch [percent|off]\nExample: /liq_watch 5\nError: {str(e)}")
+        return
+
+    set_watcher(user_id, update.effective_chat.id, threshold)
+    await update.message.reply_text(
+        f"🛡 *Liquidation Watch On!*\n\n"
+        f"Anya will warn you when any position gets within {threshold:g}% of liquidation.\n"
+        f"Turn off with /liq_watch off",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+def main(app):
+    init_liquidation_db()
+    load_watchers()
+    anya_warmup.hot_users.update(watchers)
+    anya_poller.add_listener(on_market_poll)
+    app.job_queue.run_repeating(
+        poll_portfolios, interval=POLL_INTERVAL, first=5, name="liquidation_watch")
+    app.add_handler(CommandHandler("liq_watch", liq_watch))
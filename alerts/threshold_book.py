@@ -0,0 +1,132 @@
+import heapq
+
+"""
+Per-contract threshold book.
+
+"above" thresholds live in a min-heap, "below" thresholds in a max-heap,
+so a new price only touches the entries it actually crossed:
+O(log n + k) per tick instead of scanning every alert.
+Removal is lazy - dead ids are skipped when they surface, and the heaps
+are rebuilt once dead slots pass COMPACT_DEAD_SHARE of them.
+"""
+
+ABOVE = "above"
+BELOW = "below"
+COMPACT_DEAD_SHARE = 0.5    # rebuild when this share of heap slots is dead
+COMPACT_MIN_SLOTS = 256     # small books aren't worth rebuilding
+
+
+class ThresholdBook:
+
+    def __init__(self):
+        self._above = {}  # symbol -> [(threshold, entry_id)]
+        self._below = {}  # symbol -> [(-threshold, entry_id)]
+        self._live = {}   # entry_id -> (symbol, direction, threshold, payload)
+        self._slots = 0   # heap entries, live or dead
+
+    def __len__(self):
+        return len(self._live)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._live
+
+    def add(self, entry_id, symbol: str, direction: str, threshold: float, payload=None):
+        if direction == ABOVE:
+            heapq.heappush(self._above.setdefault(symbol, []), (threshold, entry_id))
+        elif direction == BELOW:
+            heapq.heappush(self._below.setdefault(symbol, []), (-threshold, entry_id))
+        else:
+            raise ValueError(f"Direction must be '{ABOVE}' or '{BELOW}'")
+        self._slots += 1
+        self._live[entry_id] = (symbol, direction, threshold, payload)
+        self._maybe_compact()   # re-adding a live id leaves its old slot dead
+
+    def remove(self, entry_id):
+        """Forget an entry; its heap slot is dropped lazily (or by the next compaction)"""
+        entry = self._live.pop(entry_id, None)
+        self._maybe_compact()
+        return entry
+
+    def _maybe_compact(self):
+        if self._slots >= COMPACT_MIN_SLOTS and self._slots - len(self._live) > COMPACT_DEAD_SHARE * self._slots:
+            self.compact()
+
+    def get(self, entry_id):
+        return self._live.get(entry_id)
+
+    def entries(self, symbol: str = None):
+        return [
+            (entry_id, *entry) for entry_id, entry in self._live.items()
+            if symbol is None or entry[0] == symbol
+        ]
+
+    def symbols(self):
+        return {entry[0] for entry in self._live.values()}
+
+    def crossed(self, symbol: str, price: float):
+        """Pop and return every entry crossed by price as (entry_id, symbol, direction, threshold, payload)"""
+        hits = []
+
+        heap = self._above.get(symbol)
+        while heap and heap[0][0] <= price:
+            threshold, entry_id = heapq.heappop(heap)
+            self._slots -= 1
+            entry = self._live.get(entry_id)
+            if entry and entry[1] == ABOVE and entry[2] == threshold:
+                del self._live[entry_id]
+                hits.append((entry_id, *entry))
+
+        heap = self._below.get(symbol)
+        while heap and -heap[0][0] >= price:
+            neg_threshold, entry_id = heapq.heappop(heap)
+            self._slots -= 1
+            entry = self._live.get(entry_id)
+            if entry and entry[1] == BELOW and entry[2] == -neg_threshold:
+                del self._live[entry_id]
+                hits.append((entry_id, *entry))
+
+        return hits
+
+    def compact(self):
+        """Rebuild heaps without dead entries (remove() calls it once enough of them pile up)"""
+        self._above, self._below = {}, {}
+        self._slots = len(self._live)
+        for entry_id, (symbol, direction, threshold, payload) in self._live.items():
+            if direction == ABOVE:
+                self._above.setdefault(symbol, []).append((threshold, entry_id))
+            else:
+                self._below.setdefault(symbol, []).append((-threshold, entry_id))
+        for heap in list(self._above.values()) + list(self._below.values()):
+            heapq.heapify(heap)
+
+
+if __name__ == "__main__":
+    # Benchmark: python -m alerts.threshold_book
+    import random
+    import time
+
+    random.seed(69)
+    symbols = [f"C{i}-PERP" for i in range(500)]
+    prices = {symbol: 100.0 for symbol in symbols}
+    book = ThresholdBook()
+
+    start = time.perf_counter()
+    for i in range(100_000):
+        symbol = random.choice(symbols)
+        if random.random() < 0.5:
+            book.add(i, symbol, ABOVE, prices[symbol] * random.uniform(1.001, 1.5))
+        else:
+            book.add(i, symbol, BELOW, prices[symbol] * random.uniform(0.5, 0.999))
+    loaded = time.perf_counter() - start
+
+    ticks, fired = 100_000, 0
+    start = time.perf_counter()
+    for _ in range(ticks):
+        symbol = random.choice(symbols)
+        prices[symbol] *= random.uniform(0.995, 1.005)
+        fired += len(book.crossed(symbol, prices[symbol]))
+    elapsed = time.perf_counter() - start
+
+    print(f"Loaded 100k alerts in {loaded * 1000:.1f}ms")
+    print(f"{ticks} ticks in {elapsed * 1000:.1f}ms "
+          f"({elapsed / ticks * 1e6:.2f}us/tick), {fired} alerts fired, {len(book)} live")
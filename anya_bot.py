@@ -1,7 +1,7 @@
 import json
 import os
 import logging
-from time import time
+import time
 from dotenv import load_dotenv
 import requests
 from telegram import Update
@@ -17,11 +17,31 @@ from end_points_handlers.cvex_handler import (
     get_contracts_history, get_portfolio_overview, get_positions, get_position_details,
     get_orders, get_order_details, get_trade_history, get_orders_history, get_transactions_history,
     send_order, estimate_order, execute_atomic_orders, estimate_atomic_orders, reduce_order, replace_order,
-    cancel_live_order, execute_cancel_all_orders, execute_batch_actions, set_cancel_all_after, get_cancel_timer_status
-
+    cancel_live_order, execute_cancel_all_orders, execute_batch_actions, set_cancel_all_after, get_cancel_timer_status,
+    get_transport_stats
 )
 from trade.anya_trader import TRADING_HANDLERS
+from trade.anya_triggers import main as triggers_main
+from trade.anya_slicer import main as slicer_main
+from trade.anya_heartbeat import main as heartbeat_main
+from trade.anya_whatif import WHATIF_HANDLERS
+from trade.anya_var import VAR_HANDLERS
+from trade.anya_paper import PAPER_HANDLERS, main as paper_main
+from trade.anya_backtest import BACKTEST_HANDLERS
+from trade.anya_pnl import main as pnl_main
+from trade.anya_export import EXPORT_HANDLERS
+from trade import anya_accounts
+from market.anya_candles import main as candles_main
+from market.anya_chart import CHART_HANDLERS
+from market.anya_flow import main as flow_main
 from ai.anya_ai import AI_HANDLERS
+from market.anya_poller import POLLER_HANDLERS, schedule_poller
+from market import anya_registry, anya_recorder, anya_orderbook
+from trade import anya_risk
+from market.anya_warmup import post_init as warmup_post_init, post_shutdown as warmup_post_shutdown
+from alerts.anya_alerts import main as alerts_main
+from alerts.anya_liquidation import main as liquidation_main
+from alerts.anya_basis import main as basis_main
 from security.anya_security import main as security_main, readonly_key, trading_key
 from security.anya_security import restrict_access
 
@@ -42,10 +62,18 @@ async def test_api(update: Update, context: CallbackContext):
         url = "https://api.cvex.trade/v1/market/indices"
         response = requests.get(url, headers={"accept": "application/json"})
 
+        stats = get_transport_stats()
         result = (
             f"Status: {response.status_code}\n"
             f"Headers: {response.headers}\n"
-            f"First 200 chars:\n{response.text[:200]}"
+            f"First 200 chars:\n{response.text[:200]}\n\n"
+            f"CVEX reads: {stats['requests']} | 304s: {stats['not_modified']} | unchanged: {stats['hash_hits']}\n"
+            f"Wire: {stats['wire_bytes']}B | Decoded: {stats['decoded_bytes']}B | Saved: {stats['bytes_saved']}B\n"
+            f"Local estimates vs CVEX ({anya_risk.ACCURACY['samples']} samples): "
+            f"fee {anya_risk.ACCURACY['fee_err_pct']:.1f}% | leverage {anya_risk.ACCURACY['leverage_err']:.2f}x | "
+            f"liq {anya_risk.ACCURACY['liq_err_pct']:.1f}%\n"
+            f"Recorder: {anya_recorder.RECORDER_STATS['records']} responses in {anya_recorder.RECORDER_STATS['blocks']} blocks | "
+            f"{anya_recorder.RECORDER_STATS['written_bytes']}B on disk | dropped {anya_recorder.RECORDER_STATS['dropped']}"
         )
 
         await update.message.reply_text(f"```\n{result}\n```", parse_mode=ParseMode.MARKDOWN)
@@ -115,18 +143,36 @@ async def help_category(update: Update, context: CallbackContext) -> None:
             "/contract <symbol> - Get contract details\n"
             "/order_book <symbol> - View order book\n"
             "/latest_trades <symbol> - Recent trades\n"
-            "/contracts_history - Contract events"
+            "/flow <symbol> [window] - Buy/sell flow & VWAP\n"
+            "/contracts_history - Contract events\n"
+            "/watch <symbol> - Get price updates\n"
+            "/unwatch <symbol> - Stop updates\n"
+            "/watching - Your watchlist\n"
+            "/alert <symbol> <above/below> <price> - Price alert\n"
+            "/alerts - Your alerts\n"
+            "/unalert <id> - Remove alert\n"
+            "/basis [symbol] - Mark vs index basis\n"
+            "/basis_alert <symbol|all> <pct> [ann] - Basis alert\n"
+            "/basis_alerts - Your basis alerts\n"
+            "/basis_unalert <id> - Remove basis alert"
         ),
         "account": (
             "👤 ACCOUNT COMMANDS:\n\n"
-            "/portfolio - Portfolio overview\n"
-            "/positions - Open positions\n"
+            "/portfolio [all] - Portfolio overview\n"
+            "/positions [all] - Open positions\n"
             "/position <symbol> - Position details\n"
             "/orders - Open orders\n"
             "/order <id> - Order details\n"
             "/history [limit] - Trade history\n"
             "/orders_history [limit] - Order history\n"
-            "/transactions [limit] - Transactions"
+            "/transactions [limit] - Transactions\n"
+            "/pnl [1d|7d|30d|90d|all] - PnL ledger\n"
+            "/export <trades|orders|transactions> [csv|parquet] - Full history file\n"
+            "/addaccount <name> <API_KEY> - Add a named account\n"
+            "/accounts - List accounts\n"
+            "/removeaccount <name> - Forget an account\n"
+            "/whatif [<contract> <move%> ...] [heatmap] - Stress test\n"
+            "/risk - VaR, expected shortfall & correlations"
         ),
         "history": (
             "🗒 PRICE HISTORY COMMANDS:\n\n"
@@ -134,7 +180,8 @@ async def help_category(update: Update, context: CallbackContext) -> None:
             "/contract_history <symbol>\n"
             "/mark_history <symbol>\n"
             "/ask_history <symbol>\n"
-            "/bid_history <symbol>"
+            "/bid_history <symbol>\n"
+            "/chart <symbol> [period] - Candlestick chart"
         ),
         "trading": (
             "💎 TRADING COMMANDS:\n\n"
@@ -145,7 +192,20 @@ async def help_category(update: Update, context: CallbackContext) -> None:
             "/reduce_order <id> <amount>\n"
             "/replace_order <id> [price] [qty]\n"
             "/cancel_live_order <id>\n"
-            "/cancel_all [limit/market]"
+            "/cancel_all [limit/market]\n"
+            "/stop_loss <contract> <side> <qty> <price>\n"
+            "/take_profit <contract> <side> <qty> <price>\n"
+            "/trailing_stop <contract> <side> <qty> <trail%>\n"
+            "/triggers - Armed triggers\n"
+            "/cancel_trigger <id>\n"
+            "/twap <contract> <side> <qty> <duration> [slices]\n"
+            "/iceberg <contract> <side> <qty> <visible> <price>\n"
+            "/executions - Running slicers\n"
+            "/stop_execution <id>\n"
+            "/paper_order <contract> <side> <type> <qty> [price] - Paper trade\n"
+            "/paper - Paper portfolio\n"
+            "/paper_cancel <id> | /paper_reset\n"
+            "/backtest <contract> <ma|rsi|breakout> [params] - Test a rule on history"
         ),
         "advanced": (
             "🚀 ADVANCED COMMANDS:\n\n"
@@ -156,7 +216,9 @@ async def help_category(update: Update, context: CallbackContext) -> None:
             "⚠️ SAFETY COMMANDS:\n\n"
             "/set_timer <seconds> (0=disable)\n"
             "Recommended: /set_timer 60\n"
-            "/timer_status [id]"
+            "/timer_status [id]\n"
+            "/heartbeat <seconds|off> - Auto re-armed timer\n"
+            "/liq_watch [percent|off] - Liquidation warnings"
         ),
         "fun": (
             "🎉 FUN COMMANDS:\n\n"
@@ -222,7 +284,9 @@ async def index(update: Update, context: CallbackContext, user_id: str):
         if not context.args:
             await update.message.reply_text("Usage: /index <id_or_symbol>")
             return
-        id_or_symbol = context.args[0]
+        id_or_symbol = await anya_registry.resolve_or_reply(update, context.args[0], "index")
+        if not id_or_symbol:
+            return
         try:
             data = get_index_details(id_or_symbol)
             await update.message.reply_text(data, parse_mode=ParseMode.MARKDOWN)
@@ -248,7 +312,9 @@ async def contract(update: Update, context: CallbackContext, user_id: str):
         if not context.args:
             await update.message.reply_text("Usage: /contract <id_or_symbol>")
             return
-        id_or_symbol = context.args[0]
+        id_or_symbol = await anya_registry.resolve_or_reply(update, context.args[0], "contract")
+        if not id_or_symbol:
+            return
         try:
             data = get_contract_details(id_or_symbol)
             await update.message.reply_text(data, parse_mode=ParseMode.MARKDOWN)
@@ -264,7 +330,9 @@ async def index_history(update: Update, context: CallbackContext, user_id: str):
             await update.message.reply_text("Usage: /index_history <id_or_symbol> [period] [limit]")
             return
 
-        id_or_symbol = context.args[0]
+        id_or_symbol = await anya_registry.resolve_or_reply(update, context.args[0], "index")
+        if not id_or_symbol:
+            return
         period = context.args[1] if len(context.args) > 1 else "1d"
         limit = int(context.args[2]) if len(context.args) > 2 else 5
 
@@ -287,7 +355,9 @@ async def contract_history(update: Update, context: CallbackContext, user_id: st
             await update.message.reply_text("Usage: /contract_history <id_or_symbol> [period]")
             return
 
-        id_or_symbol = context.args[0]
+        id_or_symbol = await anya_registry.resolve_or_reply(update, context.args[0], "contract")
+        if not id_or_symbol:
+            return
         period = context.args[1] if len(context.args) > 1 else "1h"
 
         if period not in VALID_PERIODS:
@@ -313,7 +383,9 @@ async def mark_history(update: Update, context: CallbackContext, user_id: str):
             await update.message.reply_text("Usage: /mark_history <id_or_symbol> [period] [limit]")
             return
 
-        id_or_symbol = context.args[0]
+        id_or_symbol = await anya_registry.resolve_or_reply(update, context.args[0], "contract")
+        if not id_or_symbol:
+            return
 
         period = "1h"
         if len(context.args) > 1:
@@ -349,7 +421,9 @@ async def ask_history(update: Update, context: CallbackContext, user_id: str):
             await update.message.reply_text("Usage: /ask_history <id_or_symbol> [period] [limit]")
             return
 
-        id_or_symbol = context.args[0]
+        id_or_symbol = await anya_registry.resolve_or_reply(update, context.args[0], "contract")
+        if not id_or_symbol:
+            return
 
         period = "1h"
         if len(context.args) > 1:
@@ -385,7 +459,9 @@ async def bid_history(update: Update, context: CallbackContext, user_id: str):
             await update.message.reply_text("Usage: /bid_history <id_or_symbol> [period] [limit]")
             return
 
-        id_or_symbol = context.args[0]
+        id_or_symbol = await anya_registry.resolve_or_reply(update, context.args[0], "contract")
+        if not id_or_symbol:
+            return
 
         period = "1h"
         if len(context.args) > 1:
@@ -434,7 +510,9 @@ async def order_book(update: Update, context: CallbackContext, user_id: str):
 
         try:
 
-            contract_identifier = context.args[0].strip()
+            contract_identifier = await anya_registry.resolve_or_reply(update, context.args[0].strip())
+            if not contract_identifier:
+                return
 
             limit = 5
             if len(context.args) > 1:
@@ -484,7 +562,9 @@ async def latest_trades(update: Update, context: CallbackContext, user_id: str):
             await update.message.reply_text("Usage: /latest_trades <symbol> [limit]")
             return
 
-        id_or_symbol = context.args[0].upper()
+        id_or_symbol = await anya_registry.resolve_or_reply(update, context.args[0])
+        if not id_or_symbol:
+            return
 
         limit = 5
         if len(context.args) > 1:
@@ -527,6 +607,9 @@ async def contracts_history(update: Update, context: CallbackContext, user_id: s
 
 @restrict_access(need_trading=False)
 async def portfolio(update: Update, context: CallbackContext, user_id: str):
+    if context.args and context.args[0].lower() == "all":
+        await anya_accounts.reply_all(update, user_id, "portfolio")
+        return
     with readonly_key(user_id):
         try:
             data = get_portfolio_overview()
@@ -538,6 +621,9 @@ async def portfolio(update: Update, context: CallbackContext, user_id: str):
 
 @restrict_access(need_trading=False)
 async def positions(update: Update, context: CallbackContext, user_id: str):
+    if context.args and context.args[0].lower() == "all":
+        await anya_accounts.reply_all(update, user_id, "positions")
+        return
     with readonly_key(user_id):
         try:
             data = get_positions()
@@ -670,16 +756,25 @@ async def place_order(update: Update, context: CallbackContext, user_id: str):
             await update.message.reply_text(f"❌ Numbers only, silly! Error: {str(e)}")
             return
 
+        info, error = anya_registry.validate_order(contract, quantity, price)
+        if error:
+            await update.message.reply_text(f"❌ {error}")
+            return
+        if info:
+            contract = info.symbol
+
         context.user_data['pending_order'] = {
             'contract': contract,
             'side': side,
             'type': order_type,
             'quantity': quantity,
-            'price': price,
-            'timestamp': time.time()
+            'price': price
         }
 
         order = context.user_data['pending_order']
+        fill = await anya_orderbook.fill_preview(contract, side, quantity, price if order_type == "limit" else None)
+        book_lines = anya_orderbook.format_fill(fill)
+        book_text = "\n".join(book_lines) + "\n\n" if book_lines else ""
         keyboard = [
             [
                 InlineKeyboardButton(
@@ -695,10 +790,13 @@ async def place_order(update: Update, context: CallbackContext, user_id: str):
             f"• Type: `{order['type'].upper()}`\n"
             f"• Quantity: `{order['quantity']}`\n"
             f"{'• Price: $' + str(order['price']) if order['price'] else ''}\n\n"
+            f"{book_text}"
             f"⚠️ Confirm within 5 seconds",
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode=ParseMode.MARKDOWN
         )
+        # the confirm window starts once the preview is actually on screen
+        order['timestamp'] = time.time()
 
 
 @restrict_access(need_trading=True)
@@ -752,11 +850,16 @@ async def place_sim_order(update: Update, context: CallbackContext, user_id: str
     with trading_key(user_id):
         if len(context.args) < 4:
             await update.message.reply_text(
-                "Usage: /place_sim_order <contract> <buy/sell> <market/limit> <quantity> [price]\n"
-                "Example: /place_sim_order BTC-24MAR24 sell limit 10 55000.00"
+                "Usage: /place_sim_order <contract> <buy/sell> <market/limit> <quantity> [price] [exact]\n"
+                "Example: /place_sim_order BTC-24MAR24 sell limit 10 55000.00\n"
+                "Add 'exact' to ask CVEX instead of Anya’s local math"
             )
             return
 
+        exact = context.args[-1].lower() == "exact"
+        if exact:
+            context.args = context.args[:-1]
+
         contract, side, order_type, quantity = context.args[0], context.args[1].lower(
         ), context.args[2].lower(), context.args[3]
         if side not in ["buy", "sell"]:
@@ -775,14 +878,30 @@ async def place_sim_order(update: Update, context: CallbackContext, user_id: str
             await update.message.reply_text(f"❌ Numbers only, silly! Error: {str(e)}")
             return
 
+        info, error = anya_registry.validate_order(contract, quantity, price)
+        if error:
+            await update.message.reply_text(f"❌ {error}")
+            return
+        if info:
+            contract = info.symbol
+
         try:
-            sim_data = estimate_order(
-                contract=contract,
-                order_type=order_type,
-                quantity=quantity,
-                price=price,
-                side=side
-            )
+            sim_data = None
+            if not exact and not anya_risk.needs_server_estimate(user_id):
+                sim_data = anya_risk.local_estimate(user_id, contract, side, order_type, quantity, price)
+            if sim_data is None:
+                sim_data = estimate_order(
+                    contract=contract,
+                    order_type=order_type,
+                    quantity=quantity,
+                    price=price,
+                    side=side
+                )
+                anya_risk.calibrate(user_id, {
+                    "contract": contract, "type": order_type,
+                    "quantity": quantity if side == "buy" else -quantity, "price": price
+                }, anya_risk.local_estimate(user_id, contract, side, order_type, quantity, price), sim_data)
+            anya_risk.count_preview(user_id)
             if "error" in sim_data:
                 await update.message.reply_text(f"❌ Simulation failed: {sim_data['error']}")
                 return
@@ -807,7 +926,8 @@ async def place_sim_order(update: Update, context: CallbackContext, user_id: str
                 f"{'• Price: $' + str(price) if price else ''}\n"
                 f"• Fees: `${float(sim_data.get('trading_fee', 0)) + float(sim_data.get('operational_fee', 0)):.6f}`\n"
                 f"• New Leverage: `{sim_data.get('new_leverage', 'N/A')}x`\n"
-                f"• Liq Price: `${sim_data.get('estimated_liquidation_price', 'N/A')}`",
+                f"• Liq Price: `${sim_data.get('estimated_liquidation_price', 'N/A')}`"
+                + ("\n\n_Anya’s local math, add 'exact' to ask CVEX_" if sim_data.get('source') == 'local' else ""),
                 parse_mode=ParseMode.MARKDOWN,
                 reply_markup=reply_markup
             )
@@ -877,12 +997,22 @@ async def atomic_order(update: Update, context: CallbackContext, user_id: str):
                 else:
                     i += 3
 
-                orders.append(order)
-
             except (IndexError, ValueError):
                 await update.message.reply_text("⚠️ Invalid order format. Please check your input.")
                 return
 
+            if order_type not in ["market", "limit"]:
+                await update.message.reply_text(f"❌ Nuh uh! Type must be 'market' or 'limit', not '{order_type}'!")
+                return
+            info, error = anya_registry.validate_order(
+                contract, float(quantity_steps), float(order["limit_price"]) if "limit_price" in order else None)
+            if error:
+                await update.message.reply_text(f"❌ Order {len(orders) + 1}: {error}")
+                return
+            if info:
+                order["contract"] = info.symbol
+            orders.append(order)
+
         context.user_data["pending_atomic"] = {
             "orders": orders,
             "timestamp": time.time()
@@ -979,7 +1109,21 @@ async def atomic_sim_order(update: Update, context: CallbackContext, user_id: st
             orders.append(order)
 
         try:
-            results = estimate_atomic_orders(orders)
+            # Apply the legs in sequence on the local snapshot; CVEX only for samples
+            legs = [{
+                "contract": order["contract"], "type": order["type"],
+                "quantity": float(order["quantity_steps"]),
+                "price": float(order["limit_price"]) if "limit_price" in order else None
+            } for order in orders]
+            results = None
+            if not anya_risk.needs_server_estimate(user_id):
+                results = anya_risk.simulate(user_id, legs)
+            if results is None:
+                results = estimate_atomic_orders(orders)
+                if isinstance(results, list) and results:
+                    local = anya_risk.simulate(user_id, legs[:1])
+                    anya_risk.calibrate(user_id, legs[0], local[0] if local else None, results[0])
+            anya_risk.count_preview(user_id)
             if "error" in results:
                 await update.message.reply_text(f"❌ Simulation failed: {results['error']}")
                 return
@@ -1023,6 +1167,16 @@ async def reduce_order_cmd(update: Update, context: CallbackContext, user_id: st
             return
 
         order_id, reduce_by = context.args[0], context.args[1]
+        try:
+            if float(reduce_by) <= 0:
+                raise ValueError("Amount must be positive!")
+        except ValueError as e:
+            await update.message.reply_text(f"❌ Numbers only, silly! Error: {str(e)}")
+            return
+        if anya_registry.lookup(order_id):
+            await update.message.reply_text(
+                f"❌ {order_id} is a contract, not an order ID! Find yours with /orders")
+            return
 
         context.user_data['pending_reduction'] = {
             'order_id': order_id,
@@ -1557,7 +1711,7 @@ async def button_callback(update: Update, context: CallbackContext):
                     await query.edit_message_text("❌ No pending order!")
                     return
 
-                if time.time() - context.user_data['pending_order']['timestamp'] < 5:
+                if time.time() - context.user_data['pending_order'].get('timestamp', time.time()) < 5:
                     await query.edit_message_text("⏳ Too fast! Wait 5 seconds to confirm.")
                     return
 
@@ -1727,8 +1881,18 @@ async def whoami(update: Update, context: CallbackContext):
     await update.message.reply_text(f"Your user id: {update.effective_user.username}")
 
 
-def main():
-    app = Application.builder().token(TOKEN).build()
+def build_application(token: str = TOKEN, request=None, get_updates_request=None):
+    """The full handler graph; the replay harness builds it with its own request objects"""
+    builder = (
+        Application.builder().token(token)
+        .post_init(warmup_post_init)
+        .post_shutdown(warmup_post_shutdown)
+    )
+    if request is not None:
+        builder = builder.request(request)
+    if get_updates_request is not None:
+        builder = builder.get_updates_request(get_updates_request)
+    app = builder.build()
     app.add_handler(CommandHandler("whoami", whoami))
     security_main(app)
     # LAUNCH
@@ -1753,6 +1917,8 @@ def main():
     app.add_handler(CommandHandler("orders_history", orders_history))
     app.add_handler(CommandHandler("transactions", transactions))
     app.add_handler(CommandHandler("position", position_details))
+    for handler in WHATIF_HANDLERS + VAR_HANDLERS:
+        app.add_handler(handler)
 
     # Price History
     app.add_handler(CommandHandler("index_history", index_history))
@@ -1764,6 +1930,18 @@ def main():
     app.add_handler(CommandHandler("latest_trades", latest_trades))
     app.add_handler(CommandHandler("contracts_history", contracts_history))
 
+    # Shared market poller
+    for handler in POLLER_HANDLERS:
+        app.add_handler(handler)
+    schedule_poller(app)
+    anya_registry.main(app)
+    anya_recorder.main(app)
+    candles_main(app)
+    flow_main(app)
+    alerts_main(app)
+    liquidation_main(app)
+    basis_main(app)
+
     # Trading Commands (Updated)
 
     for handler in TRADING_HANDLERS:
@@ -1782,6 +1960,13 @@ def main():
         confirm_batch, pattern="^confirm_batch$"))
     CallbackQueryHandler(confirm_order, pattern="^confirm_order$")
     CallbackQueryHandler(cancel_order, pattern="^cancel_order$")
+    triggers_main(app)
+    slicer_main(app)
+    for handler in PAPER_HANDLERS + BACKTEST_HANDLERS + EXPORT_HANDLERS + CHART_HANDLERS:
+        app.add_handler(handler)
+    paper_main(app)
+    pnl_main(app)
+    heartbeat_main(app)
     app.add_handler(CommandHandler("set_timer", set_order_timer))
     app.add_handler(CommandHandler("timer_status", check_timer_status))
 
@@ -1793,7 +1978,11 @@ def main():
 
     # Button handler
     app.add_handler(CallbackQueryHandler(button_callback))
+    return app
 
+
+def main():
+    app = build_application()
     logger.info("Anya is awaiting commands... 🧠")
     app.run_polling(allowed_updates=Update.ALL_TYPES)
 
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+"""
+Offline replay of a recorded session.
+
+    ANYA_RECORD_ALL=1 python anya_bot.py        # capture a session
+    python anya_replay.py db/recordings          # replay it
+
+Recorded Telegram updates go through the real handler graph from
+anya_bot.build_application(); CVEX answers come from a requests adapter
+mounted on the shared session, OpenAI answers from an httpx transport,
+and Telegram API calls are acknowledged locally. Jobs never start, so the
+run only depends on the capture. Each handler callback is timed.
+The database is copied first, so replays never touch the live one.
+"""
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Anya", "username": "anya_replay_bot"}
+MISSING_BODY = json.dumps({"error": {"message": "not in replay capture"}}).encode()
+
+
+class Capture:
+    """Recorded responses per "METHOD url" key, served in time order"""
+
+    def __init__(self, records):
+        self.updates = []
+        self._responses = defaultdict(list)   # key -> [(received, status, body)]
+        self._next = defaultdict(int)
+        self.clock = None                     # receive time of the update being replayed
+        self.served = 0
+        self.missing = defaultdict(int)
+        for received, status, key, _, body in records:
+            if key.startswith("UPDATE "):
+                self.updates.append((received, json.loads(body)))
+            else:
+                self._responses[key].append((received, status, body))
+
+    def serve(self, method: str, url: str, revalidating: bool = False):
+        """
+        First unused response recorded after the current update arrived (the one
+        the live handler got), or the last one once the capture runs out.
+        A recorded 304 only makes sense to a caller holding validators, anyone
+        else gets the latest full body recorded up to that point.
+        """
+        key = f"{method} {url}"
+        responses = self._responses.get(key)
+        if not responses:
+            self.missing[key] += 1
+            return 404, MISSING_BODY
+        index = self._next[key]
+        if self.clock is not None:
+            while index < len(responses) - 1 and responses[index][0] < self.clock:
+                index += 1
+        index = min(index, len(responses) - 1)
+        self._next[key] = index + 1
+        self.served += 1
+
+        _, status, body = responses[index]
+        if status == 304 and not revalidating:
+            full = [response for response in responses[:index + 1] if response[1] == 200] or \
+                   [response for response in responses if response[1] == 200]
+            if full:
+                _, status, body = full[-1]
+        return status, body
+
+
+def replay_adapter(capture: Capture):
+    import requests
+    from requests.adapters import BaseAdapter
+    from requests.structures import CaseInsensitiveDict
+
+    class ReplayAdapter(BaseAdapter):
+        def send(self, request, **kwargs):
+            revalidating = "If-None-Match" in request.headers or "If-Modified-Since" in request.headers
+            status, body = capture.serve(request.method, request.url, revalidating)
+            response = requests.Response()
+            response.status_code = status
+            response.reason = "Replayed"
+            response.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+            response._content = body
+            response.encoding = "utf-8"
+            response.url = request.url
+            response.request = request
+            return response
+
+        def close(self):
+            pass
+
+    return ReplayAdapter()
+
+
+def telegram_request(calls: list):
+    from telegram.request import BaseRequest
+
+    class ReplayRequest(BaseRequest):
+        """Acknowledges every Bot API call locally and keeps a log of them"""
+
+        def __init__(self):
+            self._message_ids = iter(range(1_000_000, 10_000_000))
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url: str, method: str, request_data=None, **kwargs):
+            endpoint = url.rsplit("/", 1)[-1]
+            parameters = request_data.parameters if request_data else {}
+            calls.append((endpoint, parameters.get("text") or parameters.get("caption")))
+            if endpoint == "getMe":
+                result = BOT_USER
+            elif endpoint.startswith(("send", "edit")) and parameters.get("chat_id"):
+                result = {
+                    "message_id": int(parameters.get("message_id") or next(self._message_ids)),
+                    "date": int(time.time()), "from": BOT_USER,
+                    "chat": {"id": int(parameters["chat_id"]), "type": "private"},
+                    "text": parameters.get("text") or parameters.get("caption") or ""
+                }
+            else:
+                result = True
+            return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    return ReplayRequest
+
+
+def _label(handler):
+    from telegram.ext import CommandHandler, CallbackQueryHandler
+
+    if isinstance(handler, CommandHandler):
+        return "/" + ",".join(sorted(handler.commands))
+    if isinstance(handler, CallbackQueryHandler) and getattr(handler.pattern, "pattern", None):
+        return f"button {handler.pattern.pattern}"
+    return f"{type(handler).__name__} {getattr(handler.callback, '__name__', '?')}"
+
+
+def instrument(app, timings: dict, current: dict):
+    """Wrap every handler callback so its wall time lands in timings[label]"""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            label, callback = _label(handler), handler.callback
+
+            async def timed(update, context, _callback=callback, _label=label):
+                current["handlers"].append(_label)
+                started = time.perf_counter()
+                try:
+                    return await _callback(update, context)
+                finally:
+                    timings[_label].append(time.perf_counter() - started)
+
+            handler.callback = timed
+
+
+def _percentile(values: list, share: float):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+async def replay(capture: Capture, realtime: bool = False, settle: float = 5.0):
+    import httpx
+    from openai import AsyncOpenAI
+    import anya_bot
+    from ai import anya_ai
+    from end_points_handlers.cvex_handler import session
+
+    session.mount("https://", replay_adapter(capture))
+
+    def openai_transport(request):
+        status, body = capture.serve(request.method, str(request.url))
+        return httpx.Response(status, content=body, headers={"Content-Type": "application/json"})
+    anya_ai.openai_client = AsyncOpenAI(
+        api_key="replay", max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(openai_transport)))
+
+    calls, errors = [], []
+    ReplayRequest = telegram_request(calls)
+    app = anya_bot.build_application("0:replay", request=ReplayRequest(), get_updates_request=ReplayRequest())
+    timings, current = defaultdict(list), {"handlers": []}
+    instrument(app, timings, current)
+
+    async def on_error(update, context):
+        errors.append(repr(context.error))
+    app.add_error_handler(on_error)
+
+    from telegram import Update
+    await app.initialize()
+    rows = []
+    previous = None
+    try:
+        for received, data in capture.updates:
+            if realtime and previous is not None and received is not None:
+                await asyncio.sleep(max(received - previous, 0))
+            previous = received
+            capture.clock = received
+            current["handlers"], before, failed = [], len(calls), len(errors)
+            started = time.perf_counter()
+            await app.process_update(Update.de_json(data, app.bot))
+            # let tasks the handler spawned (speculative estimates, to_thread calls) run
+            await asyncio.sleep(0)
+            rows.append({
+                "update_id": data.get("update_id"), "handlers": list(current["handlers"]),
+                "ms": (time.perf_counter() - started) * 1000,
+                "telegram_calls": [endpoint for endpoint, _ in calls[before:]],
+                "replies": [text for _, text in calls[before:] if text],
+                "errors": errors[failed:]
+            })
+
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if pending:
+            await asyncio.wait(pending, timeout=settle)
+    finally:
+        await app.shutdown()
+
+    return {
+        "updates": rows,
+        "handlers": {
+            label: {
+                "calls": len(values), "total_ms": sum(values) * 1000,
+                "mean_ms": sum(values) / len(values) * 1000,
+                "p95_ms": _percentile(values, 0.95) * 1000, "max_ms": max(values) * 1000
+            }
+            for label, values in timings.items() if values
+        },
+        "responses_served": capture.served,
+        "missing_responses": dict(capture.missing),
+        "errors": errors
+    }
+
+
+def print_report(report: dict, verbose: bool = False):
+    print(f"Replayed {len(report['updates'])} updates, {report['responses_served']} recorded responses served")
+    print(f"\n{'#':>4} {'update':>12} {'ms':>9}  handlers")
+    for number, row in enumerate(report["updates"], 1):
+        flag = "  !" if row["errors"] else ""
+        print(f"{number:>4} {str(row['update_id']):>12} {row['ms']:>9.1f}  {', '.join(row['handlers']) or '-'}{flag}")
+        if verbose:
+            for text in row["replies"]:
+                print("       > " + text.replace("\n", "\n         ")[:400])
+
+    print(f"\n{'handler':<40} {'calls':>6} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9} {'total ms':>10}")
+    for label, stats in sorted(report["handlers"].items(), key=lambda item: -item[1]["total_ms"]):
+        print(f"{label[:40]:<40} {stats['calls']:>6} {stats['mean_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+              f"{stats['max_ms']:>9.1f} {stats['total_ms']:>10.1f}")
+
+    if report["missing_responses"]:
+        print("\nNot in capture (answered 404):")
+        for key, count in sorted(report["missing_responses"].items()):
+            print(f"  {count:>4}x {key}")
+    if report["errors"]:
+        print(f"\n{len(report['errors'])} handler errors:")
+        for error in report["errors"]:
+            print(f"  {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded Anya session offline")
+    parser.add_argument("capture", help="recording directory (segments + .idx files)")
+    parser.add_argument("--start", type=float, help="epoch seconds to start from")
+    parser.add_argument("--end", type=float, help="epoch seconds to stop at")
+    parser.add_argument("--updates", help="JSON-lines file of updates to feed instead of the recorded ones")
+    parser.add_argument("--db", default="db/anya.db", help="database to copy for the run")
+    parser.add_argument("--realtime", action="store_true", help="keep the recorded gaps between updates")
+    parser.add_argument("--json", help="also write the report here, e.g. to diff two runs")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print what Anya replied")
+    args = parser.parse_args()
+
+    # before any bot module is imported: scratch database, no recording of the replay itself
+    scratch = tempfile.mkdtemp(prefix="anya-replay-")
+    if os.path.exists(args.db):
+        shutil.copy(args.db, os.path.join(scratch, "anya.db"))
+    os.environ["ANYA_DB_PATH"] = os.path.join(scratch, "anya.db")
+    os.environ["ANYA_RECORD"] = "0"
+    os.environ["ANYA_RECORD_ALL"] = "0"
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+
+    from market import anya_recorder
+    capture = Capture(anya_recorder.iter_records(args.start, args.end, directory=args.capture))
+    if args.updates:
+        with open(args.updates) as updates_file:
+            capture.updates = [(None, json.loads(line)) for line in updates_file if line.strip()]
+    if not capture.updates:
+        print("No Telegram updates to replay (record with ANYA_RECORD_ALL=1 or pass --updates)")
+        return
+
+    try:
+        report = asyncio.run(replay(capture, args.realtime))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    print_report(report, args.verbose)
+    if args.json:
+        with open(args.json, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
 import json
 import hashlib
+import threading
+from collections import OrderedDict
 from venv import logger
 import requests
 from datetime import datetime
@@ -8,21 +10,73 @@ from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 
 from security.anya_security import restrict_access
+from market.book_model import BookModel
 
 API_KEY = os.getenv("CVEX_API_KEY")
 PRIVATE_KEY_PATH = "anya2.pem"
+PRIVATE_KEY_USER = None     # whose key PRIVATE_KEY_PATH is, set by the trading key swap
 BASE_URL = "https://api.cvex.trade/v1"
 
+# Keep-alive session that negotiates compressed bodies (br needs `brotli` installed).
+# Every CVEX call goes through it, so response hooks (the recorder) and
+# mounted adapters (the replay harness) see all traffic.
+session = requests.Session()
+session.headers.update({"Accept-Encoding": "gzip, deflate, br"})
 
-def load_private_key(file_path: str):
+HTTP_CACHE_ENTRIES = 2_000     # LRU bound, per-user portfolio reads would otherwise grow it forever
+
+# (url, params, api key) -> validators, content hash, parsed body and rendered text
+_http_cache = OrderedDict()
+_http_cache_lock = threading.Lock()    # reads also run in worker threads
+TRANSPORT_STATS = {
+    "requests": 0,
+    "not_modified": 0,
+    "hash_hits": 0,
+    "wire_bytes": 0,
+    "decoded_bytes": 0,
+    "bytes_saved": 0
+}
+
+
+# user id (or the key path when there's no user) -> (fingerprint, parsed private key)
+_private_keys = {}
+
+
+def load_private_key(file_path: str, user_id: str = None):
+    """
+    Parsed key, cached per user. The fingerprint (PEM hash, or the file's
+    mtime and size) is checked on every call, so a rotated upload or an
+    edited key file is parsed again instead of served stale.
+    """
     if not file_path:
         raise ValueError(
             "Private key path is not set. Check your environment variables.")
-    with open(file_path, "rb") as pem_file:
-        return serialization.load_pem_private_key(
-            pem_file.read(),
-            password=None
-        )
+
+    # Uploaded keys are stored as PEM text, the owner's key as a file path
+    pem_text = file_path.lstrip().startswith("-----BEGIN")
+    if pem_text:
+        fingerprint = hashlib.sha256(file_path.encode()).hexdigest()
+    else:
+        stat = os.stat(file_path)
+        fingerprint = (file_path, stat.st_mtime_ns, stat.st_size)
+    owner = user_id or (fingerprint if pem_text else file_path)
+    cached = _private_keys.get(owner)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    if pem_text:
+        pem = file_path.encode()
+    else:
+        with open(file_path, "rb") as pem_file:
+            pem = pem_file.read()
+    private_key = serialization.load_pem_private_key(pem, password=None)
+    _private_keys[owner] = (fingerprint, private_key)
+    return private_key
+
+
+def forget_private_key(user_id: str):
+    """Drop a user's parsed key after rotation or deletion"""
+    _private_keys.pop(user_id, None)
 
 
 def format_tx_hash(tx_hash):
@@ -40,7 +94,7 @@ def create_headers(method: str, url: str, body: dict):
     """
 
     if url.startswith(f"{BASE_URL}/trading/"):
-        private_key = load_private_key(PRIVATE_KEY_PATH)
+        private_key = load_private_key(PRIVATE_KEY_PATH, PRIVATE_KEY_USER)
         return _create_signed_headers(private_key, method, url, body)
     else:
         return {"X-API-KEY": API_KEY, "accept": "application/json"}
@@ -63,6 +117,139 @@ def _create_signed_headers(private_key, method: str, url: str, body: dict) -> di
     }
 
 
+def _cache_key(url: str, params: dict = None, api_key: str = None):
+    """Read cache key, always under the key the request is actually sent with"""
+    return url, json.dumps(params, sort_keys=True) if params else "", api_key or API_KEY
+
+
+def _count(**deltas):
+    with _http_cache_lock:
+        for name, delta in deltas.items():
+            TRANSPORT_STATS[name] += delta
+
+
+def _cache_get(key):
+    with _http_cache_lock:
+        entry = _http_cache.get(key)
+        if entry is not None:
+            _http_cache.move_to_end(key)
+        return entry
+
+
+def _cache_put(key, entry: dict):
+    with _http_cache_lock:
+        _http_cache[key] = entry
+        _http_cache.move_to_end(key)
+        while len(_http_cache) > HTTP_CACHE_ENTRIES:
+            _http_cache.popitem(last=False)
+
+
+def _conditional_get(url: str, params: dict = None, api_key: str = None):
+    """
+    GET with compression and revalidation:
+    - sends If-None-Match / If-Modified-Since from the last 200 for this url
+    - 304 hands back the cached parsed body
+    - upstreams that ignore validators fall back to a content hash,
+      so an unchanged payload is not parsed again
+    Cache is keyed per API key so portfolio reads never leak between users.
+    An explicit read-only api_key skips the global key, safe from worker threads.
+    :return: (response, data, changed) - data is None on errors
+    """
+
+    key = _cache_key(url, params, api_key)
+    cached = _cache_get(key)
+    if api_key:
+        headers = {"X-API-KEY": api_key, "accept": "application/json"}
+    else:
+        headers = create_headers("GET", url, params or {})
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = session.get(url, headers=headers, params=params, timeout=10)
+    _count(requests=1)
+
+    if response.status_code == 304 and cached:
+        _count(not_modified=1, bytes_saved=cached["size"])
+        return response, cached["data"], False
+
+    if response.status_code != 200:
+        return response, None, True
+
+    body = response.content
+    wire = response.headers.get("Content-Length")
+    wire = int(wire) if wire and response.headers.get(
+        "Content-Encoding") else len(body)
+    _count(wire_bytes=wire, decoded_bytes=len(body), bytes_saved=max(len(body) - wire, 0))
+
+    digest = hashlib.sha256(body).hexdigest()
+    if cached and cached["hash"] == digest:
+        with _http_cache_lock:
+            TRANSPORT_STATS["hash_hits"] += 1
+            cached["etag"] = response.headers.get("ETag")
+            cached["last_modified"] = response.headers.get("Last-Modified")
+        return response, cached["data"], False
+
+    data = response.json()
+    _cache_put(key, {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "hash": digest,
+        "size": len(body),
+        "data": data,
+        "rendered": None
+    })
+    return response, data, True
+
+
+def _render_cached(url: str, changed: bool, render, params: dict = None, api_key: str = None):
+    """Re-use the last rendered text when the payload behind url did not change"""
+
+    cached = _cache_get(_cache_key(url, params, api_key))
+    if cached is None:
+        return render()
+    rendered = cached["rendered"]
+    if changed or rendered is None:
+        rendered = render()
+        with _http_cache_lock:
+            cached["rendered"] = rendered
+    return rendered
+
+
+def get_transport_stats():
+    with _http_cache_lock:
+        return dict(TRANSPORT_STATS)
+
+
+def export_market_cache():
+    """Public /market entries of the read cache, JSON-ready (no per-user data, no candles or books - too volatile)"""
+    with _http_cache_lock:
+        entries = list(_http_cache.items())
+    return [
+        {
+            "url": url, "params": params, "etag": entry["etag"],
+            "last_modified": entry["last_modified"], "hash": entry["hash"],
+            "size": entry["size"], "data": entry["data"]
+        }
+        for (url, params, _), entry in entries
+        if url.startswith(f"{BASE_URL}/market/") and not url.endswith(("/price", "/order-book", "/latest-trades"))
+    ]
+
+
+def import_market_cache(entries: list):
+    for entry in entries:
+        _cache_put((entry["url"], entry["params"], API_KEY), {
+            "etag": entry["etag"],
+            "last_modified": entry["last_modified"],
+            "hash": entry["hash"],
+            "size": entry["size"],
+            "data": entry["data"],
+            "rendered": None
+        })
+
+
 def format_timestamp(timestamp):
     if not timestamp:
         return "N/A"
@@ -85,11 +272,9 @@ def format_price(price):
 
 def fetch_market_data():
     url = f"{BASE_URL}/market/indices"
-    headers = create_headers("GET", url, {})
     try:
-        response = requests.get(url, headers=headers)
+        response, data, changed = _conditional_get(url)
         response.raise_for_status()
-        data = response.json()
         """
         Telegram was bugging out for whatever reason
 
@@ -102,31 +287,113 @@ def fetch_market_data():
                 text = text.replace(char, f'\\{char}')
             return text
 
-        formatted = ["📊 *MARKET INDICES*\\n\\n"]
-        for index in data.get("indices", []):
-            symbol = escape_markdown(index.get('symbol', 'Unknown'))
-            price = escape_markdown(format_price(index.get('price', 'N/A')))
-            active = '✅' if index.get('active', False) else '❌'
+        def render():
+            formatted = ["📊 *MARKET INDICES*\\n\\n"]
+            for index in data.get("indices", []):
+                symbol = escape_markdown(index.get('symbol', 'Unknown'))
+                price = escape_markdown(
+                    format_price(index.get('price', 'N/A')))
+                active = '✅' if index.get('active', False) else '❌'
+
+                formatted.append(
+                    f"*{symbol}*\\n"
+                    f"• Price: ${price}\\n"
+                    f"• Active: {active}\\n\\n"
+                )
 
-            formatted.append(
-                f"*{symbol}*\\n"
-                f"• Price: ${price}\\n"
-                f"• Active: {active}\\n\\n"
-            )
+            return ''.join(formatted)
 
-        return ''.join(formatted)
+        return _render_cached(url, changed, render)
 
     except Exception as e:
         logger.error(f"Market data fetch failed: {str(e)}")
         return f"⚠️ Error retrieving market data: {str(e)}"
 
 
+def get_indices_data():
+    """Raw /market/indices payload for background consumers (no formatting)"""
+
+    url = f"{BASE_URL}/market/indices"
+    try:
+        response, data, _ = _conditional_get(url)
+        if not response.ok or data is None:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        return data
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_contracts_data():
+    """Raw /market/futures payload for background consumers (no formatting)"""
+
+    url = f"{BASE_URL}/market/futures"
+    try:
+        response, data, _ = _conditional_get(url)
+        if not response.ok or data is None:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        return data
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_contract_data(id_or_symbol):
+    """Raw /market/futures/{id_or_symbol} payload for background consumers"""
+
+    url = f"{BASE_URL}/market/futures/{id_or_symbol}"
+    try:
+        response, data, _ = _conditional_get(url)
+        if not response.ok or data is None:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        return data
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_contract_candles(id_or_symbol, period="1h"):
+    """Raw /market/futures/{id_or_symbol}/price candles: {"data": [...]} or {"error": str}"""
+
+    url = f"{BASE_URL}/market/futures/{id_or_symbol}/price"
+    try:
+        response, data, _ = _conditional_get(url, params={"period": period})
+        if not response.ok or data is None:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        return data
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_order_book_data(id_or_symbol):
+    """Raw /market/futures/{id_or_symbol}/order-book: {"bids": [...], "asks": [...]} or {"error": str}"""
+
+    url = f"{BASE_URL}/market/futures/{id_or_symbol}/order-book"
+    try:
+        response, data, _ = _conditional_get(url)
+        if not response.ok or data is None:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        return data
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_latest_trades_data(id_or_symbol):
+    """Raw /market/futures/{id_or_symbol}/latest-trades: {"trades": [...]} or {"error": str}"""
+
+    url = f"{BASE_URL}/market/futures/{id_or_symbol}/latest-trades"
+    try:
+        response, data, _ = _conditional_get(url)
+        if not response.ok or data is None:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        return data
+    except Exception as e:
+        return {"error": str(e)}
+
+
 def get_index_details(id_or_symbol):
 
     url = f"{BASE_URL}/market/indices/{id_or_symbol}"
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -154,30 +421,30 @@ def get_index_details(id_or_symbol):
 def list_contracts():
 
     url = f"{BASE_URL}/market/futures"
-    body = {}
-    headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response, data, changed = _conditional_get(url)
 
-    if response.status_code == 200:
-        data = response.json()
+    if response.ok and data is not None:
         contracts = data.get("contracts", [])
 
         if not contracts:
             return "📋 No available contracts at the moment."
 
-        formatted_output = "📋 *AVAILABLE CONTRACTS*\n\n"
+        def render():
+            formatted_output = "📋 *AVAILABLE CONTRACTS*\n\n"
 
-        for contract in contracts:
-            formatted_output += f"*{contract.get('symbol', 'Unknown')}*\n"
-            formatted_output += f"• ID: {contract.get('contract_id', 'N/A')}\n"
-            formatted_output += f"• Index: {contract.get('index', 'N/A')}\n"
-            formatted_output += f"• Mark Price: ${format_price(contract.get('mark_price', 'N/A'))}\n"
-            formatted_output += f"• 24h Volume: {contract.get('volume_tokens_24h', 'N/A')}\n"
-            formatted_output += f"• Expiry: {format_timestamp(contract.get('settlement_time', 'N/A'))}\n\n"
+            for contract in contracts:
+                formatted_output += f"*{contract.get('symbol', 'Unknown')}*\n"
+                formatted_output += f"• ID: {contract.get('contract_id', 'N/A')}\n"
+                formatted_output += f"• Index: {contract.get('index', 'N/A')}\n"
+                formatted_output += f"• Mark Price: ${format_price(contract.get('mark_price', 'N/A'))}\n"
+                formatted_output += f"• 24h Volume: {contract.get('volume_tokens_24h', 'N/A')}\n"
+                formatted_output += f"• Expiry: {format_timestamp(contract.get('settlement_time', 'N/A'))}\n\n"
 
-        return formatted_output
+            return formatted_output
+
+        return _render_cached(url, changed, render)
     else:
-        return f"⚠️ Error retrieving contracts: {response.text}"
+        return f"⚠️ Error retrieving contracts: {response.text or f'HTTP {response.status_code}'}"
 
 
 def get_contract_details(id_or_symbol):
@@ -185,7 +452,7 @@ def get_contract_details(id_or_symbol):
     url = f"{BASE_URL}/market/futures/{id_or_symbol}"
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -222,7 +489,7 @@ def get_index_price_history(id_or_symbol, limit=5, period="1d"):
     }
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers, params=params)
+    response = session.get(url, headers=headers, params=params)
 
     if response.status_code == 200:
         data = response.json()
@@ -253,7 +520,7 @@ def get_contract_price_history(id_or_symbol, period="1h", limit=5):
     url = f"{BASE_URL}/market/futures/{id_or_symbol}/price?period={period}"
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -281,7 +548,7 @@ def get_mark_price_history(id_or_symbol, period="1h", limit=5):
     url = f"{BASE_URL}/market/futures/{id_or_symbol}/mark-price?period={period}"
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -317,7 +584,7 @@ def get_ask_price_history(id_or_symbol, period="1h", limit=5):
     url = f"{BASE_URL}/market/futures/{id_or_symbol}/ask-price?period={period}"
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -354,7 +621,7 @@ def get_bid_price_history(id_or_symbol, period="1h", limit=5):
     url = f"{BASE_URL}/market/futures/{id_or_symbol}/bid-price?period={period}"
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -405,9 +672,6 @@ def get_order_book(id_or_symbol, limit=5):
         f"{BASE_URL}/market/futures/by-{'id' if is_id else 'symbol'}/{id_or_symbol}/order-book",
 
 
-        f"{BASE_URL}/market/futures/{id_or_symbol.lower() if not is_id else id_or_symbol}/order-book",
-
-
         f"{BASE_URL}/market/order-book/futures/{id_or_symbol}"
     ]
 
@@ -417,7 +681,7 @@ def get_order_book(id_or_symbol, limit=5):
         try:
             logger.info(f"Attempting order book request: {url}")
             headers = create_headers("GET", url, {})
-            response = requests.get(url, headers=headers, timeout=10)
+            response = session.get(url, headers=headers, timeout=10)
 
             logger.info(f"Response status: {response.status_code}")
 
@@ -442,6 +706,15 @@ def get_order_book(id_or_symbol, limit=5):
                     quantity = float(bid.get('quantity_contracts', 0))
                     formatted_output += f"• Price: ${price:,.2f} | Size: {quantity:g} contracts\n"
 
+                model = BookModel.from_snapshot(data)
+                if model.spread_bps is not None:
+                    bid_depth, ask_depth = model.depth(1.0)
+                    formatted_output += (
+                        f"\n📐 Spread: {model.spread_bps:.1f} bps | Microprice: ${model.microprice:,.2f}\n"
+                        f"⚖️ Depth ±1%: {bid_depth:g} bid / {ask_depth:g} ask contracts "
+                        f"(imbalance {model.imbalance(1.0):+.2f})\n"
+                    )
+
                 if 'block' in data and 'block_id' in data['block']:
                     formatted_output += f"\nBlock: {data['block']['block_id']}"
 
@@ -482,7 +755,7 @@ def get_latest_trades(id_or_symbol, limit=5):
         url = f"{BASE_URL}/market/futures/{id_or_symbol}/latest-trades"
         body = {}
         headers = create_headers("GET", url, {})
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=headers)
 
         if response.status_code == 200:
             data = response.json()
@@ -540,7 +813,7 @@ def get_contracts_history(limit=5):
     headers = create_headers("GET", url, {})
 
     try:
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=headers)
         response.raise_for_status()
         data = response.json()
         events = data.get("events", [])
@@ -580,7 +853,7 @@ def get_portfolio_overview():
     url = f"{BASE_URL}/portfolio/overview"
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -615,7 +888,7 @@ def get_positions():
     url = f"{BASE_URL}/portfolio/positions"
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -668,13 +941,39 @@ def get_positions():
         return f"⚠️ Error retrieving positions: {response.text}"
 
 
+def get_portfolio_data(api_key: str = None):
+    """Raw /portfolio/overview payload for background consumers"""
+
+    url = f"{BASE_URL}/portfolio/overview"
+    try:
+        response, data, _ = _conditional_get(url, api_key=api_key)
+        if not response.ok or data is None:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        return data
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_positions_data(api_key: str = None):
+    """Raw /portfolio/positions payload for background consumers"""
+
+    url = f"{BASE_URL}/portfolio/positions"
+    try:
+        response, data, _ = _conditional_get(url, api_key=api_key)
+        if not response.ok or data is None:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        return data
+    except Exception as e:
+        return {"error": str(e)}
+
+
 def get_position_details(id_or_symbol: str):
     """Fetch detailed position info by symbol or ID"""
 
     url = f"{BASE_URL}/portfolio/positions/{id_or_symbol}"
     body = {}
     headers = create_headers("GET", url, {})
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -697,33 +996,34 @@ def get_orders():
     """Fetch all open limit orders for the account"""
 
     url = f"{BASE_URL}/portfolio/orders"
-    headers = create_headers("GET", url, {})
 
     try:
-        response = requests.get(url, headers=headers)
+        response, data, changed = _conditional_get(url)
         response.raise_for_status()
-        data = response.json()
 
         if not data.get("orders"):
             return "📭 No open orders found."
 
-        formatted = "📜 *OPEN ORDERS*\n\n"
+        def render():
+            formatted = "📜 *OPEN ORDERS*\n\n"
+
+            for order in data["orders"]:
+                formatted += (
+                    f"🆔 *{order.get('contract_info', {}).get('symbol', 'Unknown')}*\n"
+                    f"• ID: `{order.get('order_id', 'N/A')}`\n"
+                    f"• Side: `{order.get('side', 'N/A').upper()}`\n"
+                    f"• Price: `${format_price(order.get('limit_price', 'N/A'))}`\n"
+                    f"• Opened: `{order.get('opened_quantity_contracts', 'N/A')} contracts`\n"
+                    f"• Filled: `{order.get('filled_quantity_contracts', 'N/A')} contracts`\n"
+                    f"• Created: `{format_timestamp(order.get('created_at', 'N/A'))}`\n"
+                    f"• Updated: `{format_timestamp(order.get('updated_at', 'N/A'))}`\n"
+                    f"• Time in Force: `{order.get('time_in_force', 'N/A')}`\n"
+                    f"• Reduce Only: `{'✅' if order.get('reduce_only') else '❌'}`\n\n"
+                )
 
-        for order in data["orders"]:
-            formatted += (
-                f"🆔 *{order.get('contract_info', {}).get('symbol', 'Unknown')}*\n"
-                f"• ID: `{order.get('order_id', 'N/A')}`\n"
-                f"• Side: `{order.get('side', 'N/A').upper()}`\n"
-                f"• Price: `${format_price(order.get('limit_price', 'N/A'))}`\n"
-                f"• Opened: `{order.get('opened_quantity_contracts', 'N/A')} contracts`\n"
-                f"• Filled: `{order.get('filled_quantity_contracts', 'N/A')} contracts`\n"
-                f"• Created: `{format_timestamp(order.get('created_at', 'N/A'))}`\n"
-                f"• Updated: `{format_timestamp(order.get('updated_at', 'N/A'))}`\n"
-                f"• Time in Force: `{order.get('time_in_force', 'N/A')}`\n"
-                f"• Reduce Only: `{'✅' if order.get('reduce_only') else '❌'}`\n\n"
-            )
+            return formatted
 
-        return formatted
+        return _render_cached(url, changed, render)
 
     except requests.RequestException as e:
         return f"⚠️ Anya couldn't fetch orders: {str(e)}"
@@ -735,7 +1035,7 @@ def get_order_details(order_id: str):
     headers = create_headers("GET", url, {})
 
     try:
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=headers)
         details = response.json().get("details", {})
         return (
             f"📄 *ORDER {order_id}*\n\n"
@@ -749,13 +1049,26 @@ def get_order_details(order_id: str):
         return f"⚠️ Order lookup failed: {str(e)}"
 
 
+def get_order_data(order_id: str, api_key: str = None):
+    """Raw /portfolio/orders/{order_id} payload for background consumers"""
+
+    url = f"{BASE_URL}/portfolio/orders/{order_id}"
+    try:
+        response, data, _ = _conditional_get(url, api_key=api_key)
+        if not response.ok or data is None:
+            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        return data
+    except Exception as e:
+        return {"error": str(e)}
+
+
 def get_trade_history(limit: int = 5):
 
     url = f"{BASE_URL}/portfolio/history/positions"
     headers = create_headers("GET", url, {})
 
     try:
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=headers)
         events = response.json().get("events", [])
 
         if not events:
@@ -783,7 +1096,7 @@ def get_orders_history(limit: int = 5):
     headers = create_headers("GET", url, {})
 
     try:
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=headers)
         events = response.json().get("events", [])
 
         if not events:
@@ -812,7 +1125,7 @@ def get_transactions_history(limit: int = 5):
     headers = create_headers("GET", url, {})
 
     try:
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=headers)
         events = response.json().get("events", [])
 
         if not events:
@@ -834,8 +1147,43 @@ def get_transactions_history(limit: int = 5):
         return f"⚠️ Failed to fetch transactions: {str(e)}"
 
 
-def send_order(contract: str, order_type: str, quantity: float, price: float = None, time_in_force: str = "GTC", side: str = "buy"):
-    url = f"{BASE_URL}/trading/order"
+def history_headers(kind: str):
+    """Headers for /portfolio/history/{kind}, built under the caller's key swap"""
+    return create_headers("GET", f"{BASE_URL}/portfolio/history/{kind}", {})
+
+
+class HistoryTruncated(RuntimeError):
+    """A full history page came back without a cursor: older events exist but can't be reached"""
+
+
+def iter_history(kind: str, headers: dict, page_size: int = 100, on_truncated=None):
+    """
+    Every /portfolio/history/{kind} event (positions, orders, transactions),
+    newest first, one page in memory at a time. Follows `next_cursor` while
+    CVEX returns one. Blocking - run it in a thread with presigned headers.
+    A full page without a cursor calls on_truncated(), or raises HistoryTruncated
+    when there's none, so callers never mistake a cut-off history for the whole one.
+    """
+    url = f"{BASE_URL}/portfolio/history/{kind}"
+    params = {"limit": page_size}
+    while True:
+        response = session.get(url, headers=headers, params=params, timeout=30)
+        if not response.ok:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        data = response.json()
+        events = data.get("events", [])
+        yield from events
+        cursor = data.get("next_cursor")
+        if events and not cursor and len(events) >= page_size:
+            if on_truncated is None:
+                raise HistoryTruncated(f"{kind} history stopped after a full page with no cursor")
+            on_truncated()
+        if not events or not cursor:
+            return
+        params = {"limit": page_size, "cursor": cursor}
+
+
+def build_order_payload(contract: str, order_type: str, quantity: float, price: float = None, time_in_force: str = "GTC", side: str = "buy"):
     # Flip quantity for sells
     quantity_steps = str(quantity) if side.lower() == "buy" else str(-quantity)
     payload = {
@@ -846,37 +1194,55 @@ def send_order(contract: str, order_type: str, quantity: float, price: float = N
     }
     if price and order_type == "limit":
         payload["limit_price"] = str(price)
+    return payload
 
-    headers = create_headers("POST", url, payload)
+
+def presign_order(payload: dict):
+    """
+    Sign an order request ahead of time.
+    The signature only covers method, url and body, so the headers stay
+    valid until the payload changes - triggers can fire without touching the key.
+    """
+    return create_headers("POST", f"{BASE_URL}/trading/order", payload)
+
+
+def send_order(contract: str, order_type: str, quantity: float, price: float = None, time_in_force: str = "GTC", side: str = "buy"):
+    payload = build_order_payload(
+        contract, order_type, quantity, price, time_in_force, side)
+    return submit_presigned_order(payload, presign_order(payload))
+
+
+def submit_presigned_order(payload: dict, headers: dict):
+    url = f"{BASE_URL}/trading/order"
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = session.post(url, json=payload, headers=headers)
         data = response.json()
         if response.status_code != 200:
             return {"error": data.get("message", "Order failed")}
         return {
             "order_id": data.get("events", [{}])[0].get("id"),
             "contract": data.get("events", [{}])[0].get("contract_id"),
-            "status": "✅ Order accepted" if "order_accepted" in [e["type"] for e in data.get("events", [])] else "🟡 Pending"
+            "status": "✅ Order accepted" if "order_accepted" in [e["type"] for e in data.get("events", [])] else "🟡 Pending",
+            "events": data.get("events", [])
         }
     except Exception as e:
         return {"error": str(e)}
 
 
 def estimate_order(contract: str, order_type: str, quantity: float, price: float = None, side: str = "buy"):
-    url = f"{BASE_URL}/trading/estimate-order"
-    quantity_steps = str(quantity) if side.lower() == "buy" else str(-quantity)
-    payload = {
-        "contract": contract,
-        "type": order_type,
-        "quantity_steps": quantity_steps,
-        "time_in_force": "GTC"
-    }
-    if price and order_type == "limit":
-        payload["limit_price"] = str(price)
+    payload = build_order_payload(
+        contract, order_type, quantity, price, "GTC", side)
+    return submit_presigned_estimate(payload, presign_estimate(payload))
 
-    headers = create_headers("POST", url, payload)
+
+def presign_estimate(payload: dict):
+    return create_headers("POST", f"{BASE_URL}/trading/estimate-order", payload)
+
+
+def submit_presigned_estimate(payload: dict, headers: dict):
+    url = f"{BASE_URL}/trading/estimate-order"
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = session.post(url, json=payload, headers=headers)
         return response.json()
     except Exception as e:
         return {"error": str(e)}
@@ -889,7 +1255,7 @@ def execute_atomic_orders(orders: list):
     headers = create_headers("POST", url, orders)
 
     try:
-        response = requests.post(url, json=orders, headers=headers)
+        response = session.post(url, json=orders, headers=headers)
         data = response.json()
 
         if response.status_code != 200:
@@ -914,7 +1280,7 @@ def estimate_atomic_orders(orders: list):
     headers = create_headers("POST", url, orders)
 
     try:
-        response = requests.post(url, json=orders, headers=headers)
+        response = session.post(url, json=orders, headers=headers)
         return response.json()
     except Exception as e:
         return {"error": str(e)}
@@ -931,7 +1297,7 @@ def reduce_order(order_id: str, reduce_by: float):
     headers = create_headers("POST", url, payload)
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = session.post(url, json=payload, headers=headers)
         data = response.json()
 
         if response.status_code != 200:
@@ -961,7 +1327,7 @@ def replace_order(order_id: str, new_price: float = None, new_quantity: float =
     headers = create_headers("POST", url, payload)
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = session.post(url, json=payload, headers=headers)
         data = response.json()
 
         if response.status_code != 200:
@@ -987,7 +1353,7 @@ def cancel_live_order(order_id: str):
     headers = create_headers("POST", url, payload)
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = session.post(url, json=payload, headers=headers)
         data = response.json()
 
         if response.status_code != 200:
@@ -1010,7 +1376,7 @@ def execute_cancel_all_orders(order_type: str = None):
     headers = create_headers("POST", url, payload)
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = session.post(url, json=payload, headers=headers)
         data = response.json()
 
         if response.status_code != 200:
@@ -1033,11 +1399,18 @@ def execute_batch_actions(actions: list):
     :return: {"status": str, "tx_hash": str, "events": list, "fees": dict} or {"error": str}
     """
 
-    url = f"{BASE_URL}/trading/batch-actions"
-    headers = create_headers("POST", url, actions)
+    return submit_presigned_batch(actions, presign_batch(actions))
 
+
+def presign_batch(actions: list):
+    """Sign a batch under the caller's key swap, so the POST can go out from a thread"""
+    return create_headers("POST", f"{BASE_URL}/trading/batch-actions", actions)
+
+
+def submit_presigned_batch(actions: list, headers: dict):
+    url = f"{BASE_URL}/trading/batch-actions"
     try:
-        response = requests.post(url, json=actions, headers=headers)
+        response = session.post(url, json=actions, headers=headers)
         data = response.json()
 
         if response.status_code != 200:
@@ -1059,12 +1432,19 @@ def set_cancel_all_after(timeout_ms: int):
     :return: {"trigger_id": str, "trigger_time": str} or {"error": str}
     """
 
+    return submit_cancel_all_after(timeout_ms, presign_cancel_all_after(timeout_ms))
+
+
+def presign_cancel_all_after(timeout_ms: int):
+    return create_headers("POST", f"{BASE_URL}/trading/cancel-all-orders-after", {"timeout": timeout_ms})
+
+
+def submit_cancel_all_after(timeout_ms: int, headers: dict, timeout: float = 10):
     url = f"{BASE_URL}/trading/cancel-all-orders-after"
     body = {"timeout": timeout_ms}
-    headers = create_headers("POST", url, timeout_ms)
 
     try:
-        response = requests.post(url, json=body, headers=headers)
+        response = session.post(url, json=body, headers=headers, timeout=timeout)
         data = response.json()
 
         if response.status_code != 200:
@@ -1086,12 +1466,20 @@ def get_cancel_timer_status(trigger_id: str = None):
     :return: {"status": str, "message": str, "tx_hash": str} or {"error": str}
     """
 
+    return submit_cancel_timer_status(trigger_id, presign_cancel_timer_status(trigger_id))
+
+
+def presign_cancel_timer_status(trigger_id: str = None):
+    params = {"id": trigger_id} if trigger_id else {}
+    return create_headers("GET", f"{BASE_URL}/trading/cancel-all-orders-after/status", params)
+
+
+def submit_cancel_timer_status(trigger_id: str, headers: dict, timeout: float = 10):
     url = f"{BASE_URL}/trading/cancel-all-orders-after/status"
     params = {"id": trigger_id} if trigger_id else {}
-    headers = create_headers("GET", url, params)
 
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = session.get(url, headers=headers, params=params, timeout=timeout)
         data = response.json()
 
         if response.status_code != 200:
@@ -1121,5 +1509,16 @@ TRADING_FUNCTIONS = [
     "execute_cancel_all_orders", "execute_batch_actions", "set_cancel_all_after", "get_cancel_timer_status", "estimate_order", "estimate_atomic_orders"
 ]
 
+UTILITY_FUNCTIONS = [
+    "get_transport_stats", "get_indices_data", "get_contracts_data", "get_contract_data", "get_contract_candles",
+    "get_order_book_data", "get_latest_trades_data",
+    "get_portfolio_data", "get_positions_data",
+    "build_order_payload", "presign_order", "submit_presigned_order", "get_order_data",
+    "presign_estimate", "submit_presigned_estimate", "presign_batch", "submit_presigned_batch",
+    "presign_cancel_all_after", "submit_cancel_all_after", "presign_cancel_timer_status", "submit_cancel_timer_status",
+    "history_headers", "iter_history",
+    "load_private_key", "forget_private_key", "export_market_cache", "import_market_cache"
+]
+
 
-__all__ = READ_ONLY_FUNCTIONS + TRADING_FUNCTIONS
+__all__ = READ_ONLY_FUNCTIONS + TRADING_FUNCTIONS + UTILITY_FUNCTIONS + ["HistoryTruncated"]
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+from telegram.ext import CallbackContext
+
+from end_points_handlers.cvex_handler import get_contract_candles
+from security.anya_security import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+"""
+Local candle store.
+Contract candles are upserted into SQLite so analytics read history
+from disk instead of CVEX; the background job keeps tracked contracts
+topped up.
+"""
+
+DEFAULT_PERIOD = "1h"
+PERIOD_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "30m": 1_800, "1h": 3_600, "4h": 14_400, "1d": 86_400}
+SYNC_INTERVAL = 15 * 60  # seconds between background top-ups
+REQUEST_PAUSE = 0.2      # seconds between contracts inside a sync
+
+# (symbol, period) pairs somebody's analytics depend on, refreshed by the job
+tracked = set()
+
+
+def init_candles_db():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS candles (symbol TEXT, period TEXT, time_open INTEGER, "
+        "open REAL, high REAL, low REAL, close REAL, volume REAL, "
+        "PRIMARY KEY (symbol, period, time_open)) WITHOUT ROWID")
+    conn.commit()
+    conn.close()
+
+
+def _epoch_ms(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+def store_candles(symbol: str, period: str, rows: list):
+    """Upsert CVEX candle rows, the still-open candle simply gets overwritten next time"""
+    records = []
+    for row in rows:
+        time_open = _epoch_ms(row.get('time_open'))
+        try:
+            close = float(row['price_close'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if time_open is None:
+            continue
+        records.append((
+            symbol, period, time_open,
+            float(row.get('price_open') or close), float(row.get('price_high') or close),
+            float(row.get('price_low') or close), close, float(row.get('volume_contracts') or 0)
+        ))
+    if not records:
+        return 0
+
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records)
+    conn.commit()
+    conn.close()
+    return len(records)
+
+
+def sync_candles(symbol: str, period: str = DEFAULT_PERIOD):
+    """Fetch the latest candles for one contract (blocking, run it in a thread)"""
+    data = get_contract_candles(symbol, period)
+    if "error" in data:
+        logger.warning(f"Candle sync for {symbol} failed: {data['error']}")
+        return 0
+    return store_candles(symbol, period, data.get("data", []))
+
+
+def watermark(symbols, period: str = DEFAULT_PERIOD):
+    """(symbol, newest time_open, count) per symbol - changes whenever new candles land"""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    marks = []
+    for symbol in sorted(symbols):
+        c.execute("SELECT MAX(time_open), COUNT(*) FROM candles WHERE symbol = ? AND period = ?", (symbol, period))
+        newest, total = c.fetchone()
+        marks.append((symbol, newest, total))
+    conn.close()
+    return tuple(marks)
+
+
+def load_closes(symbols: list, period: str = DEFAULT_PERIOD, limit: int = 720):
+    """
+    Close prices aligned on the timestamps every symbol has.
+    :return: (times (T,), closes (T, len(symbols))) - empty arrays when history is missing
+    """
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    series = []
+    for symbol in symbols:
+        c.execute(
+            "SELECT time_open, close FROM candles WHERE symbol = ? AND period = ? ORDER BY time_open DESC LIMIT ?",
+            (symbol, period, limit))
+        rows = np.array(c.fetchall(), dtype=float).reshape(-1, 2)
+        series.append(rows[::-1])
+    conn.close()
+
+    if not series or any(len(rows) == 0 for rows in series):
+        return np.empty(0), np.empty((0, len(symbols)))
+    times = series[0][:, 0]
+    for rows in series[1:]:
+        times = np.intersect1d(times, rows[:, 0], assume_unique=True)
+    closes = np.column_stack([
+        rows[np.searchsorted(rows[:, 0], times), 1] for rows in series
+    ])
+    return times, closes
+
+
+def load_ohlc(symbol: str, period: str = DEFAULT_PERIOD, limit: int = 5_000):
+    """:return: (times (T,), ohlc (T, 4)) oldest first"""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "SELECT time_open, open, high, low, close FROM candles WHERE symbol = ? AND period = ? "
+        "ORDER BY time_open DESC LIMIT ?", (symbol, period, limit))
+    rows = np.array(c.fetchall(), dtype=float).reshape(-1, 5)[::-1]
+    conn.close()
+    return rows[:, 0], rows[:, 1:]
+
+
+def is_stale(newest, period: str, now: float = None):
+    """True when a whole period has passed since the newest candle opened"""
+    if newest is None:
+        return True
+    now = time.time() if now is None else now
+    return now - newest / 1000 > PERIOD_SECONDS.get(period, PERIOD_SECONDS[DEFAULT_PERIOD])
+
+
+async def ensure_history(symbols, period: str = DEFAULT_PERIOD):
+    """Track the symbols and fetch any whose history is missing or a period behind"""
+    tracked.update((symbol, period) for symbol in symbols)
+    stale = [symbol for symbol, newest, _ in watermark(symbols, period) if is_stale(newest, period)]
+    if stale:
+        await asyncio.gather(*(asyncio.to_thread(sync_candles, symbol, period) for symbol in stale))
+
+
+async def refresh_candles(context: CallbackContext):
+    """Job queue callback: top up every tracked contract and period"""
+    for symbol, period in sorted(tracked):
+        try:
+            await asyncio.to_thread(sync_candles, symbol, period)
+        except Exception as e:
+            logger.error(f"Candle refresh for {symbol} {period} failed: {e}")
+        await asyncio.sleep(REQUEST_PAUSE)
+
+
+def main(app):
+    init_candles_db()
+    app.job_queue.run_repeating(
+        refresh_candles, interval=SYNC_INTERVAL, first=60, name="candles")
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from telegram import Update
+from telegram.error import BadRequest
+from telegram.ext import CommandHandler, CallbackContext
+
+from market import anya_candles, anya_registry
+from market.chart_render import render_candles
+from security.anya_security import restrict_access
+
+logger = logging.getLogger(__name__)
+
+"""
+/chart candlesticks from the local candle store.
+Rendering runs in a spawned worker process (Agg, no display) so the loop
+never waits on matplotlib. PNGs are cached per (symbol, period, newest
+candle); once Telegram has a chart, its file_id is sent instead of the
+bytes, so a repeat request renders nothing and uploads nothing.
+"""
+
+CHART_PERIODS = ("1m", "5m", "15m", "1h", "4h", "1d")
+CHART_CANDLES = 120
+MIN_CANDLES = 10
+MAX_CACHED_CHARTS = 64
+RENDER_WORKERS = 2
+
+_pool = None
+_images = OrderedDict()     # (symbol, period, newest, count) -> PNG bytes, LRU
+_file_ids = {}              # same key -> Telegram file_id of the uploaded PNG
+_rendering = {}             # same key -> in-flight render task, shared by concurrent requests
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def _render(key: tuple, symbol: str, period: str):
+    global _pool
+    times, ohlc = anya_candles.load_ohlc(symbol, period, CHART_CANDLES)
+    if len(ohlc) < MIN_CANDLES:
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        image = await loop.run_in_executor(_executor(), render_candles, symbol, period, times, ohlc)
+    except BrokenProcessPool:
+        _pool = None
+        raise
+    _images[key] = image
+    while len(_images) > MAX_CACHED_CHARTS:
+        stale, _ = _images.popitem(last=False)
+        _file_ids.pop(stale, None)
+    return image
+
+
+async def chart_image(symbol: str, period: str):
+    """(cache key, PNG bytes or None), rendering only when the newest candle changed"""
+    await anya_candles.ensure_history([symbol], period)
+    (_, newest, count), = anya_candles.watermark([symbol], period)
+    key = (symbol, period, newest, count)
+    if key in _images:
+        _images.move_to_end(key)
+        return key, _images[key]
+    if key not in _rendering:
+        _rendering[key] = asyncio.ensure_future(_render(key, symbol, period))
+    try:
+        return key, await asyncio.shield(_rendering[key])
+    finally:
+        # the result is in _images by now, later requests hit the cache
+        _rendering.pop(key, None)
+
+
+@restrict_access(need_trading=False)
+async def chart(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        await update.message.reply_text(f"❌ Usage: /chart <symbol> [{'|'.join(CHART_PERIODS)}]\nExample: /chart BTC-PERP 4h")
+        return
+    period = context.args[1].lower() if len(context.args) > 1 else anya_candles.DEFAULT_PERIOD
+    if period not in CHART_PERIODS:
+        await update.message.reply_text(f"❌ Period must be one of: {', '.join(CHART_PERIODS)}")
+        return
+    symbol = await anya_registry.resolve_or_reply(update, context.args[0])
+    if not symbol:
+        return
+
+    try:
+        key, image = await chart_image(symbol, period)
+    except ImportError:
+        await update.message.reply_text("🎨 Anya’s crayons (matplotlib) aren’t installed, no charts today!")
+        return
+    except Exception as e:
+        logger.error(f"Chart for {symbol} {period} failed: {e}", exc_info=True)
+        await update.message.reply_text(f"💥 Anya smudged the chart! Error: {str(e)}")
+        return
+    if image is None:
+        await update.message.reply_text(
+            f"📉 Not enough {period} candles stored for {symbol} yet. Try again after a candle sync!")
+        return
+
+    caption = f"🕯 {symbol} {period}"
+    file_id = _file_ids.get(key)
+    if file_id:
+        try:
+            await update.message.reply_photo(photo=file_id, caption=caption)
+            return
+        except BadRequest:
+            # Telegram forgot the file, fall through to a fresh upload
+            _file_ids.pop(key, None)
+    message = await update.message.reply_photo(photo=image, caption=caption)
+    if message.photo:
+        _file_ids[key] = message.photo[-1].file_id
+
+
+CHART_HANDLERS = [
+    CommandHandler("chart", chart),
+]
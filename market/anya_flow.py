@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from end_points_handlers.cvex_handler import get_latest_trades_data
+from market import anya_poller, anya_registry
+from market.trade_flow import TradeFlow, BUY, SELL
+from security.anya_security import restrict_access
+
+logger = logging.getLogger(__name__)
+
+"""
+/flow: buy/sell volume, VWAP and trade rate per contract.
+A job polls latest trades for contracts somebody cares about (watched
+ones, plus anything asked for with /flow in the last few hours) and
+feeds them into the ring buffers; the command only reads memory.
+"""
+
+FLOW_INTERVAL = 10              # seconds between latest-trades polls
+TRACK_SECONDS = 6 * 60 * 60     # keep polling a /flow symbol this long after the last ask
+DEFAULT_WINDOW = "1h"
+_WINDOW = re.compile(r"^(\d+)([smhd])$")
+_UNITS = {"s": 1, "m": 60, "h": 3_600, "d": 86_400}
+
+flow = TradeFlow()
+requested = {}      # symbol -> last /flow time
+since = {}          # symbol -> when collection started
+
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def trade_time(trade: dict, default: float):
+    """Epoch seconds of a print (CVEX sends epoch seconds/ms or ISO strings)"""
+    value = trade.get('timestamp') or (trade.get('tx_info') or {}).get('block_timestamp')
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+        value = float(value)
+        return value / 1000 if value > 1e12 else value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return default
+
+
+def trade_key(trade: dict):
+    tx_info = trade.get('tx_info') or {}
+    return (tx_info.get('tx_hash'), trade.get('timestamp') or tx_info.get('block_timestamp'),
+            trade.get('last_price'), trade.get('quantity_contracts'), trade.get('taker_side'))
+
+
+def ingest(symbol: str, trades: list):
+    """Latest-trades payload (newest first) into the rings, oldest first; returns prints added"""
+    now = time.time()
+    since.setdefault(symbol, now)
+    added = 0
+    for trade in reversed(trades):
+        added += flow.add(
+            symbol, trade_key(trade), trade_time(trade, now), _float(trade.get('last_price')),
+            _float(trade.get('quantity_contracts')), BUY if trade.get('taker_side') == "buy" else SELL)
+    return added
+
+
+async def collect(symbol: str):
+    data = await asyncio.to_thread(get_latest_trades_data, symbol)
+    if "error" in data:
+        raise RuntimeError(data["error"])
+    return ingest(symbol, data.get("trades", []))
+
+
+def tracked_symbols(now: float = None):
+    now = now or time.time()
+    for symbol, asked in list(requested.items()):
+        if now - asked > TRACK_SECONDS:
+            requested.pop(symbol, None)
+    return set(requested) | anya_poller.watched_contracts()
+
+
+async def collect_flow(context: CallbackContext):
+    """Job queue callback: one latest-trades call per tracked contract"""
+    for symbol in sorted(tracked_symbols()):
+        try:
+            await collect(symbol)
+        except Exception as e:
+            logger.error(f"Trade flow poll for {symbol} failed: {e}")
+
+
+def parse_window(text: str):
+    match = _WINDOW.match(text.lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Window like 15m, 1h or 4h, not {text}")
+    seconds = int(match.group(1)) * _UNITS[match.group(2)]
+    if seconds > flow.horizon:
+        raise ValueError(f"Anya only remembers {flow.horizon // 3_600}h of flow")
+    return seconds
+
+
+@restrict_access(need_trading=False)
+async def flow_command(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        await update.message.reply_text("Usage: /flow <symbol> [window]\nExample: /flow BTC-PERP 15m")
+        return
+    window = context.args[1] if len(context.args) > 1 else DEFAULT_WINDOW
+    try:
+        seconds = parse_window(window)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {str(e)}")
+        return
+    symbol = await anya_registry.resolve_or_reply(update, context.args[0])
+    if not symbol:
+        return
+
+    first_ask = symbol not in since
+    requested[symbol] = time.time()
+    if first_ask:
+        try:
+            await collect(symbol)
+        except Exception as e:
+            await update.message.reply_text(f"⚠️ Anya couldn’t fetch trades for {symbol}: {str(e)}")
+            return
+
+    stats = flow.window(symbol, seconds, time.time())
+    if not stats or not stats["trades"]:
+        await update.message.reply_text(
+            f"🦗 No {symbol} trades in the last {window}. Anya keeps listening, try again soon!")
+        return
+
+    mark = anya_poller.get_mark_price(symbol)
+    vs_mark = f" ({(stats['vwap'] / mark - 1) * 100:+.2f}% vs mark)" if mark else ""
+    lines = [
+        f"🌊 *Trade Flow*: {symbol} · last {window}",
+        "",
+        f"• Buys: `{stats['buy']:,.4g}` | Sells: `{stats['sell']:,.4g}` contracts",
+        f"• Delta: `{stats['delta']:+,.4g}` {'🟢' if stats['delta'] >= 0 else '🔴'} "
+        f"(buyers {stats['buy_share'] * 100:.0f}%)",
+        f"• VWAP: `${stats['vwap']:,.2f}`{vs_mark}",
+        f"• Trades: `{stats['trades']:,}` ({stats['per_minute']:.1f}/min)",
+    ]
+    covered = time.time() - since[symbol]
+    if covered < seconds:
+        lines.append(f"\n_Anya started listening {covered / 60:.0f}m ago, older trades may be missing_")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+
+def main(app):
+    app.add_handler(CommandHandler("flow", flow_command))
+    app.job_queue.run_repeating(collect_flow, interval=FLOW_INTERVAL, first=FLOW_INTERVAL, name="trade_flow")
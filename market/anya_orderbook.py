@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import time
+
+from end_points_handlers.cvex_handler import get_order_book_data
+from market.book_model import BookModel
+
+logger = logging.getLogger(__name__)
+
+"""
+Order-book models for previews.
+Snapshots are fetched and turned into a BookModel in a worker thread and
+kept for a few seconds, so the /place_order preview and the wizard's
+confirmation screen can show expected fill and slippage for free.
+"""
+
+BOOK_TTL = 3            # seconds a snapshot is good for a preview
+IMPACT_DEPTH_PCT = 1.0  # band around mid for the imbalance figure
+PREVIEW_TIMEOUT = 1.0   # seconds a preview waits for the book before going without it
+
+_models = {}            # symbol -> (fetched_at, BookModel)
+
+
+def _build(symbol: str):
+    data = get_order_book_data(symbol)
+    if "error" in data:
+        raise RuntimeError(data["error"])
+    return BookModel.from_snapshot(data)
+
+
+async def get_model(symbol: str):
+    cached = _models.get(symbol)
+    if cached and time.time() - cached[0] < BOOK_TTL:
+        return cached[1]
+    model = await asyncio.to_thread(_build, symbol)
+    _models[symbol] = (time.time(), model)
+    return model
+
+
+async def fill_preview(symbol: str, side: str, quantity: float, limit: float = None):
+    """Expected fill of the marketable part of an order, None if the book can't be had in time"""
+    try:
+        # shielded: a slow fetch still lands in the cache for the next preview
+        model = await asyncio.wait_for(asyncio.shield(get_model(symbol)), PREVIEW_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Order book for {symbol} took over {PREVIEW_TIMEOUT:g}s, previewing without it")
+        return None
+    except Exception as e:
+        logger.warning(f"Order book for {symbol} unavailable: {e}")
+        return None
+    fill = model.market_fill(side, quantity, limit)
+    fill.update(mid=model.mid, spread_bps=model.spread_bps, imbalance=model.imbalance(IMPACT_DEPTH_PCT),
+                microprice=model.microprice, quantity=quantity, limited=limit is not None)
+    return fill
+
+
+def format_fill(fill: dict):
+    """Markdown lines for an order summary, [] when there's nothing useful to say"""
+    if not fill:
+        return []
+    if not fill["filled"]:
+        if fill["limited"]:
+            return ["📚 Book: rests, nothing crosses right now"]
+        return ["📚 Book: ⚠️ empty on that side, a market order would find nothing!"]
+
+    lines = [
+        f"📚 Book fill{' (crosses now)' if fill['limited'] else ''}: "
+        f"~${fill['average_price']:,.2f} over {fill['levels']} level{'s' if fill['levels'] > 1 else ''}, "
+        f"slippage {fill['slippage_bps']:.1f} bps vs mid"
+    ]
+    if fill["filled"] < fill["quantity"]:
+        lines.append(f"⚠️ Only {fill['filled']:g} of {fill['quantity']:g} contracts "
+                     + ("cross now, the rest rests" if fill["limited"] else "on the book!"))
+    spread = f"spread {fill['spread_bps']:.1f} bps, " if fill["spread_bps"] is not None else ""
+    lines.append(f"⚖️ {spread}imbalance {fill['imbalance']:+.2f}, micro ${fill['microprice']:,.2f}")
+    return lines
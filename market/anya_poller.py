@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from end_points_handlers.cvex_handler import (
+    get_contracts_data, get_indices_data, get_contract_data, format_price
+)
+from market import anya_registry
+from security.anya_security import restrict_access
+
+logger = logging.getLogger(__name__)
+
+"""
+One poll for everybody.
+Anya spies the market once per interval and whispers to whoever asked.
+"""
+
+POLL_INTERVAL = 10  # seconds
+
+# Shared in-memory snapshots (symbol -> latest CVEX row)
+contracts = {}
+indices = {}
+details = {}
+last_poll = 0.0
+
+# chat_id -> set of watched contract symbols
+subscriptions = {}
+
+# async callbacks(context, changed, received) run after every poll
+_first_listeners = []   # run as soon as the contracts snapshot lands
+_listeners = []         # run once indices and details are in too
+
+
+def add_listener(callback, first: bool = False):
+    """
+    Register an async callback(context, changed_contracts, received) fired after each poll.
+    `received` is the time.perf_counter() at which the contracts response arrived.
+    first=True listeners (order triggers) run before the index/detail fetches and the fan-out.
+    """
+    if callback in _first_listeners or callback in _listeners:
+        return
+    (_first_listeners if first else _listeners).append(callback)
+
+
+def watched_contracts():
+    watched = set()
+    for symbols in subscriptions.values():
+        watched |= symbols
+    return watched
+
+
+def get_mark_price(symbol: str):
+    contract = contracts.get(symbol)
+    if not contract or contract.get('mark_price') is None:
+        return None
+    try:
+        return float(contract['mark_price'])
+    except (TypeError, ValueError):
+        return None
+
+
+def snapshot_age():
+    return time.time() - last_poll if last_poll else None
+
+
+async def poll_market(context: CallbackContext):
+    """Job queue callback: one upstream round for the union of watched contracts"""
+    global last_poll
+
+    data = await asyncio.to_thread(get_contracts_data)
+    received = time.perf_counter()
+    if "error" in data:
+        logger.error(f"Market poll failed: {data['error']}")
+        return
+
+    changed = {}
+    for contract in data.get("contracts", []):
+        symbol = contract.get('symbol')
+        if not symbol:
+            continue
+        previous = contracts.get(symbol)
+        if previous is None or previous.get('mark_price') != contract.get('mark_price'):
+            changed[symbol] = contract
+        contracts[symbol] = contract
+
+    await _notify(_first_listeners, context, changed, received)
+
+    index_data = await asyncio.to_thread(get_indices_data)
+    if "error" in index_data:
+        logger.warning(f"Index poll failed: {index_data['error']}")
+    else:
+        for item in index_data.get("indices", []):
+            if item.get('symbol'):
+                indices[item['symbol']] = item
+
+    for symbol in watched_contracts():
+        contract_data = await asyncio.to_thread(get_contract_data, symbol)
+        if "error" not in contract_data:
+            details[symbol] = contract_data.get("details", {})
+
+    last_poll = time.time()
+
+    await _fan_out(context, changed)
+    await _notify(_listeners, context, changed, received)
+
+
+async def _notify(listeners: list, context: CallbackContext, changed: dict, received: float):
+    for listener in list(listeners):
+        try:
+            await listener(context, changed, received)
+        except Exception as e:
+            logger.error(f"Market listener failed: {e}", exc_info=True)
+
+
+async def _fan_out(context: CallbackContext, changed: dict):
+    for chat_id, symbols in list(subscriptions.items()):
+        updates = [symbol for symbol in symbols if symbol in changed]
+        if not updates:
+            continue
+
+        lines = ["👀 *Anya spotted moves!*", ""]
+        for symbol in sorted(updates):
+            contract = changed[symbol]
+            extra = details.get(symbol, {})
+            lines.append(
+                f"• *{symbol}*: ${format_price(contract.get('mark_price', 'N/A'))}"
+                f" (last ${format_price(extra.get('last_price', 'N/A'))})"
+            )
+        try:
+            await context.bot.send_message(chat_id=chat_id, text="\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+        except Exception as e:
+            logger.error(f"Fan-out to {chat_id} failed: {e}")
+
+
+@restrict_access(need_trading=False)
+async def watch(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        await update.message.reply_text("Usage: /watch <symbol>\nExample: /watch BTC-PERP")
+        return
+
+    symbol = await anya_registry.resolve_or_reply(update, context.args[0])
+    if not symbol:
+        return
+
+    subscriptions.setdefault(update.effective_chat.id, set()).add(symbol)
+    await update.message.reply_text(f"👀 Anya’s watching *{symbol}* for you! Waku waku!", parse_mode=ParseMode.MARKDOWN)
+
+
+@restrict_access(need_trading=False)
+async def unwatch(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        await update.message.reply_text("Usage: /unwatch <symbol>")
+        return
+
+    symbol = anya_registry.resolve(context.args[0])[0] or context.args[0].upper()
+    symbols = subscriptions.get(update.effective_chat.id, set())
+    if symbol not in symbols:
+        await update.message.reply_text(f"🤔 Anya wasn’t watching {symbol}, silly!")
+        return
+
+    symbols.discard(symbol)
+    if not symbols:
+        subscriptions.pop(update.effective_chat.id, None)
+    await update.message.reply_text(f"🙈 Anya stopped watching {symbol}.")
+
+
+@restrict_access(need_trading=False)
+async def watching(update: Update, context: CallbackContext, user_id: str):
+    symbols = subscriptions.get(update.effective_chat.id)
+    if not symbols:
+        await update.message.reply_text("📭 Anya isn’t watching anything for you. Try /watch <symbol>")
+        return
+
+    lines = ["👀 *Anya’s Watchlist*", ""]
+    for symbol in sorted(symbols):
+        lines.append(f"• *{symbol}*: ${format_price(get_mark_price(symbol) or 'N/A')}")
+    age = snapshot_age()
+    if age is not None:
+        lines.append(f"\n_Updated {age:.0f}s ago_")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+
+def schedule_poller(app):
+    app.job_queue.run_repeating(
+        poll_market, interval=POLL_INTERVAL, first=1, name="market_poller")
+
+
+POLLER_HANDLERS = [
+    CommandHandler("watch", watch),
+    CommandHandler("unwatch", unwatch),
+    CommandHandler("watching", watching),
+]
@@ -0,0 +1,125 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from telegram import Update
+from telegram.ext import CallbackContext, TypeHandler
+
+from end_points_handlers.cvex_handler import BASE_URL, session
+from market import segment_store
+
+logger = logging.getLogger(__name__)
+
+"""
+Market-data recorder.
+A requests response hook copies every /market response (receive time,
+status, "METHOD url" key, raw body) into an in-memory deque - that's all
+the request path pays. A job drains the deque from a worker thread into
+zlib blocks appended to rotating segment files (format in segment_store).
+With ANYA_RECORD_ALL=1 private CVEX calls, OpenAI responses and incoming
+Telegram updates are captured too - what anya_replay.py feeds on. Those
+files hold account data, keep it to debugging sessions.
+"""
+
+RECORD_DIR = os.getenv("ANYA_RECORD_DIR", "db/recordings")
+RECORD_ENABLED = os.getenv("ANYA_RECORD", "1") != "0"
+RECORD_ALL = os.getenv("ANYA_RECORD_ALL", "0") == "1"
+FLUSH_INTERVAL = 2                  # seconds between buffer drains
+MAX_BUFFERED = 50_000               # records kept when the writer lags, oldest dropped first
+SEGMENT_BYTES = 32 * 1024 * 1024    # rotate after this many compressed bytes...
+SEGMENT_SECONDS = 60 * 60           # ...or this much wall time
+MAX_SEGMENTS = 48                   # oldest segments are deleted beyond this
+
+MARKET_PREFIX = f"{BASE_URL}/market/"
+UPDATE_KEY = "UPDATE telegram"
+
+RECORDER_STATS = {"records": 0, "blocks": 0, "dropped": 0, "raw_bytes": 0, "written_bytes": 0, "segments": 0}
+
+_buffer = deque()
+_write_lock = threading.Lock()
+_writer = segment_store.SegmentWriter(RECORD_DIR, SEGMENT_BYTES, SEGMENT_SECONDS, MAX_SEGMENTS)
+
+
+def record(key: str, status: int, body: bytes):
+    if len(_buffer) >= MAX_BUFFERED:
+        _buffer.popleft()
+        RECORDER_STATS["dropped"] += 1
+    _buffer.append((time.time(), status, key, body))
+
+
+def capture(response, *args, **kwargs):
+    """requests response hook: O(1), no parsing or compression on the caller's thread"""
+    method = response.request.method
+    if (method == "GET" and response.url.startswith(MARKET_PREFIX)) or (RECORD_ALL and response.url.startswith(BASE_URL)):
+        record(f"{method} {response.url}", response.status_code, response.content)
+    return response
+
+
+async def capture_httpx(response):
+    """httpx response event hook (OpenAI client), used with RECORD_ALL"""
+    await response.aread()
+    record(f"{response.request.method} {response.request.url}", response.status_code, response.content)
+
+
+async def record_update(update: Update, context: CallbackContext):
+    """Group -100 handler: every incoming update, as Telegram sent it"""
+    record(UPDATE_KEY, 0, json.dumps(update.to_dict()).encode())
+
+
+def flush():
+    """Drain the buffer into one compressed block (blocking, run it in a thread)"""
+    with _write_lock:
+        records = []
+        while _buffer:
+            records.append(_buffer.popleft())
+        if not records:
+            return 0
+
+        raw, written = _writer.write(records)
+        RECORDER_STATS["records"] += len(records)
+        RECORDER_STATS["blocks"] += 1
+        RECORDER_STATS["raw_bytes"] += raw
+        RECORDER_STATS["written_bytes"] += written
+        RECORDER_STATS["segments"] = _writer.opened_segments
+        return len(records)
+
+
+def close():
+    try:
+        flush()
+    finally:
+        with _write_lock:
+            _writer.close()
+
+
+def segments(directory: str = None):
+    return segment_store.segments(directory or RECORD_DIR)
+
+
+def iter_records(start: float = None, end: float = None, symbols=None, directory: str = None):
+    """Recorded responses in time order, see segment_store.iter_records"""
+    return segment_store.iter_records(directory or RECORD_DIR, start, end, symbols)
+
+
+async def flush_recordings(context: CallbackContext):
+    """Job queue callback: the file I/O and compression stay off the event loop"""
+    try:
+        await asyncio.to_thread(flush)
+    except Exception as e:
+        logger.error(f"Recorder flush failed: {e}")
+
+
+def main(app):
+    if not RECORD_ENABLED:
+        logger.info("Market recorder disabled (ANYA_RECORD=0)")
+        return
+    if capture not in session.hooks["response"]:
+        session.hooks["response"].append(capture)
+    if RECORD_ALL:
+        app.add_handler(TypeHandler(Update, record_update), group=-100)
+    app.job_queue.run_repeating(flush_recordings, interval=FLUSH_INTERVAL, first=FLUSH_INTERVAL, name="recorder")
+    atexit.register(close)
@@ -0,0 +1,193 @@
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from market import anya_poller
+from market.symbol_index import SymbolIndex
+
+logger = logging.getLogger(__name__)
+
+"""
+Contract registry.
+A compact symbol <-> id index rebuilt from the poller's /market/futures
+snapshot, so order commands can reject typos, expired contracts and
+off-grid quantities/prices without a signed round trip. The same rebuild
+refreshes the fuzzy indexes behind every <id_or_symbol> argument.
+"""
+
+ContractInfo = namedtuple(
+    "ContractInfo", "contract_id symbol settlement_time tick_size step_size active")
+
+# Field names differ between CVEX endpoints/versions, first match wins
+TICK_FIELDS = ("price_tick", "tick_size", "price_step")
+STEP_FIELDS = ("quantity_step", "step_size", "lot_size")
+INDEX_ID_FIELDS = ("index_id", "id")
+INACTIVE_STATUSES = {"expired", "settled", "delisted", "inactive", "closed"}
+
+_by_symbol = {}  # SYMBOL -> ContractInfo
+_by_id = {}      # contract_id -> ContractInfo
+_fuzzy = {"contract": SymbolIndex(), "index": SymbolIndex()}
+built_at = 0.0
+
+
+def _number(row: dict, fields):
+    for field in fields:
+        try:
+            value = float(row[field])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if value > 0:
+            return value
+    return None
+
+
+def _epoch(settlement_time):
+    """CVEX sends ms timestamps or ISO strings; perpetuals have none"""
+    if not settlement_time:
+        return None
+    try:
+        if isinstance(settlement_time, (int, float)):
+            return settlement_time / 1000
+        return datetime.fromisoformat(str(settlement_time).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _info(row: dict):
+    status = str(row.get('status', '')).lower()
+    return ContractInfo(
+        contract_id=str(row.get('contract_id', '')),
+        symbol=row['symbol'],
+        settlement_time=_epoch(row.get('settlement_time')),
+        tick_size=_number(row, TICK_FIELDS),
+        step_size=_number(row, STEP_FIELDS),
+        active=status not in INACTIVE_STATUSES and row.get('is_active', True) is not False
+    )
+
+
+def _index_ids(indices: dict):
+    """{index id: symbol} so /index and friends keep taking ids"""
+    aliases = {}
+    for symbol, row in indices.items():
+        index_id = next((row[field] for field in INDEX_ID_FIELDS if row.get(field) not in (None, "")), None)
+        if index_id is not None:
+            aliases[str(index_id)] = symbol
+    return aliases
+
+
+def rebuild(rows=None):
+    """Swap in fresh indexes built from contract rows (defaults to the poller snapshot)"""
+    global _by_symbol, _by_id, _fuzzy, built_at
+
+    by_symbol, by_id = {}, {}
+    for row in (rows if rows is not None else anya_poller.contracts.values()):
+        if not row.get('symbol'):
+            continue
+        info = _info(row)
+        by_symbol[info.symbol.upper()] = info
+        if info.contract_id:
+            by_id[info.contract_id] = info
+
+    fuzzy = {
+        "contract": SymbolIndex(
+            (info.symbol for info in by_symbol.values()),
+            aliases={contract_id: info.symbol for contract_id, info in by_id.items()}),
+        "index": SymbolIndex(anya_poller.indices, aliases=_index_ids(anya_poller.indices))
+    }
+
+    _by_symbol, _by_id, _fuzzy = by_symbol, by_id, fuzzy
+    built_at = time.time()
+
+
+def is_loaded():
+    return bool(_by_symbol)
+
+
+def symbols():
+    return [info.symbol for info in _by_symbol.values()]
+
+
+def lookup(id_or_symbol: str):
+    """O(1) lookup by symbol (any case) or contract id"""
+    if not id_or_symbol:
+        return None
+    return _by_symbol.get(id_or_symbol.upper()) or _by_id.get(id_or_symbol)
+
+
+def resolve(text: str, kind: str = "contract"):
+    """
+    Local fuzzy resolution of user input ("btc-perp", "BTC24MAR", ids, small typos).
+    :return: (symbol or None, [suggestions]); with an empty index the text passes through upper-cased.
+    """
+    index = _fuzzy[kind]
+    if not len(index):
+        return text.strip().upper(), []
+    return index.resolve(text)
+
+
+async def resolve_or_reply(update: Update, text: str, kind: str = "contract"):
+    """Resolve a command argument, or tell the user what Anya thinks they meant"""
+    symbol, suggestions = resolve(text, kind)
+    if symbol is None:
+        hint = f"\nDid you mean: {', '.join(suggestions)}?" if suggestions else ""
+        listing = "/contracts" if kind == "contract" else "/market"
+        await update.message.reply_text(f"❌ Anya can’t find {kind} '{text}'!{hint}\nCheck {listing}, b-baka!")
+    return symbol
+
+
+def is_tradable(info: ContractInfo, now: float = None):
+    if not info.active:
+        return False
+    return info.settlement_time is None or info.settlement_time > (now or time.time())
+
+
+def _on_grid(value: float, step: float):
+    steps = value / step
+    return abs(steps - round(steps)) <= 1e-9 * max(1.0, abs(steps))
+
+
+def validate_order(contract: str, quantity: float = None, price: float = None):
+    """
+    Check an order locally before it costs a signed request.
+    :return: (ContractInfo or None, error message or None).
+             With an empty registry nothing is rejected - CVEX stays the judge.
+    """
+    if not is_loaded():
+        return None, None
+
+    # Orders only take exact or normalized matches, typos are suggested, never guessed
+    info = lookup(contract) or lookup(_fuzzy["contract"].exact(contract))
+    if info is None:
+        guess, suggestions = resolve(contract)
+        suggestions = [guess] if guess else suggestions
+        hint = f" Did you mean: {', '.join(suggestions)}?" if suggestions else ""
+        return None, f"Unknown contract {contract}!{hint} Check /contracts"
+    if not is_tradable(info):
+        return info, f"{info.symbol} is expired or not trading"
+    if quantity is not None:
+        if quantity <= 0:
+            return info, "Quantity must be positive!"
+        if info.step_size and not _on_grid(quantity, info.step_size):
+            return info, f"Quantity must be a multiple of {info.step_size:g} for {info.symbol}"
+    if price is not None:
+        if price <= 0:
+            return info, "Price must be positive!"
+        if info.tick_size and not _on_grid(price, info.tick_size):
+            return info, f"Price must be a multiple of {info.tick_size:g} for {info.symbol}"
+    return info, None
+
+
+async def on_market_poll(context: CallbackContext, changed: dict, received: float):
+    """Poller listener: only new or removed symbols change the index shape, marks don't matter here"""
+    if len(anya_poller.contracts) != len(_by_symbol) or len(anya_poller.indices) != len(_fuzzy["index"]) or any(
+            symbol.upper() not in _by_symbol for symbol in changed):
+        rebuild()
+        logger.info(f"Contract registry rebuilt: {len(_by_symbol)} contracts")
+
+
+def main(app):
+    anya_poller.add_listener(on_market_poll)
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from end_points_handlers.cvex_handler import (
+    get_contracts_data, get_indices_data, load_private_key,
+    export_market_cache, import_market_cache
+)
+from market import anya_poller, anya_registry
+from security.anya_security import get_user_keys, active_users
+
+logger = logging.getLogger(__name__)
+
+"""
+Warm restarts.
+Before Anya takes updates she reloads the last market snapshot (if fresh),
+then refreshes contracts/indices and unlocks hot users' keys concurrently.
+"""
+
+SNAPSHOT_PATH = "db/market_snapshot.json"
+MAX_SNAPSHOT_AGE = 10 * 60  # seconds
+MAX_HOT_USERS = 200
+
+# extra user ids to warm, e.g. owners of armed triggers (filled by other modules)
+hot_users = set()
+
+
+def load_snapshot():
+    if not os.path.exists(SNAPSHOT_PATH):
+        return None
+    try:
+        with open(SNAPSHOT_PATH, "r") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot: {e}")
+        return None
+
+    age = time.time() - snapshot.get("saved_at", 0)
+    if age > MAX_SNAPSHOT_AGE:
+        logger.info(f"Snapshot is {age:.0f}s old, starting cold")
+        return {"users": snapshot.get("users", [])}
+
+    anya_poller.contracts.update(snapshot.get("contracts", {}))
+    anya_poller.indices.update(snapshot.get("indices", {}))
+    anya_poller.details.update(snapshot.get("details", {}))
+    anya_poller.last_poll = snapshot.get("saved_at", 0)
+    import_market_cache(snapshot.get("http_cache", []))
+    logger.info(f"Loaded {age:.0f}s old market snapshot ({len(anya_poller.contracts)} contracts)")
+    return snapshot
+
+
+def save_snapshot():
+    snapshot = {
+        "saved_at": time.time(),
+        "contracts": anya_poller.contracts,
+        "indices": anya_poller.indices,
+        "details": anya_poller.details,
+        "http_cache": export_market_cache(),
+        # ids only, keys are decrypted again at boot
+        "users": active_users()[:MAX_HOT_USERS]
+    }
+    temp_path = f"{SNAPSHOT_PATH}.tmp"
+    with open(temp_path, "w") as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    os.replace(temp_path, SNAPSHOT_PATH)
+    logger.info(f"Saved market snapshot ({len(anya_poller.contracts)} contracts)")
+
+
+def _warm_user(user_id: str):
+    trading, _ = get_user_keys(user_id)
+    if trading:
+        load_private_key(trading, user_id)
+
+
+async def warm_caches():
+    started = time.perf_counter()
+    snapshot = load_snapshot() or {}
+    users = list(dict.fromkeys(list(hot_users) + snapshot.get("users", [])))[:MAX_HOT_USERS]
+
+    contracts, indices, *warmed = await asyncio.gather(
+        asyncio.to_thread(get_contracts_data),
+        asyncio.to_thread(get_indices_data),
+        *(asyncio.to_thread(_warm_user, user_id) for user_id in users),
+        return_exceptions=True
+    )
+
+    if isinstance(contracts, dict) and "error" not in contracts:
+        for contract in contracts.get("contracts", []):
+            if contract.get('symbol'):
+                anya_poller.contracts[contract['symbol']] = contract
+        anya_poller.last_poll = time.time()
+    else:
+        logger.warning(f"Contract warm-up failed: {contracts}")
+
+    if isinstance(indices, dict) and "error" not in indices:
+        for item in indices.get("indices", []):
+            if item.get('symbol'):
+                anya_poller.indices[item['symbol']] = item
+
+    anya_registry.rebuild()
+
+    failed = sum(1 for result in warmed if isinstance(result, Exception))
+    logger.info(
+        f"Warm-up done in {(time.perf_counter() - started) * 1000:.0f}ms: "
+        f"{len(anya_poller.contracts)} contracts, {len(users) - failed}/{len(users)} users")
+
+
+async def post_init(app):
+    await warm_caches()
+
+
+async def post_shutdown(app):
+    try:
+        save_snapshot()
+    except Exception as e:
+        logger.error(f"Snapshot save failed: {e}")
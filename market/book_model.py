@@ -0,0 +1,138 @@
+import numpy as np
+
+"""
+Order-book analytics over one snapshot.
+
+Each side is kept as sorted price-level arrays (bids high to low, asks
+low to high) with running sums of size and notional, so depth, imbalance
+and the average fill of a market order are a searchsorted away:
+O(log n) per question instead of walking the levels.
+from_snapshot parses the raw CVEX order-book JSON; fetching and caching
+it is anya_orderbook's side.
+"""
+
+BUY = "buy"
+SELL = "sell"
+
+
+class BookModel:
+
+    def __init__(self, bids, asks):
+        """:param bids, asks: iterables of (price, size), any order"""
+        self.bid_prices, self.bid_sizes = self._side(bids, descending=True)
+        self.ask_prices, self.ask_sizes = self._side(asks, descending=False)
+        self._bid_cum = np.cumsum(self.bid_sizes)
+        self._ask_cum = np.cumsum(self.ask_sizes)
+        self._bid_notional = np.cumsum(self.bid_prices * self.bid_sizes)
+        self._ask_notional = np.cumsum(self.ask_prices * self.ask_sizes)
+
+    @staticmethod
+    def _side(levels, descending: bool):
+        array = np.array([(float(price), float(size)) for price, size in levels], dtype=float).reshape(-1, 2)
+        array = array[array[:, 1] > 0]
+        order = np.argsort(-array[:, 0] if descending else array[:, 0], kind="stable")
+        return array[order, 0], array[order, 1]
+
+    @classmethod
+    def from_snapshot(cls, data: dict):
+        """CVEX order-book payload: {"bids": [{"price", "quantity_contracts"}], "asks": [...]}"""
+        def levels(key):
+            return [(level.get('price', 0), level.get('quantity_contracts', 0)) for level in data.get(key) or []]
+        return cls(levels("bids"), levels("asks"))
+
+    @property
+    def best_bid(self):
+        return float(self.bid_prices[0]) if len(self.bid_prices) else None
+
+    @property
+    def best_ask(self):
+        return float(self.ask_prices[0]) if len(self.ask_prices) else None
+
+    @property
+    def mid(self):
+        if self.best_bid is None or self.best_ask is None:
+            return self.best_bid or self.best_ask
+        return (self.best_bid + self.best_ask) / 2
+
+    @property
+    def spread_bps(self):
+        if self.best_bid is None or self.best_ask is None:
+            return None
+        return (self.best_ask - self.best_bid) / self.mid * 10_000
+
+    @property
+    def microprice(self):
+        """Top-of-book mid weighted toward the thinner side (where the price is likely to go)"""
+        if self.best_bid is None or self.best_ask is None:
+            return self.mid
+        bid_size, ask_size = self.bid_sizes[0], self.ask_sizes[0]
+        return float((self.best_ask * bid_size + self.best_bid * ask_size) / (bid_size + ask_size))
+
+    def depth(self, pct: float):
+        """(bid contracts, ask contracts) resting within pct% of mid"""
+        mid = self.mid
+        if mid is None:
+            return 0.0, 0.0
+        bids = np.searchsorted(-self.bid_prices, -mid * (1 - pct / 100), side="right")
+        asks = np.searchsorted(self.ask_prices, mid * (1 + pct / 100), side="right")
+        return (float(self._bid_cum[bids - 1]) if bids else 0.0,
+                float(self._ask_cum[asks - 1]) if asks else 0.0)
+
+    def imbalance(self, pct: float = 1.0):
+        """(bids - asks) / (bids + asks) within pct% of mid: +1 all bids, -1 all asks"""
+        bids, asks = self.depth(pct)
+        return (bids - asks) / (bids + asks) if bids + asks else 0.0
+
+    def market_fill(self, side: str, quantity: float, limit: float = None):
+        """
+        Walk the opposite side for `quantity` contracts (only through `limit`, if given).
+        :return: {"filled", "average_price", "worst_price", "levels", "slippage_bps"} - slippage vs mid,
+                 positive = worse than mid; average_price None when nothing fills
+        """
+        if side == BUY:
+            prices, sizes, cum, notional = self.ask_prices, self.ask_sizes, self._ask_cum, self._ask_notional
+            reachable = len(prices) if limit is None else int(np.searchsorted(prices, limit, side="right"))
+        else:
+            prices, sizes, cum, notional = self.bid_prices, self.bid_sizes, self._bid_cum, self._bid_notional
+            reachable = len(prices) if limit is None else int(np.searchsorted(-prices, -limit, side="right"))
+        if not reachable or quantity <= 0:
+            return {"filled": 0.0, "average_price": None, "worst_price": None, "levels": 0, "slippage_bps": None}
+
+        # first level whose running size covers the order, partial fill of that level
+        last = min(int(np.searchsorted(cum[:reachable], quantity, side="left")), reachable - 1)
+        before = cum[last - 1] if last else 0.0
+        take = min(quantity - before, sizes[last])
+        filled = float(before + take)
+        cost = float((notional[last - 1] if last else 0.0) + take * prices[last])
+        average = cost / filled
+        mid = self.mid
+        slippage = (average - mid) / mid * 10_000 * (1 if side == BUY else -1) if mid else None
+        return {"filled": filled, "average_price": average, "worst_price": float(prices[last]),
+                "levels": last + 1, "slippage_bps": slippage}
+
+
+if __name__ == "__main__":
+    # Benchmark: python -m market.book_model
+    import time
+
+    rng = np.random.default_rng(11)
+    levels = 2_000
+    bids = list(zip(50_000 - np.cumsum(rng.uniform(0.5, 2, levels)), rng.uniform(0.1, 5, levels)))
+    asks = list(zip(50_001 + np.cumsum(rng.uniform(0.5, 2, levels)), rng.uniform(0.1, 5, levels)))
+
+    start = time.perf_counter()
+    for _ in range(100):
+        book = BookModel(bids, asks)
+    built = (time.perf_counter() - start) / 100
+
+    sizes = rng.uniform(0.1, 3_000, 100_000)
+    start = time.perf_counter()
+    for size in sizes:
+        book.market_fill(BUY, size)
+    elapsed = time.perf_counter() - start
+
+    fill = book.market_fill(BUY, 500)
+    print(f"Built a {levels}x2-level book in {built * 1000:.2f}ms")
+    print(f"{len(sizes):,} fill previews in {elapsed * 1000:.0f}ms ({elapsed / len(sizes) * 1e6:.2f}us each)")
+    print(f"buy 500: avg {fill['average_price']:,.2f} over {fill['levels']} levels, "
+          f"{fill['slippage_bps']:.1f} bps | imbalance 1% {book.imbalance():+.2f} | micro {book.microprice:,.2f}")
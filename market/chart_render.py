@@ -0,0 +1,54 @@
+import io
+from datetime import datetime, timezone
+
+"""
+Candlestick rendering for /chart.
+Takes plain times/OHLC arrays and returns PNG bytes. It is the only thing
+the spawned render workers import, so they start without the bot, its
+keys or its database.
+"""
+
+
+def render_candles(symbol: str, period: str, times, ohlc):
+    """PNG bytes of a candlestick chart; module-level so the process pool can pickle it"""
+    import numpy as np
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+
+    x = np.arange(len(ohlc))
+    opens, highs, lows, closes = ohlc[:, 0], ohlc[:, 1], ohlc[:, 2], ohlc[:, 3]
+    colors = np.where(closes >= opens, "#26a69a", "#ef5350")
+
+    fig = Figure(figsize=(9, 5))
+    ax = fig.subplots()
+    ax.vlines(x, lows, highs, colors=colors, linewidth=0.8)
+    ax.bar(x, np.maximum(np.abs(closes - opens), (highs - lows).max() * 1e-3),
+           bottom=np.minimum(opens, closes), width=0.7, color=colors)
+    ticks = x[::max(len(x) // 6, 1)]
+    ax.set_xticks(ticks)
+    ax.set_xticklabels([datetime.fromtimestamp(times[i] / 1000, tz=timezone.utc).strftime("%m-%d %H:%M")
+                        for i in ticks], fontsize=8)
+    ax.set_xlim(-1, len(x))
+    ax.yaxis.tick_right()
+    ax.grid(alpha=0.2)
+    ax.set_title(f"{symbol} · {period} · last {closes[-1]:,.2f}")
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=110, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    import time
+    import numpy as np
+
+    rng = np.random.default_rng(5)
+    close = 50_000 * np.cumprod(1 + rng.normal(0, 0.004, 120))
+    opens = np.insert(close[:-1], 0, close[0])
+    spread = np.abs(rng.normal(0, 0.002, len(close))) * close
+    ohlc = np.column_stack([opens, np.maximum(opens, close) + spread, np.minimum(opens, close) - spread, close])
+    times = 1_700_000_000_000 + np.arange(len(close)) * 3_600_000.0
+
+    started = time.perf_counter()
+    png = render_candles("BTC-PERP", "1h", times, ohlc)
+    print(f"{len(close)} candles -> {len(png) / 1024:.0f} KB PNG in {(time.perf_counter() - started) * 1000:.0f}ms")
@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import re
+import struct
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+"""
+Segment files behind the market-data recorder.
+A batch of (receive time, status, "METHOD url" key, raw body) records is
+packed into one zlib block appended to the open segment; each segment has
+a JSON-lines .idx sidecar with one line per block (offset, time span,
+symbols) so readers seek straight to the blocks they need. Plain files
+and bytes in, plain tuples out: anya_recorder owns the buffer and the hooks.
+"""
+
+COMPRESSION_LEVEL = 6
+
+_RECORD_HEADER = struct.Struct(">dHHI")     # receive time, status, key length, body length
+_BLOCK_HEADER = struct.Struct(">I")         # compressed block length
+_SYMBOL = re.compile(r"/market/(?:futures|indices)/(?:by-(?:id|symbol)/)?([^/?]+)")
+
+
+def symbol_of(url: str):
+    match = _SYMBOL.search(url)
+    return match.group(1).upper() if match else None
+
+
+def segments(directory: str):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+class SegmentWriter:
+    """Appends blocks to rotating segment files, not thread-safe on its own"""
+
+    def __init__(self, directory: str, segment_bytes: int, segment_seconds: float, max_segments: int):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.opened_segments = 0
+        self._segment = None     # {"path", "file", "index", "opened", "size"}
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.seg")
+        self._segment = {
+            "path": path, "file": open(path, "ab"), "index": open(f"{path[:-4]}.idx", "a"),
+            "opened": time.time(), "size": os.path.getsize(path)
+        }
+        self.opened_segments += 1
+        self._prune()
+
+    def _prune(self):
+        for path in segments(self.directory)[:-self.max_segments]:
+            for stale in (path, f"{path[:-4]}.idx"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    def close(self):
+        if self._segment:
+            self._segment["file"].close()
+            self._segment["index"].close()
+            self._segment = None
+
+    def write(self, records: list):
+        """
+        Append the records as one compressed block.
+        :return: (raw bytes, bytes written to disk)
+        """
+        if self._segment and (self._segment["size"] >= self.segment_bytes
+                              or time.time() - self._segment["opened"] >= self.segment_seconds):
+            self.close()
+        if self._segment is None:
+            self._open()
+
+        chunks, symbols = [], set()
+        for received, status, key, body in records:
+            encoded = key.encode()
+            chunks.append(_RECORD_HEADER.pack(received, status, len(encoded), len(body)))
+            chunks.append(encoded)
+            chunks.append(body)
+            symbol = symbol_of(key)
+            if symbol:
+                symbols.add(symbol)
+        raw = b"".join(chunks)
+        block = zlib.compress(raw, COMPRESSION_LEVEL)
+
+        offset = self._segment["size"]
+        self._segment["file"].write(_BLOCK_HEADER.pack(len(block)) + block)
+        self._segment["file"].flush()
+        # index line last: a reader never sees an entry whose block isn't on disk yet
+        self._segment["index"].write(json.dumps({
+            "offset": offset, "length": len(block), "t0": records[0][0], "t1": records[-1][0],
+            "records": len(records), "symbols": sorted(symbols)
+        }) + "\n")
+        self._segment["index"].flush()
+        self._segment["size"] += _BLOCK_HEADER.size + len(block)
+        return len(raw), _BLOCK_HEADER.size + len(block)
+
+
+def _decode_block(data: bytes):
+    raw = zlib.decompress(data)
+    position = 0
+    while position < len(raw):
+        received, status, key_length, body_length = _RECORD_HEADER.unpack_from(raw, position)
+        position += _RECORD_HEADER.size
+        key = raw[position:position + key_length].decode()
+        position += key_length
+        body = raw[position:position + body_length]
+        position += body_length
+        yield received, status, key, body
+
+
+def iter_records(directory: str, start: float = None, end: float = None, symbols=None):
+    """
+    Recorded responses in time order: (received, status, "METHOD url" key, symbol, body bytes).
+    Only blocks whose index entry overlaps [start, end] and mentions a wanted
+    symbol are read and decompressed.
+    """
+    wanted = {symbol.upper() for symbol in symbols} if symbols else None
+    for path in segments(directory):
+        try:
+            with open(f"{path[:-4]}.idx") as index_file:
+                entries = [json.loads(line) for line in index_file if line.strip()]
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.warning(f"Skipping {path}: unreadable index ({e})")
+            continue
+        if not entries or (start is not None and entries[-1]["t1"] < start) or (end is not None and entries[0]["t0"] > end):
+            continue
+
+        with open(path, "rb") as segment_file:
+            for entry in entries:
+                if (start is not None and entry["t1"] < start) or (end is not None and entry["t0"] > end):
+                    continue
+                # blocks without a symbol (e.g. /market/indices) are kept, they cover everything
+                if wanted and entry["symbols"] and not wanted.intersection(entry["symbols"]):
+                    continue
+                segment_file.seek(entry["offset"] + _BLOCK_HEADER.size)
+                for received, status, key, body in _decode_block(segment_file.read(entry["length"])):
+                    if (start is not None and received < start) or (end is not None and received > end):
+                        continue
+                    symbol = symbol_of(key)
+                    if wanted and symbol and symbol not in wanted:
+                        continue
+                    yield received, status, key, symbol, body
+
+
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+    body = json.dumps({"bids": [{"price": f"{50_000 - i}", "quantity_contracts": "1.5"} for i in range(50)]}).encode()
+    now = time.time()
+    records = [
+        (now + i * 1e-3, 200,
+         f"GET https://api.cvex.trade/v1/market/futures/{random.choice(['BTC-PERP', 'ETH-PERP'])}/order-book", body)
+        for i in range(20_000)
+    ]
+
+    writer = SegmentWriter(directory, 32 * 1024 * 1024, 60 * 60, 48)
+    started = time.perf_counter()
+    raw, written = 0, 0
+    for i in range(0, len(records), 2_000):
+        block_raw, block_written = writer.write(records[i:i + 2_000])
+        raw += block_raw
+        written += block_written
+    writer.close()
+    print(f"write: {(time.perf_counter() - started) * 1000:.0f}ms for {len(records):,} records "
+          f"({raw / written:.0f}x compression)")
+    started = time.perf_counter()
+    found = sum(1 for _ in iter_records(directory, symbols=["BTC-PERP"]))
+    print(f"read back {found:,} BTC-PERP records in {(time.perf_counter() - started) * 1000:.0f}ms")
@@ -0,0 +1,176 @@
+import re
+
+"""
+Fuzzy symbol index.
+
+Symbols are compared on a normalized key (upper case, letters and digits
+only) so "btc-perp", "BTC_PERP" and "BTCPERP" are the same thing.
+Typos are resolved with a BK-tree over those keys: the triangle
+inequality lets a lookup skip most of the tree, so a few hundred
+contracts answer in microseconds.
+"""
+
+_NOT_ALNUM = re.compile(r"[^A-Z0-9]")
+MAX_CACHED = 4096  # memoized resolve() results per index
+
+
+def normalize(text: str):
+    return _NOT_ALNUM.sub("", str(text).upper())
+
+
+def _pattern(text: str):
+    """Per-character bitmasks of text, computed once per lookup"""
+    masks = {}
+    for position, char in enumerate(text):
+        masks[char] = masks.get(char, 0) | (1 << position)
+    return masks, len(text)
+
+
+def _distance(pattern, other: str):
+    """Bit-parallel Levenshtein (Myers/Hyyro): one pass of integer ops per character of other"""
+    masks, length = pattern
+    if not length:
+        return len(other)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    plus, minus, score = full, 0, length
+    for char in other:
+        eq = masks.get(char, 0)
+        xv = eq | minus
+        xh = (((eq & plus) + plus) ^ plus) | eq
+        horizontal_plus = minus | ~(xh | plus)
+        horizontal_minus = plus & xh
+        if horizontal_plus & last:
+            score += 1
+        elif horizontal_minus & last:
+            score -= 1
+        horizontal_plus = (horizontal_plus << 1) | 1
+        horizontal_minus <<= 1
+        plus = (horizontal_minus | ~(xv | horizontal_plus)) & full
+        minus = horizontal_plus & xv
+    return score
+
+
+def edit_distance(a: str, b: str):
+    return _distance(_pattern(a), b)
+
+
+class SymbolIndex:
+
+    def __init__(self, symbols=(), aliases=None):
+        """
+        :param symbols: canonical symbols
+        :param aliases: optional {alias: symbol}, e.g. contract ids
+        """
+        self._keys = {}      # normalized key -> symbol
+        self._aliases = {}   # exact alias -> symbol
+        self._root = None    # [key, {distance: child}]
+        self._resolved = {}  # query -> resolve() result, the index only grows between rebuilds
+        for symbol in symbols:
+            self.add(symbol)
+        for alias, symbol in (aliases or {}).items():
+            self._aliases[str(alias)] = symbol
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, symbol: str):
+        key = normalize(symbol)
+        if not key or key in self._keys:
+            return
+        self._keys[key] = symbol
+        self._resolved.clear()
+
+        if self._root is None:
+            self._root = [key, {}]
+            return
+        pattern = _pattern(key)
+        node = self._root
+        while True:
+            distance = _distance(pattern, node[0])
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [key, {}]
+                return
+            node = child
+
+    def within(self, text: str, max_distance: int):
+        """All (distance, symbol) pairs within max_distance, closest first"""
+        key = normalize(text)
+        if self._root is None or not key:
+            return []
+        pattern = _pattern(key)
+        found = []
+        stack = [self._root]
+        while stack:
+            node_key, children = stack.pop()
+            distance = _distance(pattern, node_key)
+            if distance <= max_distance:
+                found.append((distance, self._keys[node_key]))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(found)
+
+    def exact(self, text: str):
+        """Exact alias (e.g. contract id) or normalized symbol match"""
+        text = str(text).strip()
+        return self._aliases.get(text) or self._keys.get(normalize(text))
+
+    def resolve(self, text: str, max_distance: int = 1, suggestions: int = 3):
+        """
+        :return: (symbol or None, [suggested symbols])
+        Resolves exact/normalized matches, a unique prefix ("BTC24MAR" -> "BTC-24MAR24")
+        or a unique closest key within max_distance; otherwise only suggests.
+        """
+        symbol = self.exact(text)
+        if symbol:
+            return symbol, []
+
+        key = normalize(text)
+        if not key:
+            return None, []
+        cached = self._resolved.get((key, max_distance, suggestions))
+        if cached is not None:
+            return cached
+
+        prefixed = [symbol for candidate, symbol in self._keys.items() if candidate.startswith(key)]
+        if len(prefixed) == 1:
+            result = prefixed[0], []
+        else:
+            # one extra step of radius so near misses still get suggested
+            nearby = self.within(key, max_distance + 1)
+            if nearby and nearby[0][0] <= max_distance and (len(nearby) == 1 or nearby[1][0] > nearby[0][0]):
+                result = nearby[0][1], []
+            else:
+                ranked = list(dict.fromkeys(sorted(prefixed) + [symbol for _, symbol in nearby]))
+                result = None, ranked[:suggestions]
+
+        if len(self._resolved) < MAX_CACHED:
+            self._resolved[(key, max_distance, suggestions)] = result
+        return result
+
+
+if __name__ == "__main__":
+    import random
+    import string
+    import time
+
+    months = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+    coins = ["".join(random.choices(string.ascii_uppercase, k=random.randint(3, 5))) for _ in range(60)]
+    symbols = [f"{coin}-PERP" for coin in coins] + [
+        f"{coin}-{day:02d}{month}{year}" for coin in coins for month in random.sample(months, 2)
+        for day in (25,) for year in (25, 26)
+    ]
+
+    started = time.perf_counter()
+    index = SymbolIndex(symbols)
+    print(f"Indexed {len(index)} symbols in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    queries = [symbol.lower().replace("-", "") for symbol in random.sample(symbols, 200)]
+    queries += [symbol[:-1] + "X" for symbol in random.sample(symbols, 200)]
+    for label in ("cold", "memoized"):
+        started = time.perf_counter()
+        for query in queries:
+            index.resolve(query)
+        print(f"{label}: {(time.perf_counter() - started) / len(queries) * 1e6:.1f}µs per resolve")
@@ -1,6 +1,7 @@
 from contextlib import contextmanager
 from typing import Generator, Union, Tuple
 from functools import wraps
+import asyncio
 import os
 import sqlite3
 import logging
@@ -18,23 +19,39 @@ if not MASTER_KEY:
         "MASTER_KEY not set in .env! Generate with Fernet.generate_key()")
 cipher = Fernet(MASTER_KEY)
 
-DB_PATH = "db/anya.db"
+DB_PATH = os.getenv("ANYA_DB_PATH", "db/anya.db")
 SUPPORT_LINK = "t.me/anyatraderbot69"
+MAIN_ACCOUNT = "main"       # name of the /setreadonlykey account in multi-account views
+MAX_ACCOUNTS = 10
 
 logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# user_id -> (trading_key, readonly_key), decrypted once per process
+_key_cache = {}
+# callback(user_id) run after a user's trading key is stored, e.g. to re-sign armed orders
+_trading_key_listeners = []
+
 
 def init_db():
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute(
         "CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, trading_key TEXT, readonly_key TEXT)")
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS accounts (user_id TEXT, name TEXT, readonly_key TEXT, "
+        "PRIMARY KEY (user_id, name))")
     conn.commit()
     conn.close()
 
 
+def add_trading_key_listener(callback):
+    """Register a callback(user_id) fired whenever a user stores a new trading key"""
+    if callback not in _trading_key_listeners:
+        _trading_key_listeners.append(callback)
+
+
 def encrypt_key(key):
     return cipher.encrypt(key.encode()).decode()
 
@@ -55,9 +72,20 @@ def store_key(user_id, key_type, key):
                   (user_id, encrypted_key))
     conn.commit()
     conn.close()
+    _key_cache.pop(user_id, None)
+    if key_type == "trading":
+        cvex_handler.forget_private_key(user_id)
+        for listener in list(_trading_key_listeners):
+            try:
+                listener(user_id)
+            except Exception as e:
+                logger.error(f"Trading key listener {listener.__name__} failed for {user_id}: {e}")
 
 
 def get_user_keys(user_id: str, username: str = None):
+    if user_id in _key_cache:
+        return _key_cache[user_id]
+
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute(
@@ -66,12 +94,94 @@ def get_user_keys(user_id: str, username: str = None):
     conn.close()
 
     if result and (result[0] or result[1]):
-        return (decrypt_key(result[0]) if result[0] else None, decrypt_key(result[1]) if result[1] else None)
+        keys = (decrypt_key(result[0]) if result[0] else None,
+                decrypt_key(result[1]) if result[1] else None)
+        _key_cache[user_id] = keys
+        return keys
     elif username == "DanOdin":
         return "anya2.pem", os.getenv("CVEX_API_KEY")
     return None, None
 
 
+def store_account(user_id: str, name: str, key: str):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("INSERT OR REPLACE INTO accounts (user_id, name, readonly_key) VALUES (?, ?, ?)",
+              (user_id, name, encrypt_key(key)))
+    conn.commit()
+    conn.close()
+
+
+def delete_account(user_id: str, name: str):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("DELETE FROM accounts WHERE user_id = ? AND name = ?", (user_id, name))
+    deleted = c.rowcount
+    conn.commit()
+    conn.close()
+    return deleted > 0
+
+
+def get_accounts(user_id: str, username: str = None):
+    """{name: readonly_key} - the /setreadonlykey key as MAIN_ACCOUNT plus every named one"""
+    accounts = {}
+    _, main_key = get_user_keys(user_id, username)
+    if main_key:
+        accounts[MAIN_ACCOUNT] = main_key
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT name, readonly_key FROM accounts WHERE user_id = ? ORDER BY name", (user_id,))
+    for name, encrypted_key in c.fetchall():
+        accounts[name] = decrypt_key(encrypted_key)
+    conn.close()
+    return accounts
+
+
+async def addaccount(update: Update, context: CallbackContext):
+    if len(context.args) != 2:
+        await update.message.reply_text(
+            "⚠️ Usage: /addaccount <name> <API_KEY>\nExample: /addaccount hedge 2edf443f0db5137b155c..."
+        )
+        return
+    user_id = str(update.effective_user.id)
+    name, key = context.args[0].lower(), context.args[1].strip()
+    if name == MAIN_ACCOUNT or name == "all" or not name.isidentifier():
+        await update.message.reply_text(f"❌ Pick another name, '{name}' is taken or weird!")
+        return
+    accounts = get_accounts(user_id, update.effective_user.username)
+    if name not in accounts and len(accounts) >= MAX_ACCOUNTS:
+        await update.message.reply_text(f"❌ Anya juggles at most {MAX_ACCOUNTS} accounts!")
+        return
+    try:
+        result = await asyncio.to_thread(cvex_handler.get_portfolio_data, api_key=key)
+        if "error" in result:
+            raise ValueError(result["error"])
+        store_account(user_id, name, key)
+        await update.message.reply_text(f"✅ Account '{name}' saved and verified! Try /portfolio all")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Anya unfortunately failed to add '{name}': {str(e)}")
+
+
+async def accounts(update: Update, context: CallbackContext):
+    names = list(get_accounts(str(update.effective_user.id), update.effective_user.username))
+    if not names:
+        await update.message.reply_text("📭 No accounts yet! Use /setreadonlykey or /addaccount")
+        return
+    await update.message.reply_text("🗂 Your accounts:\n" + "\n".join(f"• {name}" for name in names))
+
+
+async def removeaccount(update: Update, context: CallbackContext):
+    if not context.args:
+        await update.message.reply_text("⚠️ Usage: /removeaccount <name>")
+        return
+    name = context.args[0].lower()
+    if delete_account(str(update.effective_user.id), name):
+        await update.message.reply_text(f"🗑 Account '{name}' forgotten!")
+    else:
+        await update.message.reply_text(f"🤷 No account called '{name}'" +
+                                        (" (the main one goes with /setreadonlykey)" if name == MAIN_ACCOUNT else ""))
+
+
 async def setreadonlykey(update: Update, context: CallbackContext):
     if not context.args:
         await update.message.reply_text(
@@ -160,6 +270,8 @@ def delete_keys(user_id: str):
     c.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
     conn.commit()
     conn.close()
+    _key_cache.pop(user_id, None)
+    cvex_handler.forget_private_key(user_id)
 
 
 async def cancel_key_setup(update: Update, context: CallbackContext):
@@ -170,6 +282,11 @@ async def cancel_key_setup(update: Update, context: CallbackContext):
         await update.message.reply_text("No active key setup to cancel")
 
 
+def active_users():
+    """Users whose keys were decrypted during this run"""
+    return list(_key_cache)
+
+
 @contextmanager
 def readonly_key(user_id: str) -> Generator[None, None, None]:
     _, readonly_key = get_user_keys(user_id)
@@ -184,18 +301,21 @@ def readonly_key(user_id: str) -> Generator[None, None, None]:
 @contextmanager
 def trading_key(user_id: str) -> Generator[None, None, None]:
     trading_key, _ = get_user_keys(user_id)
-    original_key = cvex_handler.PRIVATE_KEY_PATH
-    cvex_handler.PRIVATE_KEY_PATH = trading_key
+    original_key, original_user = cvex_handler.PRIVATE_KEY_PATH, cvex_handler.PRIVATE_KEY_USER
+    cvex_handler.PRIVATE_KEY_PATH, cvex_handler.PRIVATE_KEY_USER = trading_key, user_id
     try:
         yield
     finally:
-        cvex_handler.PRIVATE_KEY_PATH = original_key
+        cvex_handler.PRIVATE_KEY_PATH, cvex_handler.PRIVATE_KEY_USER = original_key, original_user
 
 
 def main(app):
     init_db()
     app.add_handler(CommandHandler("setreadonlykey", setreadonlykey))
     app.add_handler(CommandHandler("settradingkey", settradingkey))
+    app.add_handler(CommandHandler("addaccount", addaccount))
+    app.add_handler(CommandHandler("accounts", accounts))
+    app.add_handler(CommandHandler("removeaccount", removeaccount))
     app.add_handler(MessageHandler(filters.Document.ALL, handle_key_upload))
     app.add_handler(CommandHandler("support", support))
     app.add_handler(CommandHandler("cancel", cancel_key_setup))
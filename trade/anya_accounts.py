@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from telegram import Update
+from telegram.constants import ParseMode
+
+from end_points_handlers.cvex_handler import get_portfolio_data, get_positions_data
+from market import anya_poller
+from security.anya_security import get_accounts
+
+logger = logging.getLogger(__name__)
+
+"""
+Multi-account views behind /portfolio all and /positions all.
+Every account is fetched at the same time in worker threads with its own
+key passed explicitly (no global key swap), each under its own timeout,
+so one slow account costs its timeout, not everyone's.
+"""
+
+ACCOUNT_TIMEOUT = 8     # seconds per account before it's reported as timed out
+
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _fetch_account(api_key: str):
+    overview = get_portfolio_data(api_key=api_key)
+    positions = get_positions_data(api_key=api_key)
+    error = overview.get("error") or positions.get("error")
+    if error:
+        raise RuntimeError(error)
+    return overview.get("portfolio", {}), positions.get("positions", [])
+
+
+async def fetch_all(accounts: dict):
+    """{name: (portfolio, positions) or Exception}, all accounts in flight at once"""
+    async def one(api_key):
+        return await asyncio.wait_for(asyncio.to_thread(_fetch_account, api_key), ACCOUNT_TIMEOUT)
+
+    results = await asyncio.gather(*(one(key) for key in accounts.values()), return_exceptions=True)
+    return dict(zip(accounts, results))
+
+
+def merge_positions(results: dict):
+    """
+    Net exposure per contract across accounts.
+    :return: {symbol: {"contracts", "notional", "gross", "unrealized", "accounts": {name: contracts}}}
+    """
+    merged = {}
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            continue
+        for position in result[1]:
+            symbol = position.get('contract_info', {}).get('symbol') or position.get('contract')
+            contracts = _float(position.get('size_contracts'))
+            if not symbol or not contracts:
+                continue
+            assets = _float(position.get('size_assets'), contracts)
+            mark = anya_poller.get_mark_price(symbol)
+            notional = assets * mark if mark else _float(position.get('net_value'))
+            row = merged.setdefault(symbol, {"contracts": 0.0, "notional": 0.0, "gross": 0.0, "unrealized": 0.0,
+                                             "accounts": {}})
+            row["contracts"] += contracts
+            row["notional"] += notional
+            row["gross"] += abs(notional)
+            row["unrealized"] += _float(position.get('unrealized_profit'))
+            row["accounts"][name] = row["accounts"].get(name, 0.0) + contracts
+    return merged
+
+
+def _name(name: str):
+    # user-chosen (my_hedge...), escaped for legacy Markdown - which forbids escapes inside *bold*
+    return name.replace("_", "\\_").replace("*", "\\*")
+
+
+def _failure(error: Exception):
+    if isinstance(error, asyncio.TimeoutError):
+        return "timed out"
+    # raw API errors go inside Markdown, keep them from breaking it
+    return str(error)[:80].translate(str.maketrans("", "", "_*`["))
+
+
+def format_portfolio(results: dict):
+    lines = ["🏦 *ALL ACCOUNTS*", ""]
+    equity = margin = 0.0
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            lines.append(f"⚠️ {_name(name)}: {_failure(result)}")
+            continue
+        portfolio, positions = result
+        account_equity = _float(portfolio.get('equity'))
+        account_margin = _float(portfolio.get('positions_required_margin'))
+        equity += account_equity
+        margin += account_margin
+        lines.append(f"• {_name(name)}: `${account_equity:,.2f}` equity, `${account_margin:,.2f}` margin, "
+                     f"{len(positions)} positions")
+
+    merged = merge_positions(results)
+    lines += [
+        "",
+        f"💰 Total equity: `${equity:,.2f}`",
+        f"🧱 Total margin: `${margin:,.2f}`",
+        f"📊 Net exposure: `${sum(row['notional'] for row in merged.values()):,.2f}` "
+        f"(gross `${sum(row['gross'] for row in merged.values()):,.2f}`)",
+        f"📈 Unrealized: `{sum(row['unrealized'] for row in merged.values()):+,.2f}`",
+    ]
+    return "\n".join(lines)
+
+
+def format_positions(results: dict):
+    merged = merge_positions(results)
+    failed = [f"⚠️ {_name(name)}: {_failure(result)}" for name, result in results.items() if isinstance(result, Exception)]
+    if not merged:
+        return "\n".join(["📭 No open positions in any account."] + failed)
+
+    lines = ["📊 *NET POSITIONS (ALL ACCOUNTS)*", ""]
+    for symbol, row in sorted(merged.items(), key=lambda item: -abs(item[1]["notional"])):
+        side = "🟢 LONG" if row["contracts"] > 0 else "🔴 SHORT" if row["contracts"] < 0 else "⚪ FLAT"
+        split = ", ".join(f"{name} {contracts:+g}" for name, contracts in row["accounts"].items())
+        lines += [
+            f"*{symbol}* {side}",
+            f"• Net: `{row['contracts']:+g} contracts` (`${row['notional']:,.2f}`)",
+            f"• Unrealized: `{row['unrealized']:+,.2f}`",
+            f"• Split: `{split}`",
+            ""
+        ]
+    return "\n".join(lines + failed)
+
+
+async def reply_all(update: Update, user_id: str, view: str):
+    """Shared body of /portfolio all and /positions all"""
+    accounts = get_accounts(user_id, update.effective_user.username)
+    if not accounts:
+        await update.message.reply_text("📭 No accounts yet! Use /setreadonlykey or /addaccount")
+        return
+    results = await fetch_all(accounts)
+    text = format_portfolio(results) if view == "portfolio" else format_positions(results)
+    await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
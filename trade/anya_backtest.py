@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from market import anya_candles, anya_registry
+from security.anya_security import restrict_access
+from trade import anya_risk, backtest_engine
+
+logger = logging.getLogger(__name__)
+
+"""
+/backtest over the local candle store.
+Single runs happen in a thread; parameter sweeps are chunked across a
+process pool. Workers are spawned, not forked, so the bot's threads and
+sockets never leak into them; the pool is created once and reused.
+"""
+
+DEFAULT_SLIPPAGE_BPS = 2.0
+MIN_CANDLES = 100
+MAX_COMBINATIONS = 2_000
+PARALLEL_MIN = 16                    # smaller sweeps aren't worth shipping to other processes
+SWEEP_WORKERS = min(4, os.cpu_count() or 1)
+TOP_RESULTS = 5
+
+_pool = None
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=SWEEP_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _number(text: str):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def _parse_range(text: str):
+    """'10' -> [10], '5:30:5' -> [5, 10, ..., 30] (inclusive)"""
+    if ":" not in text:
+        return [_number(text)]
+    parts = [float(part) for part in text.split(":")]
+    start, stop, step = (parts + [1.0])[:3]
+    if step <= 0 or stop < start:
+        raise ValueError(f"Bad range {text}")
+    values, value = [], start
+    while value <= stop + 1e-9:
+        values.append(_number(f"{value:.10g}"))
+        value += step
+    return values
+
+
+def _parse_args(args: list):
+    """<contract> <strategy> [name=value|start:stop:step ...] [fee=] [slip=] [period=]"""
+    if len(args) < 2:
+        raise ValueError("Need a contract and a strategy")
+    strategy = args[1].lower()
+    if strategy not in backtest_engine.STRATEGIES:
+        raise ValueError(f"Strategy must be one of: {', '.join(backtest_engine.STRATEGIES)}")
+
+    options = {"fee": anya_risk.DEFAULT_FEE_RATES["market"], "slip": DEFAULT_SLIPPAGE_BPS,
+               "period": anya_candles.DEFAULT_PERIOD}
+    ranges = {}
+    defaults = backtest_engine.STRATEGIES[strategy][1]
+    for arg in args[2:]:
+        name, _, value = arg.partition("=")
+        name = name.lower()
+        if not value:
+            raise ValueError(f"Expected name=value, got {arg}")
+        if name in ("fee", "slip"):
+            options[name] = float(value)
+        elif name == "period":
+            if value.lower() not in backtest_engine.PERIODS_PER_YEAR:
+                raise ValueError(f"Period must be one of: {', '.join(backtest_engine.PERIODS_PER_YEAR)}")
+            options[name] = value.lower()
+        elif name in defaults:
+            ranges[name] = _parse_range(value)
+        else:
+            raise ValueError(f"Unknown parameter {name} (try: {', '.join(defaults)})")
+    return strategy, ranges, options
+
+
+async def _sweep(ohlc, strategy: str, grid: list, options: dict):
+    loop = asyncio.get_running_loop()
+    fee, slip, period = options["fee"], options["slip"], options["period"]
+    if len(grid) < PARALLEL_MIN:
+        return await asyncio.to_thread(backtest_engine.run_many, ohlc, strategy, grid, fee, slip, period)
+
+    global _pool
+    chunk = -(-len(grid) // SWEEP_WORKERS)
+    try:
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(_executor(), backtest_engine.run_many, ohlc, strategy, grid[i:i + chunk], fee, slip, period)
+            for i in range(0, len(grid), chunk)
+        ))
+    except BrokenProcessPool:
+        # a dead worker poisons the pool, start a fresh one next time
+        _pool = None
+        raise
+    return [result for part in parts for result in part]
+
+
+def _format_params(params: dict):
+    return " ".join(f"{name}={value:g}" for name, value in params.items())
+
+
+def _format_report(symbol: str, strategy: str, candles: int, options: dict, results: list):
+    ranked = sorted(results, key=lambda result: result["sharpe"], reverse=True)
+    best = ranked[0]
+    lines = [
+        f"🧾 *Backtest*: {symbol} · {strategy} · {candles:,} × {options['period']} candles",
+        f"Costs: fee {options['fee'] * 100:.3f}% + slippage {options['slip']:g} bps per side",
+        "",
+        f"*Best*: `{_format_params(best['params'])}`",
+        f"• Return: {best['return_pct']:+.2f}% (costs {best['costs_pct']:.2f}%)",
+        f"• Sharpe: {best['sharpe']:.2f}",
+        f"• Max Drawdown: {best['max_drawdown_pct']:.2f}%",
+        f"• Trades: {best['trades']} | In market {best['exposure_pct']:.0f}%",
+    ]
+    if len(ranked) > 1:
+        lines += ["", f"*Top {min(TOP_RESULTS, len(ranked))} of {len(ranked)}*"]
+        for result in ranked[:TOP_RESULTS]:
+            lines.append(f"`{_format_params(result['params']):<24} {result['return_pct']:+7.1f}% "
+                         f"S {result['sharpe']:5.2f} DD {result['max_drawdown_pct']:4.1f}%`")
+    lines.append("\n_Past candles, not future profits. Anya doesn’t do refunds!_")
+    return "\n".join(lines)
+
+
+@restrict_access(need_trading=False)
+async def backtest(update: Update, context: CallbackContext, user_id: str):
+    try:
+        strategy, ranges, options = _parse_args(list(context.args))
+        grid = backtest_engine.parameter_grid(ranges)
+        if len(grid) > MAX_COMBINATIONS:
+            raise ValueError(f"{len(grid):,} combinations, Anya stops at {MAX_COMBINATIONS:,}")
+    except ValueError as e:
+        await update.message.reply_text(
+            "❌ Usage: /backtest <contract> <ma|rsi|breakout> [param=value|start:stop:step ...] "
+            "[fee=0.0005] [slip=2] [period=1h]\n"
+            "Example: /backtest BTC-PERP ma fast=5:30:5 slow=50:200:25\n"
+            f"Error: {str(e)}")
+        return
+
+    symbol = await anya_registry.resolve_or_reply(update, context.args[0])
+    if not symbol:
+        return
+
+    await anya_candles.ensure_history([symbol], options["period"])
+    _, ohlc = anya_candles.load_ohlc(symbol, options["period"])
+    if len(ohlc) < MIN_CANDLES:
+        await update.message.reply_text(
+            f"📉 Only {len(ohlc)} {options['period']} candles stored for {symbol}, "
+            f"Anya wants {MIN_CANDLES}+. Try again after a few candle syncs!")
+        return
+
+    if len(grid) >= PARALLEL_MIN:
+        await update.message.reply_text(f"🧮 Sweeping {len(grid):,} parameter sets... Anya’s brain cells at work!")
+    try:
+        results = await _sweep(ohlc, strategy, grid, options)
+    except Exception as e:
+        logger.error(f"Backtest failed: {e}", exc_info=True)
+        await update.message.reply_text(f"💥 Backtest blew up! Error: {str(e)}")
+        return
+
+    if not results:
+        await update.message.reply_text("🤷 No valid parameter combination (e.g. fast must be below slow)!")
+        return
+    await update.message.reply_text(
+        _format_report(symbol, strategy, len(ohlc), options, results), parse_mode=ParseMode.MARKDOWN)
+
+
+BACKTEST_HANDLERS = [
+    CommandHandler("backtest", backtest),
+]
@@ -0,0 +1,173 @@
+import asyncio
+import csv
+import logging
+import os
+import tempfile
+import time
+from itertools import islice
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+
+from end_points_handlers.cvex_handler import history_headers, iter_history
+from security.anya_security import restrict_access, readonly_key
+
+logger = logging.getLogger(__name__)
+
+"""
+/export of the full trade, order or transaction history.
+Pages stream from CVEX through generators (events -> rows -> batches)
+straight into the file, so memory stays at one page plus one batch no
+matter how long the history is. Parquet needs pyarrow (optional).
+"""
+
+PAGE_SIZE = 200
+BATCH_ROWS = 5_000                  # rows per CSV write / Parquet row group
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # Telegram bot document limit
+FORMATS = ("csv", "parquet")
+
+# kind -> (history endpoint, [(column, "path.to.field|fallback", numeric)])
+EXPORTS = {
+    "trades": ("positions", [
+        ("time", "created_at|created_ad", False), ("type", "type", False),
+        ("contract", "contract_info.symbol", False), ("side", "side", False),
+        ("quantity_contracts", "quantity_contracts", True), ("entry_price", "entry_price", True),
+        ("realized_profit", "realized_profit", True), ("fee", "fee", True),
+    ]),
+    "orders": ("orders", [
+        ("time", "created_at", False), ("type", "type", False), ("order_id", "order_id", False),
+        ("contract", "contract_info.symbol", False), ("side", "side", False),
+        ("order_type", "order_type", False), ("quantity_contracts", "quantity_contracts", True),
+        ("limit_price", "limit_price", True), ("filled_contracts", "filled_contracts", True),
+    ]),
+    "transactions": ("transactions", [
+        ("time", "created_at", False), ("type", "type", False), ("amount", "amount", True),
+        ("contract", "contract_info.symbol", False), ("tx_hash", "tx_info.transaction_hash", False),
+    ]),
+}
+
+_running = set()    # user_ids with an export in flight
+
+
+def _pluck(event: dict, path: str):
+    for candidate in path.split("|"):
+        value = event
+        for part in candidate.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if value is not None:
+            return value
+    return None
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def rows(events, columns: list):
+    """Flatten each event into a tuple in column order"""
+    for event in events:
+        yield tuple(
+            _number(value) if numeric else (None if value is None else str(value))
+            for value, numeric in ((_pluck(event, path), numeric) for _, path, numeric in columns))
+
+
+def batches(iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_csv(path: str, columns: list, row_batches):
+    count = 0
+    with open(path, "w", newline="") as out:
+        writer = csv.writer(out)
+        writer.writerow([name for name, _, _ in columns])
+        for batch in row_batches:
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+
+def write_parquet(path: str, columns: list, row_batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, pa.float64() if numeric else pa.string()) for name, _, numeric in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in row_batches:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(batch)
+        if not count:
+            writer.write_table(schema.empty_table())
+    return count
+
+
+def export(kind: str, fmt: str, headers: dict, path: str):
+    """Blocking: page through the history into `path`, returns (row count, cut off early)"""
+    endpoint, columns = EXPORTS[kind]
+    truncated = []
+    history = iter_history(endpoint, headers, PAGE_SIZE, on_truncated=lambda: truncated.append(True))
+    pipeline = batches(rows(history, columns), BATCH_ROWS)
+    if fmt == "parquet":
+        return write_parquet(path, columns, pipeline), bool(truncated)
+    return write_csv(path, columns, pipeline), bool(truncated)
+
+
+@restrict_access(need_trading=False)
+async def export_history(update: Update, context: CallbackContext, user_id: str):
+    args = [arg.lower() for arg in context.args]
+    if not args or args[0] not in EXPORTS or (len(args) > 1 and args[1] not in FORMATS):
+        await update.message.reply_text(
+            f"❌ Usage: /export <{'|'.join(EXPORTS)}> [{'|'.join(FORMATS)}]\nExample: /export transactions csv")
+        return
+    kind, fmt = args[0], (args[1] if len(args) > 1 else "csv")
+
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            await update.message.reply_text("📦 Parquet needs pyarrow and Anya doesn’t have it, try csv!")
+            return
+    if user_id in _running:
+        await update.message.reply_text("⏳ Anya’s still packing your last export, patience!")
+        return
+
+    _running.add(user_id)
+    handle, path = tempfile.mkstemp(prefix=f"anya-{kind}-", suffix=f".{fmt}")
+    os.close(handle)
+    try:
+        with readonly_key(user_id):
+            headers = history_headers(EXPORTS[kind][0])
+        await update.message.reply_text(f"📦 Exporting your {kind} history... Anya’s digging through the archives!")
+        started = time.perf_counter()
+        count, truncated = await asyncio.to_thread(export, kind, fmt, headers, path)
+
+        size = os.path.getsize(path)
+        if size > MAX_UPLOAD_BYTES:
+            await update.message.reply_text(
+                f"🐘 {count:,} rows came out at {size / 1024 / 1024:.0f} MB, too big for Telegram!"
+                + (" Try parquet, it packs tighter." if fmt == "csv" else ""))
+            return
+        with open(path, "rb") as document:
+            await update.message.reply_document(
+                document=document, filename=f"anya-{kind}-{time.strftime('%Y%m%d')}.{fmt}",
+                caption=f"🧾 {count:,} {kind} rows in {time.perf_counter() - started:.1f}s. Tax man not included!"
+                + ("\n⚠️ CVEX stopped paging early, older rows may be missing!" if truncated else ""))
+    except Exception as e:
+        logger.error(f"Export of {kind} failed for {user_id}: {e}", exc_info=True)
+        await update.message.reply_text(f"💥 Export failed! Error: {str(e)}")
+    finally:
+        _running.discard(user_id)
+        os.remove(path)
+
+
+EXPORT_HANDLERS = [
+    CommandHandler("export", export_history),
+]
@@ -0,0 +1,254 @@
+import asyncio
+import sqlite3
+import logging
+import random
+import time
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from end_points_handlers.cvex_handler import (
+    presign_cancel_all_after, submit_cancel_all_after, presign_cancel_timer_status, submit_cancel_timer_status
+)
+from market import anya_poller
+from security.anya_security import restrict_access, trading_key, DB_PATH
+
+logger = logging.getLogger(__name__)
+
+"""
+Dead-man's switch.
+While Anya is healthy she keeps pushing each user's cancel-all-after trigger
+into the future. If she dies (or feels sick), renewals stop and CVEX cancels
+the orders on its own - that's the whole point.
+"""
+
+TICK_INTERVAL = 5          # seconds between heartbeat ticks
+MIN_TIMEOUT = 30           # seconds
+RENEW_FRACTION = 3         # renew every timeout / 3
+MAX_RENEWALS_PER_TICK = 20
+RENEW_PAUSE = 0.05         # seconds between renewals in a tick
+RENEW_TIMEOUT = 5          # seconds per CVEX request before a renewal counts as failed
+MAX_FAILURE_STREAK = 5     # failed renewals in a row: per user it pauses that user, across users everyone
+MAX_TICK_LAG = 3 * TICK_INTERVAL
+MAX_FEED_AGE = 6 * anya_poller.POLL_INTERVAL
+
+# user_id -> {"chat_id", "timeout_ms", "trigger_id", "status", "renewed_at", "paused", "failures"}
+heartbeats = {}
+_last_tick = 0.0
+_failure_streak = 0     # distinct users whose renewal failed since the last success anywhere
+
+
+def init_heartbeat_db():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS heartbeats (user_id TEXT PRIMARY KEY, chat_id INTEGER, timeout_ms INTEGER)")
+    conn.commit()
+    conn.close()
+
+
+def load_heartbeats():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT user_id, chat_id, timeout_ms FROM heartbeats")
+    now = time.time()
+    for user_id, chat_id, timeout_ms in c.fetchall():
+        # Random phase so a restart doesn't renew everybody in the same tick
+        renew_every = timeout_ms / 1000 / RENEW_FRACTION
+        heartbeats[user_id] = {
+            "chat_id": chat_id, "timeout_ms": timeout_ms, "trigger_id": None, "status": None,
+            "renewed_at": now - random.uniform(0, renew_every), "paused": False, "failures": 0
+        }
+    conn.close()
+
+
+def set_heartbeat(user_id: str, chat_id: int, timeout_ms: int = None):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    if timeout_ms is None:
+        c.execute("DELETE FROM heartbeats WHERE user_id = ?", (user_id,))
+        heartbeats.pop(user_id, None)
+    else:
+        c.execute("INSERT OR REPLACE INTO heartbeats (user_id, chat_id, timeout_ms) VALUES (?, ?, ?)",
+                  (user_id, chat_id, timeout_ms))
+        heartbeats[user_id] = {
+            "chat_id": chat_id, "timeout_ms": timeout_ms, "trigger_id": None, "status": None,
+            "renewed_at": 0.0, "paused": False, "failures": 0
+        }
+    conn.commit()
+    conn.close()
+
+
+def cvex_failing():
+    """
+    Several different users failing in a row means CVEX, not one bad key.
+    With a single heartbeat there's nobody to compare with: its own pause covers it.
+    """
+    return _failure_streak >= min(MAX_FAILURE_STREAK, max(len(heartbeats), 2))
+
+
+def degraded_reason(now: float):
+    """Why Anya should stop vouching for herself, or None when healthy"""
+    if _last_tick and now - _last_tick > MAX_TICK_LAG:
+        return f"event loop stalled for {now - _last_tick:.0f}s"
+    age = anya_poller.snapshot_age()
+    if age is not None and age > MAX_FEED_AGE:
+        return f"market feed is {age:.0f}s stale"
+    if cvex_failing():
+        return f"{_failure_streak} accounts' CVEX renewals failed in a row"
+    return None
+
+
+def _round_trip(timeout_ms: int, previous: str, renew_headers: dict, status_headers: dict):
+    # Presigned, so it runs in a worker thread without touching the key swap
+    result = submit_cancel_all_after(timeout_ms, renew_headers, timeout=RENEW_TIMEOUT)
+    if not previous or "error" in result:
+        return result, None
+    return result, submit_cancel_timer_status(previous, status_headers, timeout=RENEW_TIMEOUT)
+
+
+async def _renew(user_id: str, heartbeat: dict):
+    """Re-arm the trigger and record how the previous one ended"""
+    global _failure_streak
+
+    previous = heartbeat["trigger_id"]
+    with trading_key(user_id):
+        renew_headers = presign_cancel_all_after(heartbeat["timeout_ms"])
+        status_headers = presign_cancel_timer_status(previous) if previous else None
+    result, status = await asyncio.to_thread(
+        _round_trip, heartbeat["timeout_ms"], previous, renew_headers, status_headers)
+
+    if "error" in result:
+        heartbeat["failures"] += 1
+        if heartbeat["failures"] == 1:
+            _failure_streak += 1    # a user's repeat failures don't count twice
+        heartbeat["status"] = f"renew failed: {result['error']}"
+        return None
+
+    _failure_streak = 0
+    heartbeat["failures"] = 0
+    heartbeat["trigger_id"] = result["trigger_id"]
+    heartbeat["renewed_at"] = time.time()
+    previous_status = status.get("status") if status and "error" not in status else None
+    heartbeat["status"] = "armed"
+    return previous_status
+
+
+async def _notify(context: CallbackContext, chat_id: int, text: str):
+    try:
+        await context.bot.send_message(chat_id=chat_id, text=text, parse_mode=ParseMode.MARKDOWN)
+    except Exception as e:
+        logger.error(f"Heartbeat notification failed: {e}")
+
+
+async def run_heartbeats(context: CallbackContext):
+    """Job queue callback: renew the most overdue triggers, a limited batch per tick"""
+    global _last_tick
+
+    now = time.time()
+    reason = degraded_reason(now)
+    _last_tick = now
+
+    limit = MAX_RENEWALS_PER_TICK
+    if reason:
+        logger.warning(f"Heartbeat paused: {reason}")
+        for heartbeat in heartbeats.values():
+            if not heartbeat["paused"]:
+                heartbeat["paused"] = True
+                await _notify(context, heartbeat["chat_id"],
+                              f"⚠️ *Heartbeat Paused*\n\nAnya isn’t feeling well ({reason}).\n"
+                              f"Your cancel-all timer will fire unless she recovers!")
+        if not cvex_failing():
+            return
+        limit = 1   # keep probing CVEX, one success ends the outage
+
+    due = sorted(
+        (
+            (heartbeat["renewed_at"] + heartbeat["timeout_ms"] / 1000 / RENEW_FRACTION, user_id)
+            for user_id, heartbeat in heartbeats.items()
+        )
+    )
+    due = [user_id for renew_at, user_id in due if renew_at <= now]
+    if limit == 1:
+        # probe with the account least likely to fail on its own (not a known-bad key)
+        due.sort(key=lambda user_id: heartbeats[user_id]["failures"])
+    due = due[:limit]
+
+    for user_id in due:
+        heartbeat = heartbeats.get(user_id)
+        if not heartbeat:
+            continue
+        try:
+            previous_status = await _renew(user_id, heartbeat)
+        except Exception as e:
+            logger.error(f"Heartbeat renew for {user_id} crashed: {e}")
+            continue
+
+        if heartbeat["paused"] and heartbeat["status"] == "armed":
+            heartbeat["paused"] = False
+            await _notify(context, heartbeat["chat_id"], "💓 Heartbeat resumed! Anya is back on guard.")
+        elif heartbeat["failures"] >= MAX_FAILURE_STREAK and not heartbeat["paused"]:
+            # only this account: a bad or rotated key shouldn't pause everybody
+            heartbeat["paused"] = True
+            await _notify(context, heartbeat["chat_id"],
+                          f"⚠️ *Heartbeat Failing*\n\n{heartbeat['failures']} renewals in a row failed "
+                          f"({heartbeat['status'].translate(str.maketrans('', '', '_*`['))}).\nCheck your trading key, Anya keeps trying!")
+        if previous_status in ("orders_canceled", "orders_cancel_failed"):
+            await _notify(context, heartbeat["chat_id"],
+                          f"🚨 *Cancel-All Fired Before Renewal!*\n\nPrevious timer ended as "
+                          f"`{previous_status}`. Anya re-armed a new one.")
+        await asyncio.sleep(RENEW_PAUSE)
+
+
+@restrict_access(need_trading=True)
+async def heartbeat(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        current = heartbeats.get(user_id)
+        if not current:
+            await update.message.reply_text(
+                "Usage: /heartbeat <seconds> | off\n"
+                "Example: /heartbeat 60 → Anya keeps re-arming a 60s cancel-all timer while she’s alive")
+            return
+        renewed = f"{time.time() - current['renewed_at']:.0f}s ago" if current["renewed_at"] else "not yet"
+        await update.message.reply_text(
+            f"💓 *Heartbeat*\n\n"
+            f"• Timeout: {current['timeout_ms'] // 1000}s\n"
+            f"• Last Renewal: {renewed}\n"
+            f"• Trigger ID: `{current['trigger_id'] or 'N/A'}`\n"
+            f"• Status: {'⏸ paused' if current['paused'] else current['status'] or 'pending'}",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+
+    if context.args[0].lower() == "off":
+        set_heartbeat(user_id, update.effective_chat.id, None)
+        with trading_key(user_id):
+            headers = presign_cancel_all_after(0)
+        result = await asyncio.to_thread(submit_cancel_all_after, 0, headers, RENEW_TIMEOUT)
+        note = f"\n⚠️ Disarm failed: {result['error']}" if "error" in result else ""
+        await update.message.reply_text(f"💤 Heartbeat off, cancel-all timer disabled.{note}")
+        return
+
+    try:
+        timeout_sec = int(context.args[0])
+        if timeout_sec < MIN_TIMEOUT:
+            raise ValueError(f"Use at least {MIN_TIMEOUT} seconds")
+    except ValueError as e:
+        await update.message.reply_text(f"Invalid timeout! Use whole seconds (e.g. 60). {str(e)}")
+        return
+
+    set_heartbeat(user_id, update.effective_chat.id, timeout_sec * 1000)
+    await update.message.reply_text(
+        f"💓 *Heartbeat On!*\n\n"
+        f"Anya re-arms a {timeout_sec}s cancel-all timer every ~{timeout_sec // RENEW_FRACTION}s.\n"
+        f"If she goes down, your orders get cancelled. Turn off with /heartbeat off",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+def main(app):
+    init_heartbeat_db()
+    load_heartbeats()
+    app.job_queue.run_repeating(
+        run_heartbeats, interval=TICK_INTERVAL, first=TICK_INTERVAL, name="heartbeat")
+    app.add_handler(CommandHandler("heartbeat", heartbeat))
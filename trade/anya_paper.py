@@ -0,0 +1,394 @@
+import asyncio
+import logging
+import time
+from itertools import count
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from end_points_handlers.cvex_handler import get_order_book_data, get_latest_trades_data
+from market import anya_poller, anya_registry
+from security.anya_security import restrict_access
+from trade import anya_risk
+from trade.paper_engine import OrderBook, BUY, SELL
+
+logger = logging.getLogger(__name__)
+
+"""
+Paper trading.
+Simulated orders match against a local copy of the CVEX book (re-seeded
+from order-book snapshots, resting paper orders filled by real prints)
+and land in a per-user paper portfolio. Used when CVEX can't take the
+real order, and by /paper_order any time.
+"""
+
+PAPER_BALANCE = 10_000.0    # starting cash of a paper account
+BOOK_TTL = 15               # seconds before a book is re-seeded from CVEX
+REFRESH_INTERVAL = 15       # seconds between re-seeds of books holding paper orders
+SYNTH_LEVELS = 20           # levels per side of a book made up around the mark
+SYNTH_STEP = 0.0005         # 5 bps between synthetic levels
+SYNTH_SIZE = 5.0            # contracts per synthetic level
+TAKER_FEE = anya_risk.DEFAULT_FEE_RATES["market"]
+MAKER_FEE = anya_risk.DEFAULT_FEE_RATES["limit"]
+
+# symbol -> OrderBook, plus when it was seeded and from what
+books = {}
+_seeded = {}        # symbol -> {"at": float, "source": "cvex" | "synthetic", "trades": set of print keys}
+# user_id -> {"chat_id", "cash", "fees", "realized", "positions": {symbol: {"contracts", "entry"}}, "orders": {...}}
+accounts = {}
+_paper_ids = count(1)
+# engine order id per book -> (user_id, paper order id)
+_owners = {}
+
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _account(user_id: str, chat_id: int = None):
+    account = accounts.setdefault(user_id, {
+        "chat_id": chat_id, "cash": PAPER_BALANCE, "fees": 0.0, "realized": 0.0,
+        "positions": {}, "orders": {}, "filled": 0
+    })
+    if chat_id:
+        account["chat_id"] = chat_id
+    return account
+
+
+def _fetch_snapshot(symbol: str):
+    """Blocking CVEX reads for one book (public endpoints, safe in a thread)"""
+    book = get_order_book_data(symbol)
+    trades = get_latest_trades_data(symbol)
+    if "error" in book:
+        logger.info(f"Paper book for {symbol} falls back to the mark: {book['error']}")
+        book = None
+    return book, trades.get("trades", []) if "error" not in trades else []
+
+
+def _levels(rows: list):
+    return [(_float(row.get('price')), _float(row.get('quantity_contracts'))) for row in rows or []
+            if _float(row.get('price')) > 0]
+
+
+def _synthetic_levels(mark: float):
+    bids = [(round(mark * (1 - SYNTH_STEP * i), 8), SYNTH_SIZE) for i in range(1, SYNTH_LEVELS + 1)]
+    asks = [(round(mark * (1 + SYNTH_STEP * i), 8), SYNTH_SIZE) for i in range(1, SYNTH_LEVELS + 1)]
+    return bids, asks
+
+
+def _trade_key(trade: dict):
+    tx_info = trade.get('tx_info') or {}
+    return (trade.get('timestamp') or tx_info.get('block_timestamp'), tx_info.get('tx_hash'),
+            trade.get('last_price'), trade.get('quantity_contracts'), trade.get('taker_side'))
+
+
+def _apply_snapshot(symbol: str, book_data, trades: list):
+    """
+    Runs on the loop (the engine isn't thread-safe): re-seed the book, then
+    let prints we haven't seen trade through resting paper orders.
+    :return: paper fills as (engine order id, owner, price, quantity)
+    """
+    book = books.setdefault(symbol, OrderBook(symbol))
+    previous = _seeded.get(symbol)
+
+    if book_data and (book_data.get('bids') or book_data.get('asks')):
+        bids, asks, source = _levels(book_data.get('bids')), _levels(book_data.get('asks')), "cvex"
+    else:
+        mark = anya_poller.get_mark_price(symbol)
+        if mark is None and previous is None:
+            return None
+        bids, asks = _synthetic_levels(mark) if mark else ([], [])
+        source = "synthetic"
+
+    fills = []
+    keys = {_trade_key(trade) for trade in trades}
+    if previous is not None:
+        # CVEX lists newest first, replay the new prints in the order they happened
+        for trade in reversed(trades):
+            if _trade_key(trade) in previous["trades"]:
+                continue
+            side = BUY if trade.get('taker_side') == "buy" else SELL
+            fills += book.on_trade(_float(trade.get('last_price')), _float(trade.get('quantity_contracts')), side)
+    if bids or asks:
+        fills += book.reseed(bids, asks)
+    _seeded[symbol] = {"at": time.time(), "source": source, "trades": keys or (previous or {}).get("trades", set())}
+    return fills
+
+
+async def ensure_book(symbol: str):
+    """A book fresh enough to trade against, or None when Anya has no price at all"""
+    seeded = _seeded.get(symbol)
+    if seeded and time.time() - seeded["at"] < BOOK_TTL:
+        return books[symbol], []
+    book_data, trades = await asyncio.to_thread(_fetch_snapshot, symbol)
+    fills = _apply_snapshot(symbol, book_data, trades)
+    if fills is None or books[symbol].mid() is None:
+        return None, fills or []
+    return books[symbol], fills
+
+
+def _apply_fill(user_id: str, symbol: str, side: str, price: float, quantity: float, maker: bool):
+    """Book a fill into the paper portfolio: average entry on adds, realized PnL on reductions"""
+    account = _account(user_id)
+    fee = price * quantity * (MAKER_FEE if maker else TAKER_FEE)
+    signed = quantity if side == BUY else -quantity
+    position = account["positions"].setdefault(symbol, {"contracts": 0.0, "entry": 0.0})
+
+    contracts = position["contracts"]
+    if contracts == 0 or (contracts > 0) == (signed > 0):
+        position["entry"] = (position["entry"] * abs(contracts) + price * quantity) / (abs(contracts) + quantity)
+    else:
+        closed = min(abs(contracts), quantity)
+        pnl = closed * (price - position["entry"]) * (1 if contracts > 0 else -1)
+        account["realized"] += pnl
+        account["cash"] += pnl
+        if quantity > abs(contracts):
+            position["entry"] = price
+
+    position["contracts"] = contracts + signed
+    if abs(position["contracts"]) < 1e-12:
+        del account["positions"][symbol]
+    account["cash"] -= fee
+    account["fees"] += fee
+    account["filled"] += 1
+    return fee
+
+
+def _settle_resting(symbol: str, fills: list):
+    """Fills of resting paper orders (makers); returns {user_id: [lines]} for notifications"""
+    notes = {}
+    for engine_id, user_id, price, quantity in fills:
+        paper_id = _owners.get((symbol, engine_id), (None, None))[1]
+        order = accounts.get(user_id, {}).get("orders", {}).get(paper_id)
+        if not order:
+            continue
+        _apply_fill(user_id, symbol, order["side"], price, quantity, maker=True)
+        order["filled"] += quantity
+        if books[symbol].order(engine_id) is None:
+            del accounts[user_id]["orders"][paper_id]
+            _owners.pop((symbol, engine_id), None)
+        notes.setdefault(user_id, []).append(
+            f"• `{paper_id}` {order['side'].upper()} {quantity:g} {symbol} @ ${price:,.2f}")
+    return notes
+
+
+def mark_price(symbol: str):
+    book = books.get(symbol)
+    return (book.mid() if book else None) or anya_poller.get_mark_price(symbol)
+
+
+def portfolio(user_id: str):
+    """(equity, notional, rows) of the paper account, marked at the paper book mid"""
+    account = _account(user_id)
+    equity, notional, rows = account["cash"], 0.0, []
+    for symbol, position in account["positions"].items():
+        mark = mark_price(symbol) or position["entry"]
+        pnl = position["contracts"] * (mark - position["entry"])
+        equity += pnl
+        notional += abs(position["contracts"]) * mark
+        rows.append((symbol, position, mark, pnl))
+    return equity, notional, rows
+
+
+async def estimate(user_id: str, contract: str, side: str, order_type: str, quantity: float, price: float = None):
+    """Estimate shaped like /trading/estimate-order, priced by walking the paper book"""
+    book, fills = await ensure_book(contract)
+    _settle_resting(contract, fills)
+    if book is None:
+        return {"error": f"Anya has no price for {contract} to paper trade against"}
+
+    filled, average = book.preview(side, quantity, order_type, price)
+    fill_price = average if filled else (price or book.mid())
+    maker_quantity = quantity - filled if order_type == "limit" else 0.0
+    trading_fee = (filled * fill_price * TAKER_FEE) + (maker_quantity * (price or fill_price) * MAKER_FEE)
+
+    equity, _, rows = portfolio(user_id)
+    signed = quantity if side == BUY else -quantity
+    mark = book.mid()
+    equity += signed * (mark - fill_price) - trading_fee
+    position = _account(user_id)["positions"].get(contract, {"contracts": 0.0})
+    new_contracts = position["contracts"] + signed
+    other = sum(abs(row[1]["contracts"]) * row[2] for row in rows if row[0] != contract)
+    total = other + abs(new_contracts) * mark
+    liq = anya_risk.liquidation_price(equity, other, new_contracts, mark, anya_risk.DEFAULT_MAINTENANCE_RATE)
+    return {
+        "trading_fee": f"{trading_fee:.6f}",
+        "operational_fee": "0",
+        "new_leverage": f"{total / equity:.2f}" if equity > 0 else "N/A",
+        "estimated_liquidation_price": f"{liq:.2f}" if liq else "N/A",
+        "fill_price": f"{fill_price:.2f}",
+        "filled": filled,
+        "source": "paper"
+    }
+
+
+async def place_order(user_id: str, contract: str, side: str, order_type: str, quantity: float,
+                      price: float = None, chat_id: int = None):
+    """Match a paper order; result is shaped like send_order's"""
+    book, fills = await ensure_book(contract)
+    _settle_resting(contract, fills)
+    if book is None:
+        return {"error": f"Anya has no price for {contract} to paper trade against"}
+
+    account = _account(user_id, chat_id)
+    paper_id = f"PAPER-{next(_paper_ids)}"
+    engine_id, taken, unfilled = book.submit(side, quantity, order_type, price, owner=user_id)
+
+    fee = 0.0
+    for _, _, fill_price, traded in taken:
+        fee += _apply_fill(user_id, contract, side, fill_price, traded, maker=False)
+    # the other side of a paper-vs-paper match is somebody's resting order
+    _settle_resting(contract, [fill for fill in taken if fill[1] is not None])
+    # self-trade prevention may have pulled this user's own resting orders
+    for stale in [pid for pid, order in account["orders"].items()
+                  if order["contract"] == contract and book.order(order["engine_id"]) is None]:
+        _owners.pop((contract, account["orders"].pop(stale)["engine_id"]), None)
+    filled = sum(fill[3] for fill in taken)
+    average = sum(fill[2] * fill[3] for fill in taken) / filled if filled else None
+
+    if engine_id is not None:
+        account["orders"][paper_id] = {
+            "contract": contract, "side": side, "price": price, "quantity": quantity,
+            "filled": filled, "engine_id": engine_id, "created": time.time()
+        }
+        _owners[(contract, engine_id)] = (user_id, paper_id)
+        status = f"partially filled ({filled:g}/{quantity:g})" if filled else "open"
+    elif unfilled > 1e-12:
+        status = f"partially filled ({filled:g}/{quantity:g}), rest canceled" if filled else "canceled (no liquidity)"
+    else:
+        status = "filled"
+
+    return {
+        "order_id": paper_id, "contract": contract, "status": status,
+        "average_price": average, "filled": filled, "fee": fee,
+        "book": _seeded[contract]["source"]
+    }
+
+
+def cancel_order(user_id: str, paper_id: str):
+    order = accounts.get(user_id, {}).get("orders", {}).pop(paper_id, None)
+    if not order:
+        return None
+    remaining = books[order["contract"]].cancel(order["engine_id"])
+    _owners.pop((order["contract"], order["engine_id"]), None)
+    return remaining
+
+
+async def refresh_books(context: CallbackContext):
+    """Job queue callback: re-seed books with resting paper orders so prints can fill them"""
+    symbols = {order["contract"] for account in accounts.values() for order in account["orders"].values()}
+    for symbol in symbols:
+        try:
+            book_data, trades = await asyncio.to_thread(_fetch_snapshot, symbol)
+            notes = _settle_resting(symbol, _apply_snapshot(symbol, book_data, trades) or [])
+        except Exception as e:
+            logger.error(f"Paper book refresh for {symbol} failed: {e}")
+            continue
+        for user_id, lines in notes.items():
+            chat_id = accounts[user_id]["chat_id"]
+            if chat_id:
+                await context.bot.send_message(
+                    chat_id=chat_id, text="🧻 *Paper fills!*\n" + "\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+
+@restrict_access(need_trading=False)
+async def paper(update: Update, context: CallbackContext, user_id: str):
+    account = _account(user_id, update.effective_chat.id)
+    equity, notional, rows = portfolio(user_id)
+    lines = [
+        "🧻 *Anya’s Paper Portfolio*",
+        f"• Equity: ${equity:,.2f} (started at ${PAPER_BALANCE:,.0f})",
+        f"• Realized PnL: ${account['realized']:,.2f} | Fees: ${account['fees']:,.2f}",
+        f"• Leverage: {notional / equity:.2f}x" if equity > 0 else "• Leverage: N/A (underwater!)",
+    ]
+    if rows:
+        lines += ["", "*Positions*"]
+        for symbol, position, mark, pnl in rows:
+            lines.append(f"• {symbol}: {position['contracts']:+g} @ ${position['entry']:,.2f} "
+                         f"(mark ${mark:,.2f}, PnL ${pnl:+,.2f})")
+    if account["orders"]:
+        lines += ["", "*Open paper orders*"]
+        for paper_id, order in account["orders"].items():
+            lines.append(f"• `{paper_id}` {order['side'].upper()} {order['quantity'] - order['filled']:g} "
+                         f"{order['contract']} @ ${order['price']:,.2f}")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+
+@restrict_access(need_trading=False)
+async def paper_order(update: Update, context: CallbackContext, user_id: str):
+    try:
+        if len(context.args) < 4:
+            raise ValueError("Need contract, side, type and quantity")
+        side, order_type = context.args[1].lower(), context.args[2].lower()
+        quantity = float(context.args[3])
+        price = float(context.args[4]) if order_type == "limit" and len(context.args) > 4 else None
+        if side not in (BUY, SELL) or order_type not in ("market", "limit") or quantity <= 0:
+            raise ValueError("Side must be buy/sell, type market/limit, quantity positive")
+        if order_type == "limit" and not price:
+            raise ValueError("Limit orders need a price")
+    except ValueError as e:
+        await update.message.reply_text(
+            "❌ Usage: /paper_order <contract> <buy|sell> <market|limit> <quantity> [price]\n"
+            f"Example: /paper_order BTC-PERP buy limit 0.5 50000\nError: {str(e)}")
+        return
+
+    info, error = anya_registry.validate_order(context.args[0], quantity, price)
+    if error:
+        await update.message.reply_text(error)
+        return
+    contract = info.symbol if info else context.args[0].upper()
+
+    result = await place_order(user_id, contract, side, order_type, quantity, price, update.effective_chat.id)
+    await update.message.reply_text(format_result(result), parse_mode=ParseMode.MARKDOWN)
+
+
+def format_result(result: dict):
+    if "error" in result:
+        return f"❌ Paper order bounced! {result['error']}"
+    lines = [
+        "🧻 *Paper Order Placed!* (no real money harmed)",
+        f"• ID: `{result['order_id']}`",
+        f"• Contract: `{result['contract']}`",
+        f"• Status: `{result['status']}`"
+    ]
+    if result["filled"]:
+        lines.append(f"• Filled: {result['filled']:g} @ ${result['average_price']:,.2f} (fee ${result['fee']:,.4f})")
+    if result["book"] == "synthetic":
+        lines.append("_CVEX book unavailable, matched against a book Anya drew around the mark._")
+    return "\n".join(lines)
+
+
+@restrict_access(need_trading=False)
+async def paper_cancel(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        await update.message.reply_text("❌ Usage: /paper_cancel <PAPER-id>")
+        return
+    remaining = cancel_order(user_id, context.args[0].upper())
+    if remaining is None:
+        await update.message.reply_text("🤔 Anya can’t find that paper order!")
+    else:
+        await update.message.reply_text(f"🗑 Paper order canceled ({remaining:g} contracts unfilled).")
+
+
+@restrict_access(need_trading=False)
+async def paper_reset(update: Update, context: CallbackContext, user_id: str):
+    for paper_id in list(accounts.get(user_id, {}).get("orders", {})):
+        cancel_order(user_id, paper_id)
+    accounts.pop(user_id, None)
+    await update.message.reply_text(f"🧽 Paper account wiped! Fresh ${PAPER_BALANCE:,.0f} to lose, waku waku!")
+
+
+PAPER_HANDLERS = [
+    CommandHandler("paper", paper),
+    CommandHandler("paper_order", paper_order),
+    CommandHandler("paper_cancel", paper_cancel),
+    CommandHandler("paper_reset", paper_reset),
+]
+
+
+def main(app):
+    app.job_queue.run_repeating(
+        refresh_books, interval=REFRESH_INTERVAL, first=REFRESH_INTERVAL, name="paper_books")
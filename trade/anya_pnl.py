@@ -0,0 +1,302 @@
+import asyncio
+import json
+import sqlite3
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from end_points_handlers.cvex_handler import history_headers, iter_history
+from security.anya_security import restrict_access, readonly_key, DB_PATH
+from trade import anya_risk
+
+logger = logging.getLogger(__name__)
+
+"""
+Per-user PnL ledger.
+Transactions are pulled newest first only until the newest timestamp
+already ingested (the cursor, with the keys seen at that timestamp so
+same-second events are neither lost nor counted twice), and each new one
+bumps a (day, contract) bucket:
+realized PnL, fees, funding, wins and losses. /pnl sums at most a few
+hundred bucket rows, never the raw history. Unrealized PnL comes from the
+cached risk snapshot. When CVEX cuts the history off before the cursor,
+the missing span is recorded as a gap and the ledger moves on.
+"""
+
+SYNC_TTL = 60                       # seconds a ledger counts as fresh for /pnl
+SYNC_INTERVAL = 15 * 60             # background top-up of users who asked for /pnl before
+PAGE_SIZE = 100
+PERIODS = {"1d": 1, "7d": 7, "30d": 30, "90d": 90, "all": None}
+DEFAULT_PERIOD = "30d"
+
+_synced = {}        # user_id -> time of the last successful sync
+_locks = {}         # user_id -> asyncio.Lock, one sync per user at a time
+
+
+def init_pnl_db():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS pnl_daily (user_id TEXT, day TEXT, symbol TEXT, realized REAL, fees REAL, "
+        "funding REAL, wins INTEGER, losses INTEGER, events INTEGER, PRIMARY KEY (user_id, day, symbol))")
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS pnl_cursors (user_id TEXT PRIMARY KEY, last_time TEXT, seen_keys TEXT, "
+        "synced_at REAL)")
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS pnl_gaps (user_id TEXT, after_time TEXT, before_time TEXT, recorded_at REAL)")
+    conn.commit()
+    conn.close()
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def event_key(event: dict):
+    """Stable identity of a transaction event, the cursor points at one of these"""
+    if event.get("id") is not None:
+        return str(event["id"])
+    tx_hash = (event.get("tx_info") or {}).get("transaction_hash", "")
+    return f"{event.get('type')}:{event.get('created_at')}:{tx_hash}:{event.get('amount')}"
+
+
+def event_time(event: dict):
+    """created_at as a sortable UTC string (CVEX sends ISO strings or epoch milliseconds)"""
+    created = event.get("created_at")
+    if isinstance(created, (int, float)):
+        return datetime.fromtimestamp(created / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    return str(created or "")[:19]
+
+
+def classify(event_type: str):
+    """Ledger column a transaction type feeds; deposits, withdrawals and transfers don't count"""
+    event_type = (event_type or "").lower()
+    if "funding" in event_type:
+        return "funding"
+    if "fee" in event_type or "commission" in event_type:
+        return "fees"
+    if "pnl" in event_type or "realized" in event_type or "settlement" in event_type or "close" in event_type:
+        return "realized"
+    return None
+
+
+def _load_cursor(user_id: str):
+    """(last_time, keys already ingested at last_time)"""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT last_time, seen_keys FROM pnl_cursors WHERE user_id = ?", (user_id,))
+    row = c.fetchone()
+    conn.close()
+    if not row:
+        return None, set()
+    return row[0], set(json.loads(row[1] or "[]"))
+
+
+def new_events(events, last_time: str, seen_keys: set):
+    """
+    Take from a newest-first stream until it's older than the cursor; events
+    at exactly last_time are skipped only if their key was ingested already.
+    """
+    for event in events:
+        if last_time is not None:
+            moment = event_time(event)
+            if moment < last_time:
+                return
+            if moment == last_time and event_key(event) in seen_keys:
+                continue
+        yield event
+
+
+def ingest(user_id: str, events: list, last_time: str = None, seen_keys: set = frozenset()):
+    """
+    Fold new events (newest first) into the daily buckets and move the cursor.
+    One dict update per event, then one upsert per touched bucket, all in one transaction.
+    """
+    buckets = {}
+    for event in events:
+        column = classify(event.get("type"))
+        if column is None:
+            continue
+        symbol = (event.get("contract_info") or {}).get("symbol") or "-"
+        bucket = buckets.setdefault((event_time(event)[:10], symbol), {
+            "realized": 0.0, "fees": 0.0, "funding": 0.0, "wins": 0, "losses": 0, "events": 0})
+        amount = _float(event.get("amount"))
+        bucket[column] += amount
+        bucket["events"] += 1
+        if column == "realized" and amount:
+            bucket["wins" if amount > 0 else "losses"] += 1
+
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO pnl_daily (user_id, day, symbol, realized, fees, funding, wins, losses, events) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (user_id, day, symbol) DO UPDATE SET "
+        "realized = realized + excluded.realized, fees = fees + excluded.fees, "
+        "funding = funding + excluded.funding, wins = wins + excluded.wins, "
+        "losses = losses + excluded.losses, events = events + excluded.events",
+        [(user_id, day, symbol, b["realized"], b["fees"], b["funding"], b["wins"], b["losses"], b["events"])
+         for (day, symbol), b in buckets.items()])
+    newest, keys = last_time, set(seen_keys)
+    if events:
+        newest = max(event_time(event) for event in events)
+        keys = {event_key(event) for event in events if event_time(event) == newest}
+        if newest == last_time:
+            keys |= seen_keys
+    # written even with nothing new, so the background job knows this ledger
+    c.execute(
+        "INSERT OR REPLACE INTO pnl_cursors (user_id, last_time, seen_keys, synced_at) VALUES (?, ?, ?, ?)",
+        (user_id, newest, json.dumps(sorted(keys)), time.time()))
+    conn.commit()
+    conn.close()
+    return len(events)
+
+
+def record_gap(user_id: str, after_time: str, before_time: str):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("INSERT INTO pnl_gaps (user_id, after_time, before_time, recorded_at) VALUES (?, ?, ?, ?)",
+              (user_id, after_time, before_time, time.time()))
+    conn.commit()
+    conn.close()
+
+
+def gap_count(user_id: str):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT COUNT(*) FROM pnl_gaps WHERE user_id = ?", (user_id,))
+    count, = c.fetchone()
+    conn.close()
+    return count
+
+
+def _fetch_and_ingest(user_id: str, headers: dict):
+    last_time, seen_keys = _load_cursor(user_id)
+    truncated = []
+
+    def on_truncated():
+        truncated.append(True)
+        if not last_time:
+            logger.warning(f"PnL ledger for {user_id} starts at the oldest page CVEX returned")
+
+    history = iter_history("transactions", headers, PAGE_SIZE, on_truncated=on_truncated)
+    events = list(new_events(history, last_time, seen_keys))
+    if truncated and last_time and events:
+        # CVEX stopped before reaching the cursor: note the hole and move on rather than retry forever
+        oldest = min(event_time(event) for event in events)
+        logger.warning(f"PnL ledger for {user_id} has a gap between {last_time} and {oldest}")
+        record_gap(user_id, last_time, oldest)
+    return ingest(user_id, events, last_time, seen_keys)
+
+
+async def sync(user_id: str, force: bool = False):
+    """Top up the user's ledger; a no-op while it's younger than SYNC_TTL"""
+    lock = _locks.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        if not force and time.time() - _synced.get(user_id, 0) < SYNC_TTL:
+            return 0
+        with readonly_key(user_id):
+            headers = history_headers("transactions")
+        added = await asyncio.to_thread(_fetch_and_ingest, user_id, headers)
+        _synced[user_id] = time.time()
+        return added
+
+
+def summary(user_id: str, days: int = None):
+    """Per-contract totals over the last `days` UTC calendar days (None = everything)"""
+    query = ("SELECT symbol, SUM(realized), SUM(fees), SUM(funding), SUM(wins), SUM(losses) "
+             "FROM pnl_daily WHERE user_id = ?")
+    params = [user_id]
+    if days:
+        query += " AND day >= ?"
+        params.append((datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d"))
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(query + " GROUP BY symbol", params)
+    rows = c.fetchall()
+    conn.close()
+    return {symbol: {"realized": realized, "fees": fees, "funding": funding, "wins": wins, "losses": losses}
+            for symbol, realized, fees, funding, wins, losses in rows}
+
+
+def _format_pnl(period: str, per_symbol: dict, unrealized: dict, gaps: int = 0):
+    realized = sum(row["realized"] for row in per_symbol.values())
+    fees = sum(row["fees"] for row in per_symbol.values())
+    funding = sum(row["funding"] for row in per_symbol.values())
+    wins = sum(row["wins"] for row in per_symbol.values())
+    losses = sum(row["losses"] for row in per_symbol.values())
+    open_pnl = sum(unrealized.values())
+    net = realized + fees + funding
+
+    lines = [
+        f"💹 *Anya’s PnL Ledger* ({period})",
+        "",
+        f"• Realized: `{realized:+,.2f}`",
+        f"• Fees paid: `{-fees:,.2f}`",
+        f"• Funding: `{funding:+,.2f}`",
+        f"• Net: `{net:+,.2f}` {'🟢' if net >= 0 else '🔴'}",
+        f"• Win rate: `{wins / (wins + losses) * 100:.0f}%` ({wins}W / {losses}L)" if wins + losses else
+        "• Win rate: `N/A`",
+        f"• Unrealized (open now): `{open_pnl:+,.2f}`",
+    ]
+    ranked = sorted(per_symbol.items(), key=lambda item: -abs(item[1]["realized"]))
+    if ranked:
+        lines += ["", "*Per contract*"]
+        for symbol, row in ranked[:10]:
+            lines.append(f"`{symbol:<12} {row['realized']:>+12,.2f}  fees {-row['fees']:>9,.2f}  "
+                         f"{row['wins']}W/{row['losses']}L`")
+    if gaps:
+        lines.append(f"\n⚠️ CVEX skipped part of your history {gaps} time{'s' if gaps > 1 else ''}, "
+                     f"totals may be missing some transactions")
+    return "\n".join(lines)
+
+
+@restrict_access(need_trading=False)
+async def pnl(update: Update, context: CallbackContext, user_id: str):
+    period = (context.args[0].lower() if context.args else DEFAULT_PERIOD)
+    if period not in PERIODS:
+        await update.message.reply_text(f"❌ Usage: /pnl [{'|'.join(PERIODS)}]")
+        return
+
+    try:
+        await sync(user_id)
+    except Exception as e:
+        # stale numbers beat no numbers, say so and carry on
+        logger.error(f"PnL sync failed for {user_id}: {e}")
+        await update.message.reply_text(f"⚠️ Couldn’t fetch new transactions, showing what Anya has. Error: {str(e)}")
+
+    try:
+        snapshot = await anya_risk.get_snapshot(user_id) or {"positions": {}}
+        unrealized = {symbol: row.get("unrealized", 0.0) for symbol, row in snapshot["positions"].items()}
+    except Exception as e:
+        logger.error(f"PnL snapshot failed for {user_id}: {e}")
+        unrealized = {}
+
+    await update.message.reply_text(
+        _format_pnl(period, summary(user_id, PERIODS[period]), unrealized, gap_count(user_id)),
+        parse_mode=ParseMode.MARKDOWN)
+
+
+async def sync_ledgers(context: CallbackContext):
+    """Job queue callback: keep known ledgers close to head so /pnl rarely waits"""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT user_id FROM pnl_cursors")
+    users = [row[0] for row in c.fetchall()]
+    conn.close()
+    for user_id in users:
+        try:
+            await sync(user_id)
+        except Exception as e:
+            logger.error(f"Background PnL sync failed for {user_id}: {e}")
+
+
+def main(app):
+    init_pnl_db()
+    app.add_handler(CommandHandler("pnl", pnl))
+    app.job_queue.run_repeating(sync_ledgers, interval=SYNC_INTERVAL, first=SYNC_INTERVAL, name="pnl_ledger")
@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+
+from end_points_handlers.cvex_handler import get_portfolio_data, get_positions_data
+from market import anya_poller
+from security.anya_security import get_user_keys
+
+logger = logging.getLogger(__name__)
+
+"""
+Local pre-trade risk model.
+Previews are priced from a cached portfolio/positions snapshot, re-marked
+with the poller's prices, so fees, leverage and liquidation price show up
+instantly. Every SAMPLE_EVERY-th preview still asks CVEX and the answer
+calibrates this user's fee rates and maintenance margin rate.
+"""
+
+SNAPSHOT_TTL = 120            # seconds, marks are refreshed from the poller in between
+SAMPLE_EVERY = 10             # one preview in N is checked against the server estimate
+DEFAULT_FEE_RATES = {"market": 0.0005, "limit": 0.0002}
+DEFAULT_MAINTENANCE_RATE = 0.02
+CALIBRATION_WEIGHT = 0.3      # EWMA weight of a new server sample
+
+# user_id -> {"equity", "required_margin", "positions": {symbol: {...}}, "updated_at"}
+snapshots = {}
+# user_id -> {"fee_rates": {type: rate}, "operational_fee": float, "maintenance_rate": float, "samples": int}
+calibration = {}
+# running accuracy of local vs server estimates (EWMA of absolute errors)
+ACCURACY = {"samples": 0, "fee_err_pct": 0.0, "leverage_err": 0.0, "liq_err_pct": 0.0}
+_previews = {}
+_refreshing = {}   # user_id -> in-flight refresh task, shared by concurrent callers
+
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _fetch(api_key: str):
+    # Key passed explicitly (no global swap), so it can run in a worker thread
+    return get_portfolio_data(api_key=api_key), get_positions_data(api_key=api_key)
+
+
+async def refresh_snapshot(user_id: str):
+    _, api_key = get_user_keys(user_id)
+    if not api_key:
+        return None
+    overview, positions = await asyncio.to_thread(_fetch, api_key)
+    if "error" in overview or "error" in positions:
+        logger.warning(f"Risk snapshot for {user_id} failed: {overview.get('error') or positions.get('error')}")
+        return None
+
+    portfolio = overview.get("portfolio", {})
+    rows = {}
+    for position in positions.get("positions", []):
+        symbol = position.get('contract_info', {}).get('symbol') or position.get('contract')
+        contracts = _float(position.get('size_contracts'))
+        assets = _float(position.get('size_assets'), contracts)
+        if not symbol or not contracts:
+            continue
+        mark = anya_poller.get_mark_price(symbol)
+        if mark is None and assets:
+            mark = abs(_float(position.get('net_value')) / assets) or None
+        rows[symbol] = {
+            "contracts": contracts,
+            "assets": assets,
+            "assets_per_contract": abs(assets / contracts) if assets else 1.0,
+            "mark": mark,
+            "unrealized": _float(position.get('unrealized_profit'))
+        }
+
+    snapshot = {
+        "equity": _float(portfolio.get('equity')),
+        "required_margin": _float(portfolio.get('positions_required_margin')),
+        "positions": rows,
+        "updated_at": time.time()
+    }
+    snapshots[user_id] = snapshot
+    return snapshot
+
+
+def cached_snapshot(user_id: str):
+    """The snapshot if it's still fresh, never touches the network"""
+    snapshot = snapshots.get(user_id)
+    if snapshot and time.time() - snapshot["updated_at"] < SNAPSHOT_TTL:
+        return snapshot
+    return None
+
+
+def _refresh_task(user_id: str):
+    task = _refreshing.get(user_id)
+    if task is None:
+        task = _refreshing[user_id] = asyncio.create_task(refresh_snapshot(user_id))
+
+        def done(finished):
+            _refreshing.pop(user_id, None)
+            if not finished.cancelled() and finished.exception():
+                logger.warning(f"Risk snapshot for {user_id} failed: {finished.exception()}")
+        task.add_done_callback(done)
+    return task
+
+
+async def get_snapshot(user_id: str, refresh: bool = True):
+    snapshot = cached_snapshot(user_id)
+    if snapshot or not refresh:
+        return snapshot
+    return await asyncio.shield(_refresh_task(user_id))
+
+
+def prefetch(user_id: str):
+    """Start a background refresh when the snapshot is stale, so the next preview can be local"""
+    if cached_snapshot(user_id) is None:
+        _refresh_task(user_id)
+
+
+def _calibration(user_id: str):
+    return calibration.setdefault(user_id, {
+        "fee_rates": dict(DEFAULT_FEE_RATES), "operational_fee": 0.0,
+        "maintenance_rate": None, "samples": 0
+    })
+
+
+def marked_positions(snapshot: dict):
+    """Positions re-marked at the latest poller prices, plus equity moved by the same PnL"""
+    equity = snapshot["equity"]
+    positions = {}
+    for symbol, position in snapshot["positions"].items():
+        mark = anya_poller.get_mark_price(symbol) or position["mark"]
+        if position["mark"] and mark:
+            equity += position["assets"] * (mark - position["mark"])
+        positions[symbol] = dict(position, mark=mark)
+    return equity, positions
+
+
+def maintenance_rate(user_id: str, snapshot: dict, positions: dict):
+    calibrated = _calibration(user_id)["maintenance_rate"]
+    if calibrated:
+        return calibrated
+    notional = sum(abs(p["assets"]) * (p["mark"] or 0) for p in positions.values())
+    if notional and snapshot["required_margin"]:
+        return snapshot["required_margin"] / notional
+    return DEFAULT_MAINTENANCE_RATE
+
+
+def liquidation_price(equity: float, other_notional: float, assets: float, mark: float, rate: float):
+    """
+    Cross-margin liquidation price of one contract with everything else held at its mark:
+    equity + assets * (P - mark) = rate * (other_notional + |assets| * P)
+    """
+    denominator = assets - rate * abs(assets)
+    if not assets or not denominator:
+        return None
+    price = (rate * other_notional - equity + assets * mark) / denominator
+    return price if price > 0 else None
+
+
+def simulate(user_id: str, orders: list, snapshot: dict = None):
+    """
+    Apply hypothetical orders in sequence and estimate each one like /trading/estimate-order.
+    :param orders: [{"contract", "type", "quantity" (signed contracts), "price" (optional)}]
+    :return: list of estimates, or None when the snapshot or a price is missing
+    Only a cached snapshot is used (see prefetch), a preview never waits on CVEX.
+    """
+    snapshot = snapshot or cached_snapshot(user_id)
+    if not snapshot:
+        return None
+    settings = _calibration(user_id)
+    equity, positions = marked_positions(snapshot)
+    rate = maintenance_rate(user_id, snapshot, positions)
+
+    estimates = []
+    for order in orders:
+        symbol = order["contract"]
+        position = positions.get(symbol)
+        mark = (position or {}).get("mark") or anya_poller.get_mark_price(symbol)
+        price = order.get("price") if order["type"] == "limit" and order.get("price") else mark
+        if not mark or not price:
+            return None
+
+        per_contract = position["assets_per_contract"] if position else 1.0
+        assets = order["quantity"] * per_contract
+        notional = abs(assets) * price
+        trading_fee = notional * settings["fee_rates"].get(order["type"], DEFAULT_FEE_RATES["market"])
+        operational_fee = settings["operational_fee"]
+
+        # Fill at price, fees come out of equity, then the position is marked again
+        equity += assets * (mark - price) - trading_fee - operational_fee
+        new_assets = (position["assets"] if position else 0.0) + assets
+        positions[symbol] = {
+            "contracts": (position["contracts"] if position else 0.0) + order["quantity"],
+            "assets": new_assets, "assets_per_contract": per_contract, "mark": mark
+        }
+
+        total_notional = sum(abs(p["assets"]) * p["mark"] for p in positions.values() if p["mark"])
+        other_notional = total_notional - abs(new_assets) * mark
+        estimates.append({
+            "trading_fee": f"{trading_fee:.6f}",
+            "operational_fee": f"{operational_fee:.6f}",
+            "new_leverage": f"{total_notional / equity:.2f}" if equity > 0 else "N/A",
+            "estimated_liquidation_price": (
+                f"{liq:.2f}" if (liq := liquidation_price(equity, other_notional, new_assets, mark, rate)) else "N/A"),
+            "source": "local"
+        })
+    return estimates
+
+
+def local_estimate(user_id: str, contract: str, side: str, order_type: str, quantity: float, price: float = None):
+    signed = quantity if side == "buy" else -quantity
+    estimates = simulate(user_id, [{"contract": contract, "type": order_type, "quantity": signed, "price": price}])
+    return estimates[0] if estimates else None
+
+
+def needs_server_estimate(user_id: str):
+    """True when CVEX should price this preview: no fresh snapshot, or it's this user's sample turn"""
+    if not cached_snapshot(user_id):
+        prefetch(user_id)
+        return True
+    return _previews.get(user_id, 0) % SAMPLE_EVERY == 0
+
+
+def count_preview(user_id: str):
+    _previews[user_id] = _previews.get(user_id, 0) + 1
+
+
+def _ewma(old: float, new: float):
+    return old + CALIBRATION_WEIGHT * (new - old)
+
+
+def _track(stat: str, error: float):
+    ACCURACY[stat] = _ewma(ACCURACY[stat], error) if ACCURACY["samples"] else error
+
+
+def calibrate(user_id: str, order: dict, local: dict, server: dict):
+    """
+    Fold a server estimate into this user's fee/margin rates and the accuracy stats.
+    :param order: {"contract", "type", "quantity" (signed contracts), "price"}
+    """
+    if not local or not server or "error" in server:
+        return
+    settings = _calibration(user_id)
+    local_fee, server_fee = _float(local.get("trading_fee")), _float(server.get("trading_fee"), None)
+    if server_fee is not None and local_fee:
+        rate = settings["fee_rates"].get(order["type"], DEFAULT_FEE_RATES["market"])
+        settings["fee_rates"][order["type"]] = _ewma(rate, rate * server_fee / local_fee)
+        _track("fee_err_pct", abs(local_fee - server_fee) / (server_fee or 1) * 100)
+    settings["operational_fee"] = _ewma(settings["operational_fee"], _float(server.get("operational_fee")))
+
+    local_leverage, server_leverage = _float(local.get("new_leverage"), None), _float(server.get("new_leverage"), None)
+    if local_leverage is not None and server_leverage is not None:
+        _track("leverage_err", abs(local_leverage - server_leverage))
+
+    # Back out the maintenance rate that reproduces the server's liquidation price
+    server_liq = _float(server.get("estimated_liquidation_price"), None)
+    snapshot = snapshots.get(user_id)
+    if server_liq and snapshot:
+        equity, positions = marked_positions(snapshot)
+        position = positions.get(order["contract"])
+        mark = (position or {}).get("mark") or anya_poller.get_mark_price(order["contract"])
+        assets = ((position or {}).get("assets", 0.0)
+                  + order["quantity"] * ((position or {}).get("assets_per_contract", 1.0)))
+        other = sum(abs(p["assets"]) * p["mark"] for s, p in positions.items() if p["mark"] and s != order["contract"])
+        if mark and other + abs(assets) * server_liq:
+            rate = (equity + assets * (server_liq - mark)) / (other + abs(assets) * server_liq)
+            if 0 < rate < 1:
+                previous = settings["maintenance_rate"]
+                settings["maintenance_rate"] = _ewma(previous, rate) if previous else rate
+        local_liq = _float(local.get("estimated_liquidation_price"), None)
+        if local_liq:
+            _track("liq_err_pct", abs(local_liq - server_liq) / server_liq * 100)
+
+    settings["samples"] += 1
+    ACCURACY["samples"] += 1
+    logger.info(
+        f"Risk model sample {ACCURACY['samples']}: fee err {ACCURACY['fee_err_pct']:.1f}%, "
+        f"leverage err {ACCURACY['leverage_err']:.2f}x, liq err {ACCURACY['liq_err_pct']:.1f}%")
@@ -0,0 +1,458 @@
+import asyncio
+import logging
+import re
+import time
+from itertools import count
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from end_points_handlers.cvex_handler import (
+    build_order_payload, presign_order, submit_presigned_order, presign_batch, submit_presigned_batch,
+    get_order_data
+)
+from market import anya_poller, anya_registry
+from security.anya_security import restrict_access, trading_key, get_user_keys
+
+logger = logging.getLogger(__name__)
+
+"""
+Execution scheduler.
+TWAP: parent split into equal market slices on a timer.
+Iceberg: only `visible` size rests on the book; the next clip goes out once the last one fills.
+"""
+
+TICK_INTERVAL = 1      # seconds between scheduler ticks
+ICEBERG_CHECK = 5      # seconds between fill checks of a resting iceberg clip
+MAX_SLICES = 100
+MAX_CHILD_ERRORS = 3   # give up on a parent after this many failed children
+MAX_LOOKUP_MISSES = 6  # failed fill checks in a row before an iceberg clip counts as an error
+
+executions = {}        # execution_id -> parent order state
+_ids = count(1)
+
+
+def parse_duration(text: str):
+    """'90s', '15m', '2h' -> seconds"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smh]?)", text.strip().lower())
+    if not match:
+        raise ValueError("Duration looks like 90s, 15m or 2h")
+    value, unit = float(match.group(1)), match.group(2) or "s"
+    return value * {"s": 1, "m": 60, "h": 3600}[unit]
+
+
+def split_quantity(quantity: float, slices: int, step: float = None):
+    """Equal children rounded down to the contract's step size, the remainder rides on the last one"""
+    if not step:
+        child = round(quantity / slices, 8)
+        legs = [child] * (slices - 1)
+        legs.append(round(quantity - child * (slices - 1), 8))
+        return legs
+    units = round(quantity / step)
+    child_units = units // slices
+    if child_units == 0:
+        raise ValueError(f"{slices} slices of {quantity:g} would be smaller than the {step:g} step")
+    child = round(child_units * step, 8)
+    return [child] * (slices - 1) + [round((units - child_units * (slices - 1)) * step, 8)]
+
+
+def fills_from_events(events: list):
+    """Pull (price, quantity) fills out of CVEX order events when they carry them"""
+    fills = []
+    for event in events or []:
+        price = event.get('price') or event.get('fill_price') or event.get('last_price')
+        quantity = event.get('filled_quantity_contracts') or event.get('quantity_contracts')
+        if price is None or quantity is None or event.get('type') == 'order_accepted':
+            continue
+        try:
+            fills.append((float(price), abs(float(quantity))))
+        except (TypeError, ValueError):
+            continue
+    return fills
+
+
+def _events_by_leg(events: list, client_ids: list):
+    """
+    Split batch events per action: by customer_order_id when CVEX echoes it,
+    otherwise the n-th new order id in the response belongs to the n-th action.
+    """
+    by_leg = {client_id: [] for client_id in client_ids}
+    order_legs = {}     # order id -> client id
+    for event in events or []:
+        order_id = event.get('order_id') or event.get('id')
+        client_id = event.get('customer_order_id')
+        if client_id not in by_leg:
+            client_id = order_legs.get(order_id)
+        if client_id is None and order_id is not None and len(order_legs) < len(client_ids):
+            client_id = client_ids[len(order_legs)]
+        if client_id is None:
+            continue
+        if order_id is not None:
+            order_legs.setdefault(order_id, client_id)
+        by_leg[client_id].append(event)
+    return by_leg
+
+
+def executed_price(details: dict, fallback: float):
+    """Average execution price of an order, the limit price only when CVEX doesn't report one"""
+    for field in ('average_fill_price', 'average_price', 'avg_price', 'fill_price'):
+        try:
+            price = float(details.get(field))
+        except (TypeError, ValueError):
+            continue
+        if price > 0:
+            return price
+    return fallback
+
+
+def _record_fill(execution: dict, price: float, quantity: float):
+    execution['filled'] += quantity
+    execution['notional'] += price * quantity
+
+
+def _average_price(execution: dict):
+    return execution['notional'] / execution['filled'] if execution['filled'] else None
+
+
+async def _record_result(execution: dict, result: dict, quantity: float):
+    """Use reported fills, otherwise ask CVEX what the child executed at"""
+    if "error" in result:
+        execution['errors'].append(result['error'])
+        return
+    order_id = result.get('order_id')
+    execution['child_ids'].append(order_id)
+    fills = fills_from_events(result.get('events'))
+    if fills:
+        for price, filled in fills:
+            _record_fill(execution, price, filled)
+        return
+    if execution['kind'] != "twap":
+        return
+
+    mark = anya_poller.get_mark_price(execution['contract'])
+    details = None
+    if order_id:
+        _, api_key = get_user_keys(execution['user_id'])
+        data = await asyncio.to_thread(get_order_data, order_id, api_key=api_key)
+        details = data.get("details") if "error" not in data else None
+    try:
+        filled = float(details['filled_quantity_contracts'])
+    except (TypeError, KeyError, ValueError):
+        # no order details: the mark is the best guess at what a market slice got
+        if mark is not None:
+            _record_fill(execution, mark, quantity)
+        return
+    price = executed_price(details, mark)
+    if filled > 0 and price is not None:
+        _record_fill(execution, price, filled)
+
+
+def _due_twap_legs(now: float):
+    due = {}
+    for execution in executions.values():
+        if execution['kind'] != "twap" or execution['done']:
+            continue
+        while execution['next_leg'] < len(execution['legs']) and \
+                execution['start'] + execution['next_leg'] * execution['interval'] <= now:
+            leg = execution['next_leg']
+            execution['next_leg'] += 1
+            due.setdefault(execution['user_id'], []).append((execution, leg, execution['legs'][leg]))
+    return due
+
+
+async def _submit_twap_legs(user_id: str, legs: list):
+    """Sign under the user's key on the loop, then do the round trip in a worker thread"""
+    if len(legs) == 1:
+        execution, _, quantity = legs[0]
+        payload = build_order_payload(execution['contract'], "market", quantity, side=execution['side'])
+        with trading_key(user_id):
+            headers = presign_order(payload)
+        result = await asyncio.to_thread(submit_presigned_order, payload, headers)
+        await _record_result(execution, result, quantity)
+        return
+
+    client_ids = [f"anya-{execution['execution_id']}-{leg}" for execution, leg, _ in legs]
+    actions = [
+        {"action": "create_order", "customer_order_id": client_id,
+         **build_order_payload(execution['contract'], "market", quantity, side=execution['side'])}
+        for client_id, (execution, _, quantity) in zip(client_ids, legs)
+    ]
+    with trading_key(user_id):
+        headers = presign_batch(actions)
+    result = await asyncio.to_thread(submit_presigned_batch, actions, headers)
+
+    if "error" in result:
+        for execution, _, _ in legs:
+            execution['errors'].append(result['error'])
+        return
+    by_leg = _events_by_leg(result.get("events"), client_ids)
+    await asyncio.gather(*(
+        _record_result(execution, {
+            "order_id": next((e.get('order_id') or e.get('id') for e in by_leg[client_id]), None),
+            "events": by_leg[client_id]
+        }, quantity)
+        for client_id, (execution, _, quantity) in zip(client_ids, legs)
+    ))
+
+
+async def _advance_iceberg(execution: dict, now: float):
+    if execution['done'] or now - execution['last_check'] < ICEBERG_CHECK:
+        return
+    execution['last_check'] = now
+
+    if execution['resting_id']:
+        _, api_key = get_user_keys(execution['user_id'])
+        data = await asyncio.to_thread(get_order_data, execution['resting_id'], api_key=api_key)
+        details = data.get("details") if "error" not in data else None
+        try:
+            opened = float(details['opened_quantity_contracts'])
+            filled = float(details.get('filled_quantity_contracts', 0))
+        except (TypeError, KeyError, ValueError):
+            # status unknown: check again next time, count it as an error if it keeps failing
+            execution['lookup_misses'] += 1
+            if execution['lookup_misses'] >= MAX_LOOKUP_MISSES:
+                execution['lookup_misses'] = 0
+                execution['errors'].append(
+                    f"clip {execution['resting_id']} status unknown: {data.get('error', 'no order details')}")
+            return
+        execution['lookup_misses'] = 0
+        if opened > 0:
+            return
+        _record_fill(execution, executed_price(details, execution['limit_price']), filled)
+        execution['resting_id'] = None
+
+    remaining = round(execution['quantity'] - execution['submitted'], 8)
+    if remaining <= 0 or execution['done']:     # /stop_execution may land during the lookup
+        return
+    clip = min(execution['visible'], remaining)
+    payload = build_order_payload(execution['contract'], "limit", clip,
+                                  price=execution['limit_price'], side=execution['side'])
+    with trading_key(execution['user_id']):
+        headers = presign_order(payload)
+    result = await asyncio.to_thread(submit_presigned_order, payload, headers)
+    if "error" in result:
+        execution['errors'].append(result['error'])
+        return
+    execution['submitted'] += clip
+    execution['resting_id'] = result.get('order_id')
+    execution['child_ids'].append(result.get('order_id'))
+
+
+def _is_finished(execution: dict):
+    if len(execution['errors']) >= MAX_CHILD_ERRORS:
+        return True
+    if execution['kind'] == "twap":
+        return execution['next_leg'] >= len(execution['legs'])
+    return execution['submitted'] >= execution['quantity'] and not execution['resting_id']
+
+
+async def _report(context: CallbackContext, execution: dict):
+    average = _average_price(execution)
+    arrival = execution['arrival_price']
+    lines = [
+        f"🧊 *{execution['kind'].upper()} #{execution['execution_id']} Done!*",
+        "",
+        f"• {execution['side'].upper()} {execution['quantity']:g} {execution['contract']}",
+        f"• Child Orders: {len(execution['child_ids'])}",
+        f"• Filled: {execution['filled']:g}",
+    ]
+    if average is not None:
+        lines.append(f"• Avg Price: ${average:,.2f}")
+    if average is not None and arrival:
+        sign = 1 if execution['side'] == "buy" else -1
+        slippage_bps = sign * (average - arrival) / arrival * 10_000
+        lines.append(f"• Arrival Price: ${arrival:,.2f}")
+        lines.append(f"• Slippage vs Arrival: {slippage_bps:+.1f} bps")
+    if execution['errors']:
+        lines.append(f"• ⚠️ {len(execution['errors'])} child errors (last: {execution['errors'][-1]})")
+    if execution.get('resting_id'):
+        lines.append(f"• Resting clip `{execution['resting_id']}` may still be live - /cancel_live_order it if needed")
+    try:
+        await context.bot.send_message(chat_id=execution['chat_id'], text="\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+    except Exception as e:
+        logger.error(f"Execution report failed: {e}")
+
+
+async def run_scheduler(context: CallbackContext):
+    """Job queue callback: submit due legs, batching legs that come due together"""
+    now = time.time()
+
+    for user_id, legs in _due_twap_legs(now).items():
+        try:
+            await _submit_twap_legs(user_id, legs)
+        except Exception as e:
+            logger.error(f"TWAP legs for {user_id} failed: {e}", exc_info=True)
+
+    for execution in list(executions.values()):
+        if execution['kind'] == "iceberg":
+            try:
+                await _advance_iceberg(execution, now)
+            except Exception as e:
+                logger.error(f"Iceberg #{execution['execution_id']} failed: {e}", exc_info=True)
+
+        if not execution['done'] and _is_finished(execution):
+            execution['done'] = True
+            await _report(context, execution)
+            executions.pop(execution['execution_id'], None)
+
+
+def _new_execution(update: Update, user_id: str, kind: str, contract: str, side: str, quantity: float):
+    execution_id = next(_ids)
+    execution = {
+        "execution_id": execution_id,
+        "kind": kind,
+        "user_id": user_id,
+        "chat_id": update.effective_chat.id,
+        "contract": contract,
+        "side": side,
+        "quantity": quantity,
+        "arrival_price": anya_poller.get_mark_price(contract),
+        "filled": 0.0,
+        "notional": 0.0,
+        "child_ids": [],
+        "errors": [],
+        "done": False
+    }
+    executions[execution_id] = execution
+    return execution
+
+
+def _parse_parent(args: list):
+    """:return: (symbol, side, quantity, step size or None)"""
+    contract, side = args[0].upper(), args[1].lower()
+    if side not in ["buy", "sell"]:
+        raise ValueError("Side must be 'buy' or 'sell'")
+    quantity = float(args[2])
+    if quantity <= 0:
+        raise ValueError("Quantity must be positive!")
+    info, error = anya_registry.validate_order(contract, quantity)
+    if error:
+        raise ValueError(error)
+    if info:
+        return info.symbol, side, quantity, info.step_size
+    return contract, side, quantity, None
+
+
+@restrict_access(need_trading=True)
+async def twap(update: Update, context: CallbackContext, user_id: str):
+    if len(context.args) < 4:
+        await update.message.reply_text(
+            "Usage: /twap <contract> <buy/sell> <quantity> <duration> [slices]\n"
+            "Example: /twap BTC-PERP buy 10 30m 12"
+        )
+        return
+    try:
+        contract, side, quantity, step = _parse_parent(context.args)
+        duration = parse_duration(context.args[3])
+        slices = int(context.args[4]) if len(context.args) > 4 else max(2, min(MAX_SLICES, int(duration // 60) or 2))
+        if not 1 <= slices <= MAX_SLICES:
+            raise ValueError(f"Slices must be between 1 and {MAX_SLICES}")
+        legs = split_quantity(quantity, slices, step)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Anya can’t slice that! Error: {str(e)}")
+        return
+
+    execution = _new_execution(update, user_id, "twap", contract, side, quantity)
+    execution.update({
+        "legs": legs,
+        "interval": duration / slices,
+        "start": time.time(),
+        "next_leg": 0
+    })
+    await update.message.reply_text(
+        f"⏱ *TWAP #{execution['execution_id']} Started!*\n\n"
+        f"• {side.upper()} {quantity:g} {contract}\n"
+        f"• {slices} slices of ~{execution['legs'][0]:g} every {execution['interval']:.0f}s\n"
+        f"• Arrival Price: ${execution['arrival_price'] or 0:,.2f}\n\n"
+        f"Stop with /stop_execution {execution['execution_id']}",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+@restrict_access(need_trading=True)
+async def iceberg(update: Update, context: CallbackContext, user_id: str):
+    if len(context.args) < 5:
+        await update.message.reply_text(
+            "Usage: /iceberg <contract> <buy/sell> <quantity> <visible_qty> <limit_price>\n"
+            "Example: /iceberg BTC-PERP sell 20 2 65000"
+        )
+        return
+    try:
+        contract, side, quantity, _ = _parse_parent(context.args)
+        visible = float(context.args[3])
+        limit_price = float(context.args[4])
+        if visible <= 0 or visible > quantity or limit_price <= 0:
+            raise ValueError("Visible size must be positive and at most the total; price must be positive")
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Anya can’t hide that iceberg! Error: {str(e)}")
+        return
+
+    execution = _new_execution(update, user_id, "iceberg", contract, side, quantity)
+    execution.update({
+        "visible": visible,
+        "limit_price": limit_price,
+        "submitted": 0.0,
+        "resting_id": None,
+        "last_check": 0.0,
+        "lookup_misses": 0
+    })
+    await update.message.reply_text(
+        f"🧊 *Iceberg #{execution['execution_id']} Started!*\n\n"
+        f"• {side.upper()} {quantity:g} {contract} @ ${limit_price:,.2f}\n"
+        f"• Showing {visible:g} at a time\n\n"
+        f"Stop with /stop_execution {execution['execution_id']}",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+@restrict_access(need_trading=True)
+async def list_executions(update: Update, context: CallbackContext, user_id: str):
+    mine = [e for e in executions.values() if e['user_id'] == user_id]
+    if not mine:
+        await update.message.reply_text("📭 No running executions. Try /twap or /iceberg")
+        return
+
+    lines = ["🧊 *Running Executions*", ""]
+    for execution in mine:
+        if execution['kind'] == "twap":
+            progress = f"{execution['next_leg']}/{len(execution['legs'])} slices"
+        else:
+            progress = f"{execution['submitted']:g}/{execution['quantity']:g} shown"
+        average = _average_price(execution)
+        lines.append(
+            f"• #{execution['execution_id']} {execution['kind'].upper()} {execution['side'].upper()} "
+            f"{execution['quantity']:g} {execution['contract']} - {progress}"
+            + (f", avg ${average:,.2f}" if average else ""))
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+
+@restrict_access(need_trading=True)
+async def stop_execution(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        await update.message.reply_text("Usage: /stop_execution <execution_id>")
+        return
+    try:
+        execution_id = int(context.args[0].lstrip('#'))
+    except ValueError:
+        await update.message.reply_text("❌ Execution IDs are numbers, b-baka!")
+        return
+
+    execution = executions.get(execution_id)
+    if not execution or execution['user_id'] != user_id:
+        await update.message.reply_text("🤔 Anya can’t find that execution!")
+        return
+
+    execution['done'] = True
+    executions.pop(execution_id, None)
+    note = f"\nResting clip `{execution['resting_id']}` is still live - /cancel_live_order it if needed." \
+        if execution.get('resting_id') else ""
+    await update.message.reply_text(f"🛑 Execution #{execution_id} stopped!{note}", parse_mode=ParseMode.MARKDOWN)
+
+
+def main(app):
+    app.job_queue.run_repeating(
+        run_scheduler, interval=TICK_INTERVAL, first=1, name="execution_scheduler")
+    app.add_handler(CommandHandler("twap", twap))
+    app.add_handler(CommandHandler("iceberg", iceberg))
+    app.add_handler(CommandHandler("executions", list_executions))
+    app.add_handler(CommandHandler("stop_execution", stop_execution))
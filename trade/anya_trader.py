@@ -7,9 +7,15 @@ from telegram.ext import (
     filters
 )
 from telegram.constants import ParseMode
+import asyncio
 import logging
-from end_points_handlers.cvex_handler import send_order, estimate_order, list_contracts
+import time
+from end_points_handlers.cvex_handler import (
+    send_order, list_contracts, build_order_payload, presign_estimate, submit_presigned_estimate
+)
 from security.anya_security import restrict_access, trading_key
+from market import anya_orderbook
+from trade import anya_risk, anya_paper
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +38,67 @@ STATE_CONFIRM = 'confirm_order'
 # Dummy contracts
 DUMMY_CONTRACTS = ["BTC-PERP", "ETH-PERP", "SOL-PERP"]
 
+# Seconds a speculative estimate is trusted for the confirmation screen
+SPECULATION_TTL = 20
+
+
+def _estimate_key(order: dict):
+    price = order.get('price') if order.get('type') == 'limit' else None
+    return (order['contract'], order['side'], order['type'], float(order['quantity']),
+            float(price) if price else None)
+
+
+def _start_estimate(context: CallbackContext, user_id: str, order: dict):
+    """Sign on the loop (the key swap is global), run the round trip in a thread"""
+    speculative = context.user_data['start_order'].setdefault('speculative', {})
+    key = _estimate_key(order)
+    entry = speculative.get(key)
+    if entry and time.time() - entry['created'] < SPECULATION_TTL:
+        return entry['task']
+
+    payload = build_order_payload(
+        order['contract'], order['type'], order['quantity'], key[4], "GTC", order['side'])
+    with trading_key(user_id):
+        headers = presign_estimate(payload)
+    task = asyncio.create_task(asyncio.to_thread(
+        submit_presigned_estimate, payload, headers))
+    speculative[key] = {'task': task, 'created': time.time()}
+    return task
+
+
+def _cancel_speculation(user_data: dict, keep=None):
+    for key, entry in list(user_data.get('speculative', {}).items()):
+        if key != keep:
+            entry['task'].cancel()
+            del user_data['speculative'][key]
+
+
+def _speculate(update: Update, context: CallbackContext):
+    """
+    Guess the estimate the confirmation screen will need (the user's previous
+    quantity, and previous price for limits on the same contract) and fetch it now.
+    """
+    user_data = context.user_data.get('start_order', {})
+    order = user_data.get('data', {})
+    if user_data.get('is_dummy') or not all(k in order for k in ('contract', 'side', 'type')):
+        return
+    if not anya_risk.needs_server_estimate(str(update.effective_user.id)):
+        return
+
+    last = context.user_data.get('last_order', {})
+    guess = dict(order)
+    guess.setdefault('quantity', last.get('quantity', 1))
+    if order['type'] == 'limit':
+        if 'price' not in order:
+            if last.get('contract') != order['contract'] or not last.get('price'):
+                return
+            guess['price'] = last['price']
+
+    try:
+        _start_estimate(context, str(update.effective_user.id), guess)
+    except Exception as e:
+        logger.warning(f"Speculative estimate skipped: {e}")
+
 
 @restrict_access(need_trading=True)
 async def start_order(update: Update, context: CallbackContext, user_id: str):
@@ -96,6 +163,7 @@ async def handle_order_buttons(update: Update, context: CallbackContext):
 
     if data == "order_cancel":
         await query.edit_message_text("🚫 Anya cancelled the order flow! Back to spying... 🧠")
+        _cancel_speculation(user_data)
         context.user_data.pop('start_order', None)
         return
 
@@ -139,6 +207,7 @@ async def handle_order_buttons(update: Update, context: CallbackContext):
         order_type = data.split("_")[-1]
         user_data['data']['type'] = order_type
         user_data['state'] = STATE_QUANTITY
+        _speculate(update, context)
 
         await query.edit_message_text(
             f"🔢 *How many for this {order_type} order?*\n\n"
@@ -147,6 +216,7 @@ async def handle_order_buttons(update: Update, context: CallbackContext):
         )
 
     elif data == "order_back":
+        _cancel_speculation(user_data)
         if state == STATE_SIDE:
             await start_order(Update(update._effective_chat.id, query.message), context)
         elif state == STATE_TYPE:
@@ -213,6 +283,7 @@ async def handle_quantity_input(update: Update, context: CallbackContext):
             user_data['data']['quantity'] = quantity
             if user_data['data']['type'] == 'limit':
                 user_data['state'] = STATE_PRICE
+                _speculate(update, context)
                 await update.message.reply_text(
                     "💵 *What’s your limit price, huh?*\n\n"
                     "Type a price (e.g., `50000` for $50,000)",
@@ -254,22 +325,51 @@ async def confirm_order(update: Update, context: CallbackContext):
 
     quantity = order['quantity']
     side = order['side']
+    fill = None
 
     if user_data.get('is_dummy'):
-        est = {
-            'trading_fee': '0.001',
-            'operational_fee': '0.0005',
-            'new_leverage': '10',
-            'estimated_liquidation_price': '45000' if side == 'buy' else '55000'
-        }
+        # CVEX is down: price it on the paper book instead
+        try:
+            est = await anya_paper.estimate(
+                str(update.effective_user.id), order['contract'], side, order['type'], quantity, order.get('price'))
+        except Exception as e:
+            est = {"error": str(e)}
     else:
-        est = estimate_order(
-            contract=order['contract'],
-            order_type=order['type'],
-            quantity=quantity,
-            price=order.get('price') if order['type'] == 'limit' else None,
-            side=side
-        )
+        user_id = str(update.effective_user.id)
+        price = order.get('price') if order['type'] == 'limit' else None
+        # the book walk runs alongside whichever estimate is used below
+        fill_task = asyncio.create_task(anya_orderbook.fill_preview(order['contract'], side, quantity, price))
+        sample = anya_risk.needs_server_estimate(user_id)
+        try:
+            local = anya_risk.local_estimate(user_id, order['contract'], side, order['type'], quantity, price)
+        except Exception as e:
+            logger.warning(f"Local estimate failed: {e}")
+            local = None
+
+        if local and not sample:
+            _cancel_speculation(user_data)
+            est = local
+        else:
+            # Re-use a speculative estimate for the same inputs, drop the stale guesses
+            try:
+                task = _start_estimate(context, user_id, order)
+                _cancel_speculation(user_data, keep=_estimate_key(order))
+                est = await task
+            except Exception as e:
+                est = {"error": str(e)}
+            anya_risk.calibrate(user_id, {
+                'contract': order['contract'], 'type': order['type'],
+                'quantity': quantity if side == 'buy' else -quantity, 'price': price
+            }, local, est)
+            if 'error' in est and local:
+                est = local
+        anya_risk.count_preview(user_id)
+        fill = await fill_task
+        context.user_data['last_order'] = {
+            'contract': order['contract'],
+            'quantity': quantity,
+            'price': order.get('price')
+        }
 
     msg = [
         f"🔮 *Order Summary*: {order['contract']}",
@@ -288,10 +388,16 @@ async def confirm_order(update: Update, context: CallbackContext):
             f"├─ Fees: ${float(est.get('trading_fee', 0)) + float(est.get('operational_fee', 0)):.2f}",
             f"├─ New Leverage: {est.get('new_leverage', 'N/A')}x",
             f"└─ Liq. Price: ${est.get('estimated_liquidation_price', 'N/A')}"
+            + (" _(Anya’s math)_" if est.get('source') == 'local' else "")
         ])
+        if est.get('source') == 'paper':
+            msg.append(f"🧻 Paper fill: ~${est['fill_price']} ({est['filled']:g} of {quantity} from the book)")
     else:
         logger.error(f"Estimate failed: {est.get('error', 'Unknown error')}")
         msg.append("\n⚠️ *Estimation unavailable* - Anya’s guessing for now!")
+    book_lines = anya_orderbook.format_fill(fill)
+    if book_lines:
+        msg.extend([""] + book_lines)
 
     reply_markup = InlineKeyboardMarkup([
         [InlineKeyboardButton("✅ Confirm", callback_data="order_confirm")],
@@ -323,27 +429,25 @@ async def handle_order_confirmation(update: Update, context: CallbackContext):
 
     try:
         if user_data.get('is_dummy'):
-            result = {
-                'order_id': f"IMAG-{order['contract'][:3]}{int(quantity*100)}",
-                'contract': order['contract'],
-                'status': 'filled'
-            }
-        else:
-            result = send_order(
-                contract=order['contract'],
-                order_type=order['type'],
-                quantity=quantity,
-                price=order.get('price'),
-                side=side
-            )
+            result = await anya_paper.place_order(
+                str(update.effective_user.id), order['contract'], side, order['type'], quantity,
+                order.get('price'), query.message.chat_id)
+            await query.edit_message_text(anya_paper.format_result(result), parse_mode=ParseMode.MARKDOWN)
+            return
+
+        result = send_order(
+            contract=order['contract'],
+            order_type=order['type'],
+            quantity=quantity,
+            price=order.get('price'),
+            side=side
+        )
 
         if "error" in result:
             await query.edit_message_text(f"❌ Anya failed to place the order! (×﹏×)\nError: {result['error']}")
         else:
-            prefix = "🎉 *Imaginary Order Placed!* (Anya’s pretending!)" if user_data.get(
-                'is_dummy') else "✅ *Order Placed! Waku Waku!* 🎉"
             await query.edit_message_text(
-                f"{prefix}\n\n"
+                "✅ *Order Placed! Waku Waku!* 🎉\n\n"
                 f"• ID: `{result['order_id']}`\n"
                 f"• Contract: `{result['contract']}`\n"
                 f"• Status: `{result['status']}`",
@@ -353,11 +457,13 @@ async def handle_order_confirmation(update: Update, context: CallbackContext):
         logger.error(f"Order execution failed: {str(e)}", exc_info=True)
         await query.edit_message_text(f"💥 Anya messed up the trade! (╯°□°)╯\nError: {str(e)}")
     finally:
+        _cancel_speculation(user_data)
         context.user_data.pop('start_order', None)
 
 
 async def cancel_order(update: Update, context: CallbackContext):
     if 'start_order' in context.user_data:
+        _cancel_speculation(context.user_data['start_order'])
         context.user_data.pop('start_order')
         await update.message.reply_text("🚫 Order flow cancelled! Anya’s free now!")
     else:
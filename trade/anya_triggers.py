@@ -0,0 +1,394 @@
+import asyncio
+import sqlite3
+import logging
+import time
+from collections import deque
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from alerts.threshold_book import ThresholdBook, ABOVE, BELOW
+from end_points_handlers.cvex_handler import (
+    build_order_payload, presign_order, submit_presigned_order, presign_batch, submit_presigned_batch
+)
+from market import anya_poller, anya_registry
+from security.anya_security import restrict_access, trading_key, add_trading_key_listener, DB_PATH
+
+logger = logging.getLogger(__name__)
+
+"""
+Client-side stop-loss / take-profit / trailing-stop.
+Orders are built and signed when armed, so a trigger only has to POST.
+"""
+
+STOP_LOSS = "stop_loss"
+TAKE_PROFIT = "take_profit"
+TRAILING_STOP = "trailing_stop"
+LATENCY_TARGET_MS = 50  # poll receipt -> submit, excluding network
+MAX_FIRE_ATTEMPTS = 3   # failed submits stay armed and retry on the next polls this many times
+
+book = ThresholdBook()   # fixed stop-loss / take-profit levels
+triggers = {}            # trigger_id -> armed trigger
+trailing = {}            # symbol -> set of trailing trigger ids
+retry_symbols = set()    # contracts with a failed trigger to re-check even if the mark didn't move
+latencies = deque(maxlen=200)
+
+
+def init_triggers_db():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "CREATE TABLE IF NOT EXISTS trigger_orders (trigger_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, "
+        "chat_id INTEGER, kind TEXT, contract TEXT, side TEXT, quantity REAL, trigger_price REAL, "
+        "trail_pct REAL, extreme_price REAL, created_at REAL)")
+    conn.commit()
+    conn.close()
+
+
+def trigger_direction(kind: str, side: str):
+    """Stops fire against the position, take-profits with it"""
+    if kind == STOP_LOSS:
+        return BELOW if side == "sell" else ABOVE
+    return ABOVE if side == "sell" else BELOW
+
+
+def trailing_stop_price(trigger: dict):
+    if trigger['side'] == "sell":
+        return trigger['extreme_price'] * (1 - trigger['trail_pct'] / 100)
+    return trigger['extreme_price'] * (1 + trigger['trail_pct'] / 100)
+
+
+def _sign(trigger: dict):
+    """Build and sign the market order under the user's current trading key"""
+    trigger['payload'] = build_order_payload(
+        trigger['contract'], "market", trigger['quantity'], side=trigger['side'])
+    with trading_key(trigger['user_id']):
+        trigger['headers'] = presign_order(trigger['payload'])
+
+
+def _arm(trigger: dict):
+    """Pre-build and pre-sign the market order, then index the trigger"""
+    _sign(trigger)
+    trigger['attempts'] = 0
+    _index(trigger)
+
+
+def resign_user(user_id: str):
+    """Trading key listener: re-sign the user's armed triggers so a rotated key doesn't disarm them"""
+    for trigger in [trigger for trigger in triggers.values() if trigger['user_id'] == user_id]:
+        try:
+            _sign(trigger)
+        except Exception as e:
+            logger.error(f"Could not re-sign trigger {trigger['trigger_id']}: {e}")
+
+
+def _index(trigger: dict):
+    triggers[trigger['trigger_id']] = trigger
+    if trigger['kind'] == TRAILING_STOP:
+        trailing.setdefault(trigger['contract'], set()).add(trigger['trigger_id'])
+    else:
+        book.add(trigger['trigger_id'], trigger['contract'],
+                 trigger_direction(trigger['kind'], trigger['side']), trigger['trigger_price'])
+
+
+def _disarm(trigger_id: int):
+    trigger = triggers.pop(trigger_id, None)
+    if not trigger:
+        return None
+    book.remove(trigger_id)
+    ids = trailing.get(trigger['contract'])
+    if ids:
+        ids.discard(trigger_id)
+        if not ids:
+            trailing.pop(trigger['contract'], None)
+    return trigger
+
+
+def load_triggers():
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute("SELECT trigger_id, user_id, chat_id, kind, contract, side, quantity, trigger_price, trail_pct, "
+              "extreme_price FROM trigger_orders")
+    rows = c.fetchall()
+    conn.close()
+
+    columns = ("trigger_id", "user_id", "chat_id", "kind", "contract", "side",
+               "quantity", "trigger_price", "trail_pct", "extreme_price")
+    for row in rows:
+        try:
+            _arm(dict(zip(columns, row)))
+        except Exception as e:
+            logger.error(f"Could not re-arm trigger {row[0]}: {e}")
+    logger.info(f"Armed {len(triggers)} trigger orders")
+
+
+def store_trigger(trigger: dict):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO trigger_orders (user_id, chat_id, kind, contract, side, quantity, trigger_price, trail_pct, "
+        "extreme_price, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (trigger['user_id'], trigger['chat_id'], trigger['kind'], trigger['contract'], trigger['side'],
+         trigger['quantity'], trigger['trigger_price'], trigger['trail_pct'], trigger['extreme_price'], time.time()))
+    trigger['trigger_id'] = c.lastrowid
+    conn.commit()
+    conn.close()
+    _arm(trigger)
+    return trigger['trigger_id']
+
+
+def delete_triggers(trigger_ids: list):
+    if not trigger_ids:
+        return
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.executemany("DELETE FROM trigger_orders WHERE trigger_id = ?",
+                  [(trigger_id,) for trigger_id in trigger_ids])
+    conn.commit()
+    conn.close()
+    for trigger_id in trigger_ids:
+        _disarm(trigger_id)
+
+
+def _save_extremes(moved: list):
+    if not moved:
+        return
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.executemany("UPDATE trigger_orders SET extreme_price = ? WHERE trigger_id = ?",
+                  [(triggers[trigger_id]['extreme_price'], trigger_id) for trigger_id in moved if trigger_id in triggers])
+    conn.commit()
+    conn.close()
+
+
+def _due_triggers(changed: dict):
+    due, moved = [], []
+    symbols = set(changed) | retry_symbols
+    retry_symbols.clear()
+    for symbol in symbols:
+        price = anya_poller.get_mark_price(symbol)
+        if price is None:
+            continue
+
+        for trigger_id, *_ in book.crossed(symbol, price):
+            if trigger_id in triggers:
+                due.append((triggers[trigger_id], price))
+
+        for trigger_id in list(trailing.get(symbol, ())):
+            trigger = triggers[trigger_id]
+            if trigger['extreme_price'] is None or \
+                    (trigger['side'] == "sell" and price > trigger['extreme_price']) or \
+                    (trigger['side'] == "buy" and price < trigger['extreme_price']):
+                trigger['extreme_price'] = price
+                moved.append(trigger_id)
+                continue
+            stop = trailing_stop_price(trigger)
+            if (trigger['side'] == "sell" and price <= stop) or (trigger['side'] == "buy" and price >= stop):
+                trailing[symbol].discard(trigger_id)
+                due.append((trigger, price))
+    return due, moved
+
+
+async def on_market_poll(context: CallbackContext, changed: dict, received: float):
+    """Poller listener: the trigger loop, timed from the moment the poll response arrived"""
+    due, moved = _due_triggers(changed)
+    _save_extremes(moved)
+    if not due:
+        return
+
+    by_user = {}
+    for trigger, price in due:
+        by_user.setdefault(trigger['user_id'], []).append((trigger, price))
+
+    async def fire(user_id, items):
+        if len(items) == 1:
+            trigger = items[0][0]
+            latency_ms = (time.perf_counter() - received) * 1000
+            result = await asyncio.to_thread(submit_presigned_order, trigger['payload'], trigger['headers'])
+        else:
+            # The batch depends on which triggers crossed together: sign it now, POST off the loop
+            actions = [{"action": "create_order", **trigger['payload']} for trigger, _ in items]
+            with trading_key(user_id):
+                headers = presign_batch(actions)
+            latency_ms = (time.perf_counter() - received) * 1000
+            result = await asyncio.to_thread(submit_presigned_batch, actions, headers)
+        return items, result, latency_ms
+
+    # Users fire concurrently so one slow round trip never delays the next submit
+    outcomes = await asyncio.gather(*(fire(user_id, items) for user_id, items in by_user.items()))
+
+    fired = []
+    for items, result, latency_ms in outcomes:
+        latencies.append(latency_ms)
+        if latency_ms > LATENCY_TARGET_MS:
+            logger.warning(f"Trigger submit latency {latency_ms:.1f}ms over {LATENCY_TARGET_MS}ms target")
+
+        for trigger, price in items:
+            if "error" not in result:
+                fired.append(trigger['trigger_id'])
+                status = "✅ Sent to CVEX"
+            else:
+                trigger['attempts'] += 1
+                if triggers.get(trigger['trigger_id']) is not trigger:
+                    status = f"❌ Failed: {result['error']} (trigger was cancelled meanwhile)"
+                elif trigger['attempts'] < MAX_FIRE_ATTEMPTS:
+                    try:
+                        # the key may have changed since arming, retry with fresh headers
+                        _sign(trigger)
+                    except Exception as e:
+                        logger.error(f"Could not re-sign trigger {trigger['trigger_id']}: {e}")
+                    _index(trigger)
+                    retry_symbols.add(trigger['contract'])
+                    status = (f"❌ Failed: {result['error']}\n"
+                              f"• Still armed, retrying next poll ({trigger['attempts']}/{MAX_FIRE_ATTEMPTS})")
+                else:
+                    fired.append(trigger['trigger_id'])
+                    status = f"❌ Failed {MAX_FIRE_ATTEMPTS} times, disarmed: {result['error']}"
+            try:
+                await context.bot.send_message(
+                    chat_id=trigger['chat_id'],
+                    text=(
+                        f"⚡ *{trigger['kind'].replace('_', ' ').title()} Fired!*\n\n"
+                        f"• #{trigger['trigger_id']} {trigger['side'].upper()} {trigger['quantity']:g} {trigger['contract']}\n"
+                        f"• Mark Price: ${price:,.2f}\n"
+                        f"• Poll → Submit: {latency_ms:.1f}ms\n"
+                        f"• {status}"
+                    ),
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            except Exception as e:
+                logger.error(f"Trigger {trigger['trigger_id']} notification failed: {e}")
+
+    delete_triggers(fired)
+
+
+async def _create_trigger(update: Update, context: CallbackContext, user_id: str, kind: str):
+    usage = {
+        STOP_LOSS: "/stop_loss <contract> <buy/sell> <quantity> <stop_price>\nExample: /stop_loss BTC-PERP sell 1 58000",
+        TAKE_PROFIT: "/take_profit <contract> <buy/sell> <quantity> <target_price>\nExample: /take_profit BTC-PERP sell 1 72000",
+        TRAILING_STOP: "/trailing_stop <contract> <buy/sell> <quantity> <trail_percent>\nExample: /trailing_stop BTC-PERP sell 1 3"
+    }[kind]
+    if len(context.args) < 4:
+        await update.message.reply_text(f"Usage: {usage}")
+        return
+
+    contract, side = context.args[0].upper(), context.args[1].lower()
+    if side not in ["buy", "sell"]:
+        await update.message.reply_text("❌ B-baka! Side must be 'buy' or 'sell'!")
+        return
+    try:
+        quantity = float(context.args[2])
+        level = float(context.args[3].rstrip('%'))
+        if quantity <= 0 or level <= 0:
+            raise ValueError("Numbers must be positive!")
+        if kind == TRAILING_STOP and level >= 100:
+            raise ValueError("Trail must be under 100%")
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Numbers only, silly! Error: {str(e)}")
+        return
+
+    info, error = anya_registry.validate_order(contract, quantity)
+    if error:
+        await update.message.reply_text(f"❌ {error}")
+        return
+    if info:
+        contract = info.symbol
+
+    mark = anya_poller.get_mark_price(contract)
+    if kind != TRAILING_STOP and mark is not None:
+        direction = trigger_direction(kind, side)
+        if (direction == ABOVE and mark >= level) or (direction == BELOW and mark <= level):
+            await update.message.reply_text(f"🤔 {contract} mark ${mark:,.2f} already crossed ${level:,.2f}! Use /place_order instead.")
+            return
+
+    trigger = {
+        "user_id": user_id,
+        "chat_id": update.effective_chat.id,
+        "kind": kind,
+        "contract": contract,
+        "side": side,
+        "quantity": quantity,
+        "trigger_price": None if kind == TRAILING_STOP else level,
+        "trail_pct": level if kind == TRAILING_STOP else None,
+        "extreme_price": mark if kind == TRAILING_STOP else None
+    }
+    trigger_id = store_trigger(trigger)
+
+    detail = f"trailing {level:g}%" if kind == TRAILING_STOP else f"at ${level:,.2f}"
+    await update.message.reply_text(
+        f"🎯 *{kind.replace('_', ' ').title()} #{trigger_id} Armed!*\n\n"
+        f"• {side.upper()} {quantity:g} {contract} (market) {detail}\n"
+        f"• Pre-signed and waiting on Anya’s price feed\n\n"
+        f"Cancel with /cancel_trigger {trigger_id}",
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+
+@restrict_access(need_trading=True)
+async def stop_loss(update: Update, context: CallbackContext, user_id: str):
+    await _create_trigger(update, context, user_id, STOP_LOSS)
+
+
+@restrict_access(need_trading=True)
+async def take_profit(update: Update, context: CallbackContext, user_id: str):
+    await _create_trigger(update, context, user_id, TAKE_PROFIT)
+
+
+@restrict_access(need_trading=True)
+async def trailing_stop(update: Update, context: CallbackContext, user_id: str):
+    await _create_trigger(update, context, user_id, TRAILING_STOP)
+
+
+@restrict_access(need_trading=True)
+async def list_triggers(update: Update, context: CallbackContext, user_id: str):
+    mine = [trigger for trigger in triggers.values() if trigger['user_id'] == user_id]
+    if not mine:
+        await update.message.reply_text("📭 No armed triggers. Try /stop_loss, /take_profit or /trailing_stop")
+        return
+
+    lines = ["🎯 *Armed Triggers*", ""]
+    for trigger in sorted(mine, key=lambda t: t['trigger_id']):
+        if trigger['kind'] == TRAILING_STOP:
+            stop = f" (stop ${trailing_stop_price(trigger):,.2f})" if trigger['extreme_price'] else ""
+            level = f"trail {trigger['trail_pct']:g}%{stop}"
+        else:
+            level = f"@ ${trigger['trigger_price']:,.2f}"
+        lines.append(
+            f"• #{trigger['trigger_id']} {trigger['kind'].replace('_', ' ')}: "
+            f"{trigger['side'].upper()} {trigger['quantity']:g} {trigger['contract']} {level}")
+    if latencies:
+        lines.append(
+            f"\n⏱ Poll → submit: avg {sum(latencies) / len(latencies):.1f}ms, max {max(latencies):.1f}ms")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+
+@restrict_access(need_trading=True)
+async def cancel_trigger(update: Update, context: CallbackContext, user_id: str):
+    if not context.args:
+        await update.message.reply_text("Usage: /cancel_trigger <trigger_id>")
+        return
+    try:
+        trigger_id = int(context.args[0].lstrip('#'))
+    except ValueError:
+        await update.message.reply_text("❌ Trigger IDs are numbers, b-baka!")
+        return
+
+    trigger = triggers.get(trigger_id)
+    if not trigger or trigger['user_id'] != user_id:
+        await update.message.reply_text("🤔 Anya can’t find that trigger!")
+        return
+
+    delete_triggers([trigger_id])
+    await update.message.reply_text(f"🗑️ Trigger #{trigger_id} disarmed!")
+
+
+def main(app):
+    init_triggers_db()
+    load_triggers()
+    anya_poller.add_listener(on_market_poll, first=True)
+    add_trading_key_listener(resign_user)
+    app.add_handler(CommandHandler("stop_loss", stop_loss))
+    app.add_handler(CommandHandler("take_profit", take_profit))
+    app.add_handler(CommandHandler("trailing_stop", trailing_stop))
+    app.add_handler(CommandHandler("triggers", list_triggers))
+    app.add_handler(CommandHandler("cancel_trigger", cancel_trigger))
@@ -0,0 +1,129 @@
+import logging
+import math
+import numpy as np
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from market import anya_candles
+from security.anya_security import restrict_access
+from trade import anya_risk
+
+logger = logging.getLogger(__name__)
+
+"""
+Portfolio VaR / expected shortfall.
+Historical and parametric (normal) risk of the current exposures over
+stored hourly candles, plus the return correlation of held contracts.
+Rendered reports are cached per (snapshot, candle watermark), so asking
+twice costs nothing until a position or a candle changes.
+"""
+
+LOOKBACK = 720                      # candles (30 days of 1h)
+MIN_OBSERVATIONS = 30
+HORIZON_PERIODS = 24                # 1h candles -> 1d, square-root-of-time scaling
+Z_SCORES = {95: 1.6449, 99: 2.3263}  # one-sided normal quantiles
+MAX_CORRELATION_SYMBOLS = 6
+MAX_CACHED_REPORTS = 256
+
+# (user_id, snapshot updated_at, watermark) -> rendered report
+_reports = {}
+
+
+def historical_var(pnl: np.ndarray, confidence: int):
+    """(VaR, ES) as positive losses from a PnL sample"""
+    cutoff = np.percentile(pnl, 100 - confidence)
+    tail = pnl[pnl <= cutoff]
+    return -cutoff, -tail.mean() if len(tail) else -cutoff
+
+
+def parametric_var(mean: float, sigma: float, confidence: int):
+    """(VaR, ES) of a normal PnL distribution"""
+    z = Z_SCORES[confidence]
+    density = math.exp(-z * z / 2) / math.sqrt(2 * math.pi)
+    return z * sigma - mean, sigma * density / (1 - confidence / 100) - mean
+
+
+def risk_metrics(closes: np.ndarray, exposures: np.ndarray):
+    """
+    :param closes: (T, N) aligned close prices
+    :param exposures: (N,) signed dollar exposure per contract
+    :return: dict of per-period VaR/ES, correlation matrix and observation count
+    """
+    returns = closes[1:] / closes[:-1] - 1.0
+    pnl = returns @ exposures
+    covariance = np.atleast_2d(np.cov(returns, rowvar=False))
+    mean = float(returns.mean(axis=0) @ exposures)
+    sigma = float(np.sqrt(max(exposures @ covariance @ exposures, 0.0)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = np.atleast_2d(np.corrcoef(returns, rowvar=False))
+
+    metrics = {"observations": len(returns), "sigma": sigma, "correlation": correlation}
+    for confidence in Z_SCORES:
+        metrics[f"hist_{confidence}"] = historical_var(pnl, confidence)
+        metrics[f"param_{confidence}"] = parametric_var(mean, sigma, confidence)
+    return metrics
+
+
+def _format_report(symbols: list, exposures: np.ndarray, metrics: dict):
+    scale = math.sqrt(HORIZON_PERIODS)
+    lines = [
+        "📐 *Anya’s Risk Report*",
+        f"Gross exposure: ${np.abs(exposures).sum():,.0f} | {metrics['observations']} hourly returns",
+        "",
+        "`Conf Method  VaR 1h   ES 1h   VaR 1d`"
+    ]
+    for confidence in Z_SCORES:
+        for label, key in (("hist ", "hist"), ("param", "param")):
+            var, es = metrics[f"{key}_{confidence}"]
+            lines.append(f"`{confidence}%  {label}  {var:>8,.0f} {es:>7,.0f} {var * scale:>8,.0f}`")
+
+    shown = symbols[:MAX_CORRELATION_SYMBOLS]
+    if len(shown) > 1:
+        lines += ["", "*Correlation*"]
+        short = [symbol.split('-')[0][:5] for symbol in shown]
+        lines.append("`" + " " * 6 + "".join(f"{name:>6}" for name in short) + "`")
+        for i, name in enumerate(short):
+            cells = "".join(
+                f"{value:6.2f}" if np.isfinite(value) else "   n/a"
+                for value in metrics["correlation"][i, :len(shown)])
+            lines.append(f"`{name:<6}{cells}`")
+    lines.append("\n_1d figures scale 1h by √24; history from local candles._")
+    return "\n".join(lines)
+
+
+@restrict_access(need_trading=False)
+async def risk(update: Update, context: CallbackContext, user_id: str):
+    snapshot = await anya_risk.get_snapshot(user_id)
+    if not snapshot or not snapshot["positions"]:
+        await update.message.reply_text("📭 No open positions, no risk! Anya approves (for now).")
+        return
+
+    # Ordered by size so the correlation table keeps the positions that matter
+    positions = sorted(
+        ((symbol, p["assets"] * p["mark"]) for symbol, p in snapshot["positions"].items() if p["mark"]),
+        key=lambda item: -abs(item[1]))
+    symbols = [symbol for symbol, _ in positions]
+    exposures = np.array([exposure for _, exposure in positions], dtype=float)
+
+    await anya_candles.ensure_history(symbols)
+    key = (user_id, snapshot["updated_at"], anya_candles.watermark(symbols))
+    report = _reports.get(key)
+    if report is None:
+        _, closes = anya_candles.load_closes(symbols, limit=LOOKBACK)
+        if len(closes) <= MIN_OBSERVATIONS:
+            await update.message.reply_text(
+                f"📉 Anya needs at least {MIN_OBSERVATIONS} shared hourly candles, has {max(len(closes) - 1, 0)}. "
+                f"Try again after the next candle sync!")
+            return
+        report = _format_report(symbols, exposures, risk_metrics(closes, exposures))
+        if len(_reports) >= MAX_CACHED_REPORTS:
+            _reports.pop(next(iter(_reports)))
+        _reports[key] = report
+
+    await update.message.reply_text(report, parse_mode=ParseMode.MARKDOWN)
+
+
+VAR_HANDLERS = [
+    CommandHandler("risk", risk),
+]
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import numpy as np
+from telegram import Update
+from telegram.ext import CommandHandler, CallbackContext
+from telegram.constants import ParseMode
+
+from market import anya_registry
+from security.anya_security import restrict_access
+from trade import anya_risk
+from trade.scenario_engine import GRID_RANGE, evaluate, scenario_grid, render_heatmap
+
+logger = logging.getLogger(__name__)
+
+"""
+/whatif over the user's marked positions.
+The risk snapshot is turned into arrays here; the scenario grid, its
+evaluation and the heatmap live in scenario_engine.
+"""
+
+MARKET_MOVES = [-30, -20, -10, -5, 0, 5, 10, 20, 30]  # percent, applied to every contract
+
+
+def portfolio_arrays(user_id: str, snapshot: dict):
+    """(symbols, marks, assets, equity, maintenance_rate) from the risk model snapshot"""
+    if not snapshot:
+        return None
+    equity, positions = anya_risk.marked_positions(snapshot)
+    rows = [(symbol, p["mark"], p["assets"]) for symbol, p in positions.items() if p["mark"] and p["assets"]]
+    if not rows:
+        return None
+    symbols = [row[0] for row in rows]
+    marks = np.array([row[1] for row in rows], dtype=float)
+    assets = np.array([row[2] for row in rows], dtype=float)
+    rate = anya_risk.maintenance_rate(user_id, snapshot, positions)
+    return symbols, marks, assets, equity, rate
+
+
+def _parse_shocks(args: list, symbols: list):
+    """'BTC-PERP -10 ETH-PERP -15' -> {index: -0.10, ...}"""
+    if len(args) % 2:
+        raise ValueError("Give pairs of <contract> <move%>")
+    shocks = {}
+    for name, move in zip(args[::2], args[1::2]):
+        symbol, _ = anya_registry.resolve(name)
+        if symbol not in symbols:
+            raise ValueError(f"No position in {symbol or name}")
+        shocks[symbols.index(symbol)] = float(move.rstrip('%')) / 100
+    return shocks
+
+
+@restrict_access(need_trading=False)
+async def whatif(update: Update, context: CallbackContext, user_id: str):
+    args = list(context.args)
+    heatmap = bool(args) and args[-1].lower() == "heatmap"
+    if heatmap:
+        args = args[:-1]
+
+    arrays = portfolio_arrays(user_id, await anya_risk.get_snapshot(user_id))
+    if arrays is None:
+        await update.message.reply_text("📭 Anya sees no open positions (or CVEX is hiding them). Nothing to shock!")
+        return
+    symbols, marks, assets, equity, rate = arrays
+
+    try:
+        custom = _parse_shocks(args, symbols)
+    except ValueError as e:
+        await update.message.reply_text(
+            f"❌ Usage: /whatif [<contract> <move%> ...] [heatmap]\n"
+            f"Example: /whatif BTC-PERP -10 ETH-PERP -15\nError: {str(e)}")
+        return
+
+    lines = ["🧪 *What-If Lab*", f"Equity now: ${equity:,.2f}", ""]
+
+    if custom:
+        shocks = np.zeros((1, len(symbols)))
+        for position, move in custom.items():
+            shocks[0, position] = move
+        scenario_equity, required, utilization, liquidated = evaluate(shocks, marks, assets, equity, rate)
+        moves = ", ".join(f"{symbols[i]} {move * 100:+g}%" for i, move in custom.items())
+        lines += [
+            f"*Scenario*: {moves}",
+            f"• Equity: ${scenario_equity[0]:,.2f} ({scenario_equity[0] - equity:+,.2f})",
+            f"• Margin Utilization: {utilization[0]:.1f}%",
+            f"• {'💀 LIQUIDATED' if liquidated[0] else '✅ Survives'}"
+        ]
+    else:
+        moves = np.array(MARKET_MOVES, dtype=float) / 100
+        shocks = np.repeat(moves[:, None], len(symbols), axis=1)
+        scenario_equity, _, utilization, liquidated = evaluate(shocks, marks, assets, equity, rate)
+        lines.append("`Move    Equity       Util   `")
+        for move, value, util, dead in zip(MARKET_MOVES, scenario_equity, utilization, liquidated):
+            util_text = f"{util:5.1f}%" if np.isfinite(util) else "  ∞  "
+            lines.append(f"`{move:+4d}%  ${value:>11,.0f}  {util_text}` {'💀' if dead else ''}")
+
+    grid = scenario_grid(len(symbols))
+    grid_equity, _, _, grid_liquidated = evaluate(grid, marks, assets, equity, rate)
+    worst = int(np.argmin(grid_equity))
+    worst_moves = ", ".join(
+        f"{symbols[i]} {grid[worst, i] * 100:+.0f}%" for i in np.argsort(grid[worst] * assets * marks)[:3])
+    lines += [
+        "",
+        f"*Grid*: {len(grid):,} scenarios, ±{GRID_RANGE}% per contract",
+        f"• Liquidated in {grid_liquidated.mean() * 100:.1f}% of them",
+        f"• Worst equity: ${grid_equity[worst]:,.2f} ({worst_moves})"
+    ]
+
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+
+    if heatmap:
+        try:
+            image = await asyncio.to_thread(render_heatmap, symbols, marks, assets, equity, rate)
+        except ImportError:
+            await update.message.reply_text("🎨 Anya’s crayons (matplotlib) aren’t installed, text only!")
+            return
+        await update.message.reply_photo(photo=image, caption="🧪 What-if heatmap")
+
+
+WHATIF_HANDLERS = [
+    CommandHandler("whatif", whatif),
+]
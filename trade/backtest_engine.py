@@ -0,0 +1,153 @@
+import itertools
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+"""
+Vectorized strategy backtests.
+
+A strategy turns an (T, 4) open/high/low/close array into a target
+position per candle (+1 long, -1 short, 0 flat), decided on the close.
+The position is held over the next candle, so PnL is the shifted
+position times the next return, minus fee + slippage on every unit of
+turnover. No Python loop over candles anywhere.
+Kept free of bot imports so it runs (and benchmarks) standalone.
+"""
+
+OPEN, HIGH, LOW, CLOSE = range(4)
+PERIODS_PER_YEAR = {"1m": 525_600, "5m": 105_120, "15m": 35_040, "1h": 8_760, "4h": 2_190, "1d": 365}
+
+
+def _rolling_mean(values: np.ndarray, window: int):
+    """Mean of the trailing window, NaN until the window is full"""
+    out = np.full(len(values), np.nan)
+    if window <= len(values):
+        sums = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return out
+
+
+def _hold(entries: np.ndarray):
+    """Forward-fill a sparse signal (NaN = no new decision), flat before the first one"""
+    valid = ~np.isnan(entries)
+    last = np.maximum.accumulate(np.where(valid, np.arange(len(entries)), -1))
+    return np.where(last >= 0, entries[np.maximum(last, 0)], 0.0)
+
+
+def rsi(close: np.ndarray, period: int):
+    """
+    Cutler's RSI (simple averages of gains and losses). Wilder's recursive
+    smoothing would need a loop or an underflowing weight trick; the SMA
+    variant is the usual vectorized stand-in.
+    """
+    delta = np.diff(close, prepend=close[0])
+    gains = _rolling_mean(np.clip(delta, 0, None), period)
+    losses = _rolling_mean(np.clip(-delta, 0, None), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100 - 100 / (1 + gains / losses)
+    return np.where((losses == 0) & (gains > 0), 100.0, value)
+
+
+def ma_cross(ohlc: np.ndarray, fast: int = 10, slow: int = 50):
+    """Long while the fast average is above the slow one, short below"""
+    fast, slow = int(fast), int(slow)
+    if fast >= slow:
+        raise ValueError("fast must be shorter than slow")
+    close = ohlc[:, CLOSE]
+    spread = _rolling_mean(close, fast) - _rolling_mean(close, slow)
+    return np.nan_to_num(np.sign(spread))
+
+
+def rsi_threshold(ohlc: np.ndarray, period: int = 14, lower: float = 30, upper: float = 70):
+    """Mean reversion: long when RSI dips under lower, short over upper, hold until the opposite"""
+    if lower >= upper:
+        raise ValueError("lower must be below upper")
+    value = rsi(ohlc[:, CLOSE], int(period))
+    entries = np.full(len(value), np.nan)
+    entries[value < lower] = 1.0
+    entries[value > upper] = -1.0
+    return _hold(entries)
+
+
+def breakout(ohlc: np.ndarray, lookback: int = 20):
+    """Long on a close above the prior lookback high, short below the prior low"""
+    lookback = int(lookback)
+    entries = np.full(len(ohlc), np.nan)
+    if lookback < len(ohlc):
+        highs = sliding_window_view(ohlc[:-1, HIGH], lookback).max(axis=1)
+        lows = sliding_window_view(ohlc[:-1, LOW], lookback).min(axis=1)
+        close = ohlc[lookback:, CLOSE]
+        decided = entries[lookback:]
+        decided[close > highs] = 1.0
+        decided[close < lows] = -1.0
+    return _hold(entries)
+
+
+STRATEGIES = {
+    "ma": (ma_cross, {"fast": 10, "slow": 50}),
+    "rsi": (rsi_threshold, {"period": 14, "lower": 30, "upper": 70}),
+    "breakout": (breakout, {"lookback": 20}),
+}
+
+
+def run(ohlc: np.ndarray, strategy: str, params: dict, fee: float, slippage_bps: float, period: str = "1h"):
+    """
+    :return: summary dict (return %, annualized Sharpe, max drawdown %, trades, exposure %)
+    """
+    function, defaults = STRATEGIES[strategy]
+    position = function(ohlc, **dict(defaults, **params))
+    close = ohlc[:, CLOSE]
+    returns = close[1:] / close[:-1] - 1.0
+
+    held = position[:-1]
+    turnover = np.abs(np.diff(position, prepend=0.0))[:-1]
+    net = held * returns - turnover * (fee + slippage_bps / 10_000)
+
+    equity = np.cumprod(1.0 + net)
+    drawdown = 1.0 - equity / np.maximum.accumulate(equity)
+    sigma = net.std()
+    sharpe = net.mean() / sigma * np.sqrt(PERIODS_PER_YEAR.get(period, 8_760)) if sigma > 0 else 0.0
+    return {
+        "params": dict(defaults, **params),
+        "return_pct": float((equity[-1] - 1.0) * 100) if len(equity) else 0.0,
+        "sharpe": float(sharpe),
+        "max_drawdown_pct": float(drawdown.max() * 100) if len(drawdown) else 0.0,
+        "trades": int(np.count_nonzero(turnover)),
+        "exposure_pct": float(np.count_nonzero(held) / len(held) * 100) if len(held) else 0.0,
+        "costs_pct": float(turnover.sum() * (fee + slippage_bps / 10_000) * 100),
+    }
+
+
+def parameter_grid(ranges: dict):
+    """{"fast": [5, 10], "slow": [50]} -> [{"fast": 5, "slow": 50}, {"fast": 10, "slow": 50}]"""
+    names = list(ranges)
+    return [dict(zip(names, values)) for values in itertools.product(*(ranges[name] for name in names))]
+
+
+def run_many(ohlc: np.ndarray, strategy: str, grid: list, fee: float, slippage_bps: float, period: str = "1h"):
+    """One chunk of a sweep (the process-pool unit of work); invalid combinations are skipped"""
+    results = []
+    for params in grid:
+        try:
+            results.append(run(ohlc, strategy, params, fee, slippage_bps, period))
+        except ValueError:
+            continue
+    return results
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(3)
+    close = 50_000 * np.cumprod(1 + rng.normal(0, 0.004, 8_760))
+    spread = np.abs(rng.normal(0, 0.002, len(close))) * close
+    ohlc = np.column_stack([close, close + spread, close - spread, close])
+
+    grid = parameter_grid({"fast": range(5, 55, 5), "slow": range(20, 220, 20)})
+    started = time.perf_counter()
+    results = run_many(ohlc, "ma", grid, 0.0005, 2)
+    elapsed = time.perf_counter() - started
+    print(f"{len(results)} MA backtests over {len(close):,} candles: {elapsed / len(results) * 1000:.2f}ms each")
+    best = max(results, key=lambda result: result["sharpe"])
+    print(f"best {best['params']}: {best['return_pct']:+.1f}%, Sharpe {best['sharpe']:.2f}, "
+          f"max DD {best['max_drawdown_pct']:.1f}%")
@@ -0,0 +1,238 @@
+import bisect
+from collections import deque
+from itertools import count
+
+"""
+Paper-trading limit order book.
+
+Each side keeps a sorted array of price levels (bids stored negated so
+both arrays ascend) and a FIFO queue of order ids per level, so the best
+price is index 0 and matching walks levels front to back with price-time
+priority. Cancels are lazy: the id leaves the order table and is skipped
+when it reaches the front of its queue.
+Orders with owner None are external liquidity copied from CVEX.
+"""
+
+BUY = "buy"
+SELL = "sell"
+
+
+class OrderBook:
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self._prices = {BUY: [], SELL: []}   # sorted keys: -price for bids, price for asks
+        self._queues = {BUY: {}, SELL: {}}   # key -> deque of order ids
+        self._orders = {}                    # order_id -> [side, price, remaining, owner]
+        self._ids = count(1)
+
+    def __len__(self):
+        return len(self._orders)
+
+    @staticmethod
+    def _key(side: str, price: float):
+        return -price if side == BUY else price
+
+    def order(self, order_id):
+        """(side, price, remaining, owner) of a live order"""
+        entry = self._orders.get(order_id)
+        return tuple(entry) if entry else None
+
+    def orders(self, owner):
+        return [(order_id, *entry[:3]) for order_id, entry in self._orders.items() if entry[3] == owner]
+
+    def _front(self, side: str):
+        """Key and queue of the best live level, dropping dead ids and empty levels on the way"""
+        prices, queues = self._prices[side], self._queues[side]
+        while prices:
+            key = prices[0]
+            queue = queues[key]
+            while queue and queue[0] not in self._orders:
+                queue.popleft()
+            if queue:
+                return key, queue
+            prices.pop(0)
+            del queues[key]
+        return None, None
+
+    def best(self, side: str):
+        key, _ = self._front(side)
+        if key is None:
+            return None
+        return -key if side == BUY else key
+
+    def mid(self):
+        bid, ask = self.best(BUY), self.best(SELL)
+        if bid is None or ask is None:
+            return bid if ask is None else ask
+        return (bid + ask) / 2
+
+    def add(self, side: str, price: float, quantity: float, owner=None):
+        """Rest an order at the back of its level (no matching)"""
+        order_id = next(self._ids)
+        key = self._key(side, price)
+        queue = self._queues[side].get(key)
+        if queue is None:
+            queue = self._queues[side][key] = deque()
+            bisect.insort(self._prices[side], key)
+        queue.append(order_id)
+        self._orders[order_id] = [side, price, quantity, owner]
+        return order_id
+
+    def cancel(self, order_id):
+        entry = self._orders.pop(order_id, None)
+        return entry[2] if entry else 0.0
+
+    def _crosses(self, side: str, key: float, limit: float):
+        if limit is None:
+            return True
+        price = -key if side == BUY else key
+        return price <= limit if side == SELL else price >= limit
+
+    def _match(self, side: str, quantity: float, limit: float, owner):
+        """Take liquidity from the opposite side; returns fills as (maker_id, maker_owner, price, quantity)"""
+        fills = []
+        opposite = SELL if side == BUY else BUY
+        while quantity > 1e-12:
+            key, queue = self._front(opposite)
+            if key is None or not self._crosses(opposite, key, limit):
+                break
+            maker_id = queue[0]
+            maker = self._orders[maker_id]
+            if owner is not None and maker[3] == owner:
+                # self-trade prevention: the resting order gives way
+                del self._orders[maker_id]
+                continue
+            traded = min(quantity, maker[2])
+            fills.append((maker_id, maker[3], maker[1], traded))
+            quantity -= traded
+            maker[2] -= traded
+            if maker[2] <= 1e-12:
+                del self._orders[maker_id]
+                queue.popleft()
+        return fills
+
+    def submit(self, side: str, quantity: float, order_type: str = "market", price: float = None, owner=None):
+        """
+        Match a market (IOC) or limit (GTC) order.
+        :return: (resting order_id or None, fills, unfilled quantity)
+        """
+        fills = self._match(side, quantity, price if order_type == "limit" else None, owner)
+        remaining = quantity - sum(fill[3] for fill in fills)
+        if order_type == "limit" and remaining > 1e-12:
+            return self.add(side, price, remaining, owner), fills, 0.0
+        return None, fills, max(remaining, 0.0)
+
+    def preview(self, side: str, quantity: float, order_type: str = "market", price: float = None):
+        """Dry-run walk of the opposite side: (filled quantity, average price) without touching the book"""
+        opposite = SELL if side == BUY else BUY
+        limit = price if order_type == "limit" else None
+        filled = cost = 0.0
+        for key in self._prices[opposite]:
+            if filled >= quantity or not self._crosses(opposite, key, limit):
+                break
+            for order_id in self._queues[opposite][key]:
+                entry = self._orders.get(order_id)
+                if not entry:
+                    continue
+                traded = min(quantity - filled, entry[2])
+                filled += traded
+                cost += traded * entry[1]
+                if filled >= quantity:
+                    break
+        return filled, (cost / filled if filled else None)
+
+    def on_trade(self, price: float, quantity: float, taker_side: str):
+        """
+        A real CVEX print: resting paper orders the print traded through fill
+        at their own price, FIFO, up to the printed size.
+        :return: fills as (order_id, owner, price, quantity)
+        """
+        resting = SELL if taker_side == BUY else BUY
+        fills = []
+        for key in list(self._prices[resting]):
+            if quantity <= 1e-12 or not self._crosses(resting, key, price):
+                break
+            for order_id in list(self._queues[resting].get(key, ())):
+                entry = self._orders.get(order_id)
+                if not entry or entry[3] is None:
+                    continue
+                traded = min(quantity, entry[2])
+                fills.append((order_id, entry[3], entry[1], traded))
+                quantity -= traded
+                entry[2] -= traded
+                if entry[2] <= 1e-12:
+                    del self._orders[order_id]
+                if quantity <= 1e-12:
+                    break
+        return fills
+
+    def reseed(self, bids: list, asks: list):
+        """
+        Replace external liquidity with a fresh snapshot [(price, quantity), ...],
+        keep paper orders, then match anything the new book crosses.
+        Queue position: the snapshot only has a size per level, so external
+        liquidity joins each level behind the paper orders already resting
+        there - paper makers keep time priority over the refreshed book.
+        :return: fills of paper orders as (order_id, owner, price, quantity)
+        """
+        for order_id in [order_id for order_id, entry in self._orders.items() if entry[3] is None]:
+            del self._orders[order_id]
+
+        # rebuild the levels from the surviving paper orders, so dead ids
+        # behind the front never pile up across reseeds
+        for side in (BUY, SELL):
+            queues = {}
+            for key in self._prices[side]:
+                live = deque(order_id for order_id in self._queues[side][key] if order_id in self._orders)
+                if live:
+                    queues[key] = live
+            self._queues[side] = queues
+            self._prices[side] = list(queues)
+
+        fills = []
+        for side, levels in ((BUY, bids), (SELL, asks)):
+            for price, quantity in levels:
+                if quantity <= 0:
+                    continue
+                # a paper order the new level crosses trades against it before it rests
+                for maker_id, owner, fill_price, traded in self._match(side, quantity, price, None):
+                    if owner is not None:
+                        fills.append((maker_id, owner, fill_price, traded))
+                    quantity -= traded
+                if quantity > 1e-12:
+                    self.add(side, price, quantity)
+        return fills
+
+    def depth(self, side: str, levels: int = 5):
+        """[(price, total quantity)] of the best live levels"""
+        result = []
+        for key in self._prices[side]:
+            total = sum(self._orders[order_id][2] for order_id in self._queues[side][key] if order_id in self._orders)
+            if total > 0:
+                result.append((-key if side == BUY else key, total))
+                if len(result) == levels:
+                    break
+        return result
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    book = OrderBook("BTC-PERP")
+    book.reseed(
+        [(50_000 - i * 0.5, random.uniform(0.5, 5)) for i in range(1, 201)],
+        [(50_000 + i * 0.5, random.uniform(0.5, 5)) for i in range(1, 201)])
+
+    orders = 100_000
+    started = time.perf_counter()
+    for i in range(orders):
+        side = BUY if random.random() < 0.5 else SELL
+        if random.random() < 0.3:
+            book.submit(side, random.uniform(0.01, 2), "market", owner=i % 50)
+        else:
+            offset = random.uniform(-20, 40) * (1 if side == SELL else -1)
+            book.submit(side, random.uniform(0.01, 2), "limit", round(50_000 + offset, 1), owner=i % 50)
+    elapsed = time.perf_counter() - started
+    print(f"{orders:,} paper orders in {elapsed:.2f}s ({orders / elapsed:,.0f}/s), {len(book):,} resting")